@@ -2,6 +2,10 @@ import os
 from pathlib import Path
 from decouple import config
 import mongoengine
+from pymongo import ReadPreference
+from pymongo.read_preferences import Nearest, Secondary, SecondaryPreferred
+
+from blog.monitoring import command_profiler, pool_metrics
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -29,10 +33,11 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "blog.middleware.QueryProfilerMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
-    "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "blog.auth.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -50,6 +55,7 @@ TEMPLATES = [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
+                "blog.context_processors.site_settings",
             ],
         },
     },
@@ -73,11 +79,69 @@ MONGODB_SETTINGS = {
     "password": config("MONGO_PASSWORD", default=""),
     "authentication_source": config("MONGO_AUTH_SOURCE", default="admin"),
     "connect": False,
+    # Connection pool, per process. Size maxPoolSize to the threads (or
+    # concurrent async requests) a worker serves; a checkout waits at most
+    # waitQueueTimeoutMS for a free connection before failing.
+    "maxPoolSize": config("MONGO_MAX_POOL_SIZE", default=50, cast=int),
+    "minPoolSize": config("MONGO_MIN_POOL_SIZE", default=2, cast=int),
+    "maxIdleTimeMS": config("MONGO_MAX_IDLE_TIME_MS", default=300_000, cast=int),
+    "waitQueueTimeoutMS": config("MONGO_WAIT_QUEUE_TIMEOUT_MS", default=2000, cast=int),
+    # Timeouts
+    "connectTimeoutMS": config("MONGO_CONNECT_TIMEOUT_MS", default=5000, cast=int),
+    "serverSelectionTimeoutMS": config(
+        "MONGO_SERVER_SELECTION_TIMEOUT_MS", default=5000, cast=int
+    ),
+    "socketTimeoutMS": config("MONGO_SOCKET_TIMEOUT_MS", default=30_000, cast=int),
+    # Read preference of the default connection. Keep "primary" unless all
+    # reads may be stale: sessions, site settings and blog.routing.primary()
+    # read through it expecting to see their own writes. Read-only views go
+    # to replicas through MONGO_READ_HOST below.
+    "read_preference": {
+        "primary": ReadPreference.PRIMARY,
+        "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+        "secondary": ReadPreference.SECONDARY,
+        "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+        "nearest": ReadPreference.NEAREST,
+    }[config("MONGO_READ_PREFERENCE", default="primary")],
+    "retryWrites": config("MONGO_RETRY_WRITES", default=True, cast=bool),
+    # Pool checkout, wait time and in-use counts, see blog.monitoring
+    "event_listeners": [pool_metrics, command_profiler],
 }
 
+# Open a pooled connection when each worker starts instead of on its first
+# request. Leave off when workers are forked from a preloaded application.
+MONGO_WARM_UP = config("MONGO_WARM_UP", default=False, cast=bool)
+
+# Optional read replica for read-only views (see blog.routing). Point it at
+# the replica set and the views read from secondaries at most
+# MONGO_MAX_STALENESS_SECONDS (90 or more) behind the primary; set
+# MONGO_READ_TAGS (e.g. "nodeType:ANALYTICS") to target tagged members such
+# as an analytics node.
+MONGO_READ_HOST = config("MONGO_READ_HOST", default="")
+MONGO_READ_ALIAS = "reads" if MONGO_READ_HOST else None
+MONGO_READ_TAGS = config("MONGO_READ_TAGS", default="")
+MONGODB_READ_SETTINGS = dict(
+    MONGODB_SETTINGS,
+    alias="reads",
+    host=MONGO_READ_HOST,
+    port=config("MONGO_READ_PORT", default=MONGODB_SETTINGS["port"], cast=int),
+    read_preference={
+        "secondary": Secondary,
+        "secondaryPreferred": SecondaryPreferred,
+        "nearest": Nearest,
+    }[config("MONGO_READ_MODE", default="secondaryPreferred")](
+        tag_sets=[dict(tag.split(":", 1) for tag in MONGO_READ_TAGS.split(","))]
+        if MONGO_READ_TAGS
+        else None,
+        max_staleness=config("MONGO_MAX_STALENESS_SECONDS", default=90, cast=int),
+    ),
+)
+
 # Connect to MongoDB using MongoEngine
 try:
     mongoengine.connect(**MONGODB_SETTINGS)
+    if MONGO_READ_ALIAS:
+        mongoengine.connect(**MONGODB_READ_SETTINGS)
     print("✅ MongoDB connected successfully via MongoEngine!")
 except Exception as e:
     print(f"❌ MongoDB connection failed: {e}")
@@ -85,6 +149,16 @@ except Exception as e:
 # Disable Django's built-in authentication (we'll use custom)
 USE_DJANGO_AUTH = False
 
+# Users are blog.models.User documents. The user of each request is cached
+# for AUTH_USER_CACHE_TTL seconds in the default cache; saving a user drops
+# it there, so with the per-process locmem cache other workers see a
+# deactivation or password change only when the entry expires. Raise the
+# TTL only with a shared default cache. Outdated password hashes are
+# upgraded on a background thread after login.
+AUTHENTICATION_BACKENDS = ["blog.auth.MongoUserBackend"]
+AUTH_USER_CACHE_TTL = config("AUTH_USER_CACHE_TTL", default=5, cast=int)
+AUTH_REHASH_IN_BACKGROUND = config("AUTH_REHASH_IN_BACKGROUND", default=True, cast=bool)
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -135,9 +209,112 @@ CORS_ALLOW_ALL_ORIGINS = DEBUG
 SESSION_COOKIE_AGE = 86400
 SESSION_SAVE_EVERY_REQUEST = True
 
+# Sessions live in MongoDB (blog.sessions). Unchanged sessions are written at
+# most every SESSION_TOUCH_INTERVAL seconds to slide their expiry, and
+# anonymous sessions are reused in process for SESSION_LOCAL_CACHE_TTL
+# seconds; logged-in sessions are always read from MongoDB.
+SESSION_ENGINE = "blog.sessions"
+SESSION_TOUCH_INTERVAL = config("SESSION_TOUCH_INTERVAL", default=300, cast=int)
+SESSION_LOCAL_CACHE_TTL = config("SESSION_LOCAL_CACHE_TTL", default=5.0, cast=float)
+SESSION_LOCAL_CACHE_SIZE = config("SESSION_LOCAL_CACHE_SIZE", default=10000, cast=int)
+
 # Custom settings for MongoDB-only approach
 MONGODB_ONLY = True
 
+# View counts are buffered per worker and flushed as one bulk $inc
+VIEW_COUNT_FLUSH_INTERVAL = config("VIEW_COUNT_FLUSH_INTERVAL", default=5, cast=float)
+VIEW_COUNT_MAX_PENDING = config("VIEW_COUNT_MAX_PENDING", default=1000, cast=int)
+
+# Seconds a worker trusts its cached SiteSettings before re-checking the version
+SITE_SETTINGS_CACHE_TTL = config("SITE_SETTINGS_CACHE_TTL", default=60, cast=float)
+
+# Seconds an exact post count is reused by paginated views
+COUNT_CACHE_TTL = config("COUNT_CACHE_TTL", default=60, cast=int)
+
+# Full-text search bounds: ranked results kept and server time per query
+SEARCH_MAX_RESULTS = config("SEARCH_MAX_RESULTS", default=100, cast=int)
+SEARCH_MAX_TIME_MS = config("SEARCH_MAX_TIME_MS", default=2000, cast=int)
+
+# Dashboard statistics: seconds they are reused and rows per breakdown table
+STATS_CACHE_TTL = config("STATS_CACHE_TTL", default=30, cast=int)
+STATS_BREAKDOWN_LIMIT = config("STATS_BREAKDOWN_LIMIT", default=10, cast=int)
+
+# Categories and the most used tags shown beside the listings
+SIDEBAR_CACHE_TTL = config("SIDEBAR_CACHE_TTL", default=60, cast=int)
+SIDEBAR_TAG_LIMIT = config("SIDEBAR_TAG_LIMIT", default=30, cast=int)
+
+# Sitemap URLs per file (50,000 is the protocol limit), URLs per streamed
+# chunk, and posts per RSS/Atom feed
+SITEMAP_MAX_URLS = config("SITEMAP_MAX_URLS", default=50000, cast=int)
+SITEMAP_CHUNK_SIZE = config("SITEMAP_CHUNK_SIZE", default=1000, cast=int)
+FEED_ITEMS = config("FEED_ITEMS", default=50, cast=int)
+
+# Newsletter mailing: subscribers per batch, rendering threads, posts per
+# digest, and the Django email backend it sends through (the console backend
+# only prints; use an SMTP or provider backend in production)
+NEWSLETTER_BATCH_SIZE = config("NEWSLETTER_BATCH_SIZE", default=500, cast=int)
+NEWSLETTER_WORKERS = config("NEWSLETTER_WORKERS", default=4, cast=int)
+NEWSLETTER_DIGEST_POSTS = config("NEWSLETTER_DIGEST_POSTS", default=10, cast=int)
+NEWSLETTER_EMAIL_BACKEND = config(
+    "NEWSLETTER_EMAIL_BACKEND",
+    default="django.core.mail.backends.console.EmailBackend",
+)
+# Absolute base URL of the links in digests, used when the site settings
+# have no site URL
+NEWSLETTER_SITE_URL = config("NEWSLETTER_SITE_URL", default="")
+# Seconds a send_newsletter run holds its mailing between checkpoints; a
+# run that died blocks resuming the same key for at most this long
+NEWSLETTER_LEASE_SECONDS = config("NEWSLETTER_LEASE_SECONDS", default=600, cast=int)
+
+# Per-request MongoDB command profiling (headers in DEBUG, a log line
+# otherwise) and how many single-id lookups on one collection count as N+1
+QUERY_PROFILER_ENABLED = config("QUERY_PROFILER_ENABLED", default=True, cast=bool)
+QUERY_PROFILER_N_PLUS_ONE = config("QUERY_PROFILER_N_PLUS_ONE", default=3, cast=int)
+
+# Posts fetched, serialised and streamed per round trip by api/posts/export/
+EXPORT_BATCH_SIZE = config("EXPORT_BATCH_SIZE", default=500, cast=int)
+
+# Route the read views and JSON API to blog.async_views. Enable when serving
+# through base.asgi; "thread" runs their queries on worker threads, "motor"
+# issues them through Motor, which is not in requirements.txt: install a
+# release supporting the pinned pymongo 3.11 (motor>=2.3,<2.5).
+ASYNC_VIEWS = config("ASYNC_VIEWS", default=False, cast=bool)
+ASYNC_MONGO_DRIVER = config("ASYNC_MONGO_DRIVER", default="thread")
+
+# Related posts: ids stored per post and the weight of each shared attribute
+RELATED_POSTS_LIMIT = config("RELATED_POSTS_LIMIT", default=6, cast=int)
+RELATED_POSTS_TAG_WEIGHT = config("RELATED_POSTS_TAG_WEIGHT", default=3, cast=int)
+RELATED_POSTS_CATEGORY_WEIGHT = config(
+    "RELATED_POSTS_CATEGORY_WEIGHT", default=2, cast=int
+)
+RELATED_POSTS_AUTHOR_WEIGHT = config("RELATED_POSTS_AUTHOR_WEIGHT", default=1, cast=int)
+
+# Rendered page cache for anonymous visitors. "locmem" is private to each
+# worker, so invalidations only reach other workers through PAGE_CACHE_TIMEOUT;
+# "file" shares one cache directory between all workers on a host.
+PAGE_CACHE_BACKEND = config("PAGE_CACHE_BACKEND", default="locmem")
+PAGE_CACHE_ALIAS = "pages"
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    PAGE_CACHE_ALIAS: {
+        "BACKEND": (
+            "django.core.cache.backends.filebased.FileBasedCache"
+            if PAGE_CACHE_BACKEND == "file"
+            else "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": (
+            config("PAGE_CACHE_DIR", default=str(BASE_DIR / "cache" / "pages"))
+            if PAGE_CACHE_BACKEND == "file"
+            else "blog-pages"
+        ),
+        "TIMEOUT": config("PAGE_CACHE_TIMEOUT", default=300, cast=int),
+        "OPTIONS": {"MAX_ENTRIES": 5000},
+    },
+}
+
 # Logging
 LOGGING = {
     "version": 1,
@@ -156,5 +333,10 @@ LOGGING = {
             "handlers": ["console"],
             "level": "INFO",
         },
+        "blog.middleware": {
+            "handlers": ["console"],
+            "level": "INFO",
+            "propagate": False,
+        },
     },
 }
@@ -0,0 +1,207 @@
+"""Non-blocking MongoDB access for the async views
+
+Querysets are still built with MongoEngine, but evaluated without blocking
+the event loop. With ``ASYNC_MONGO_DRIVER = "motor"``, Motor installed and a
+real MongoDB server, the query MongoEngine would send is issued through a
+Motor client with the same options as the MongoEngine connection, and the
+raw documents are turned back into MongoEngine documents. Otherwise (the
+default ``"thread"``, no Motor, or mongomock in tests) each query runs on a
+worker thread. Either way independent queries can be awaited
+together with :func:`gather`.
+"""
+
+import asyncio
+import weakref
+
+import mongoengine
+import pymongo
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .models import (
+    Author,
+    BlogPost,
+    Category,
+    Tag,
+    attach_references,
+    collect_references,
+)
+from .routing import current_read_alias
+
+try:
+    from motor.motor_asyncio import AsyncIOMotorClient
+except ImportError:  # pragma: no cover - Motor is optional
+    AsyncIOMotorClient = None
+
+# Motor clients are bound to the event loop they were first used on
+_clients = weakref.WeakKeyDictionary()
+
+# MONGODB_SETTINGS keys MongoEngine reads itself rather than passing them on
+CONNECTION_KEYS = (
+    "db",
+    "alias",
+    "host",
+    "port",
+    "username",
+    "password",
+    "authentication_source",
+    "connect",
+)
+
+
+def uses_motor():
+    """Whether queries go through Motor rather than worker threads"""
+    if AsyncIOMotorClient is None:
+        return False
+    if getattr(settings, "ASYNC_MONGO_DRIVER", "thread") != "motor":
+        return False
+    return isinstance(mongoengine.get_connection(), pymongo.MongoClient)
+
+
+def client_options(options):
+    """Client options of a MONGODB_SETTINGS dict, as MongoEngine passes them
+
+    Keeps the pool, timeouts, read preference and event listeners, so pool
+    metrics and the query profiler see the queries sent through Motor too.
+    """
+    client = {
+        key: value for key, value in options.items() if key not in CONNECTION_KEYS
+    }
+    if options.get("username"):
+        client.update(
+            username=options["username"],
+            password=options.get("password"),
+            authSource=options.get("authentication_source", "admin"),
+        )
+    return client
+
+
+def get_motor_db():
+    """Motor database for the running event loop and routed connection"""
+    alias = current_read_alias()
+    clients = _clients.setdefault(asyncio.get_running_loop(), {})
+    client = clients.get(alias)
+    if client is None:
+        options = settings.MONGODB_READ_SETTINGS if alias else settings.MONGODB_SETTINGS
+        client = AsyncIOMotorClient(
+            options.get("host", "localhost"),
+            options.get("port", 27017),
+            **client_options(options),
+        )
+        clients[alias] = client
+    return client[mongoengine.get_db(alias or "default").name]
+
+
+def run(func, *args, **kwargs):
+    """Run a blocking callable on a worker thread"""
+    return sync_to_async(func, thread_sensitive=False)(*args, **kwargs)
+
+
+async def gather(**awaitables):
+    """Await keyword awaitables concurrently and return their results by name"""
+    results = await asyncio.gather(*awaitables.values())
+    return dict(zip(awaitables, results))
+
+
+def _ordering(queryset):
+    if queryset._ordering is not None:
+        return queryset._ordering
+    ordering = queryset._document._meta.get("ordering")
+    return queryset._get_order_by(ordering) if ordering else []
+
+
+def motor_cursor(collection, queryset):
+    """The Motor cursor for the query MongoEngine would send for ``queryset``
+
+    Carries the same projection (``only()``/``exclude()``), ordering, skip,
+    limit and cursor options (``max_time_ms()``, ``hint()``, ``collation()``,
+    ``batch_size()``, ``comment()``) as the PyMongo cursor would.
+    """
+    cursor = collection.find(queryset._query, **queryset._cursor_args)
+    ordering = _ordering(queryset)
+    if ordering:
+        cursor = cursor.sort(ordering)
+    if queryset._skip:
+        cursor = cursor.skip(queryset._skip)
+    if queryset._limit:
+        cursor = cursor.limit(queryset._limit)
+    if queryset._hint not in (None, -1):
+        cursor = cursor.hint(queryset._hint)
+    if queryset._max_time_ms is not None:
+        cursor = cursor.max_time_ms(queryset._max_time_ms)
+    for option in ("collation", "batch_size", "comment"):
+        value = getattr(queryset, f"_{option}")
+        if value is not None:
+            cursor = getattr(cursor, option)(value)
+    return cursor
+
+
+async def fetch(queryset):
+    """Evaluate a queryset to a list of documents"""
+    if queryset._none or queryset._empty:
+        return []
+    if not uses_motor():
+        return await run(list, queryset)
+
+    document = queryset._document
+    collection = get_motor_db()[document._get_collection_name()]
+    return [
+        document._from_son(son, _auto_dereference=queryset._auto_dereference)
+        for son in await motor_cursor(collection, queryset).to_list(length=None)
+    ]
+
+
+async def first(queryset):
+    """First document of a queryset, or None"""
+    documents = await fetch(queryset.limit(1))
+    return documents[0] if documents else None
+
+
+async def get(queryset, **filters):
+    """Async ``queryset.get()``: raises DoesNotExist when nothing matches"""
+    document = await first(queryset.filter(**filters))
+    if document is None:
+        raise queryset._document.DoesNotExist(
+            f"{queryset._document._class_name} matching query does not exist."
+        )
+    return document
+
+
+async def count(queryset):
+    """Number of documents matching a queryset"""
+    if not uses_motor():
+        return await run(queryset.count)
+    collection = get_motor_db()[queryset._document._get_collection_name()]
+    options = {}
+    if queryset._hint not in (None, -1):
+        options["hint"] = queryset._hint
+    if queryset._max_time_ms is not None:
+        options["maxTimeMS"] = queryset._max_time_ms
+    return await collection.count_documents(queryset._query, **options)
+
+
+async def in_bulk(queryset, ids):
+    """Async ``queryset.in_bulk()``"""
+    if not ids:
+        return {}
+    documents = await fetch(queryset.filter(id__in=list(ids)))
+    return {document.id: document for document in documents}
+
+
+async def prefetch_references(posts):
+    """Async :func:`blog.models.prefetch_references`, collections in parallel"""
+    posts = list(posts)
+    author_ids, tag_ids, category_ids = collect_references(posts)
+    loaded = await gather(
+        authors=in_bulk(Author.objects, author_ids),
+        tags=in_bulk(Tag.objects, tag_ids),
+        categories=in_bulk(Category.objects, category_ids),
+    )
+    return attach_references(posts, **loaded)
+
+
+async def load_summaries(post_ids):
+    """Async :func:`blog.models.load_summaries`"""
+    posts_by_id = await in_bulk(BlogPost.objects.summaries(), post_ids)
+    posts = [posts_by_id[post_id] for post_id in post_ids if post_id in posts_by_id]
+    return await prefetch_references(posts)
@@ -1,4 +1,9 @@
+import logging
+
 from django.apps import AppConfig
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
 
 
 class BlogConfig(AppConfig):
@@ -9,3 +14,19 @@ class BlogConfig(AppConfig):
     def ready(self):
         # Import any startup code or signals here
         print("📚 Blog app loaded successfully!")
+
+        from django.contrib.auth.signals import user_logged_in
+
+        from .auth import update_last_login
+
+        # Django's receiver would save() the whole MongoEngine user
+        user_logged_in.disconnect(dispatch_uid="update_last_login")
+        user_logged_in.connect(update_last_login, dispatch_uid="update_last_login")
+
+        if getattr(settings, "MONGO_WARM_UP", False):
+            from .monitoring import warm_up
+
+            try:
+                logger.info(f"MongoDB pool warmed up in {warm_up() * 1000:.1f} ms")
+            except Exception as e:
+                logger.error(f"MongoDB pool warm-up failed: {e}")
@@ -0,0 +1,428 @@
+"""Async versions of the read views and the JSON API
+
+Routed instead of the views in ``blog.views`` when ASYNC_VIEWS is enabled,
+for deployments served through ``base.asgi``. Queries go through
+``blog.aio`` and queries that do not depend on each other are awaited
+together, so a page costs roughly its slowest query instead of the sum.
+"""
+
+import logging
+
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.shortcuts import render
+from mongoengine import DoesNotExist
+
+from . import aio
+from .cache import cache_page_for
+from .conditional import conditional, listing_validators, post_validators
+from .export import export_changes, export_lines, parse_updated_since
+from .models import Author, BlogPost, Category, SiteSettings, Tag
+from .pagination import (
+    InvalidCursor,
+    acached_count,
+    apaginate_by_cursor,
+    decode_cursor,
+)
+from .routing import read_replica
+from .sidebar import get_sidebar
+from .views import serialize_post, serialize_post_summary
+
+logger = logging.getLogger(__name__)
+
+
+def load_site_settings():
+    """Warm the per-process SiteSettings cache the context processor reads"""
+    return aio.run(SiteSettings.get_settings)
+
+
+# ============================================================================
+# Main Blog Views
+# ============================================================================
+
+
+@cache_page_for("home", lambda: ["posts", "categories", "site_settings"])
+@conditional(listing_validators())
+@read_replica
+async def home(request):
+    """Homepage with featured and recent posts"""
+    try:
+        results = await aio.gather(
+            featured_posts=aio.fetch(BlogPost.get_featured().summaries()[:3]),
+            recent_posts=aio.fetch(
+                BlogPost.get_published().summaries().order_by("-published_at")[:6]
+            ),
+            sidebar=aio.run(get_sidebar),
+            site_settings=load_site_settings(),
+        )
+        # One set of reference lookups covers both lists
+        await aio.prefetch_references(
+            results["featured_posts"] + results["recent_posts"]
+        )
+
+        context = {
+            "featured_posts": results["featured_posts"],
+            "recent_posts": results["recent_posts"],
+            "categories": results["sidebar"]["categories"][:5],
+            "page_title": "Home",
+        }
+        return render(request, "blog/home.html", context)
+
+    except Exception as e:
+        logger.error(f"Error in async home view: {e}")
+        return render(
+            request, "blog/error.html", {"error": "Unable to load homepage"}, status=500
+        )
+
+
+@cache_page_for("post_list", lambda: ["posts", "categories", "tags", "site_settings"])
+@conditional(listing_validators())
+@read_replica
+async def post_list(request):
+    """List all published posts with pagination"""
+    try:
+        posts_queryset = BlogPost.get_published().summaries()
+        posts_per_page = 10
+        page = int(request.GET.get("page", 1)) if "page" in request.GET else None
+        next_cursor = previous_cursor = None
+
+        queries = {
+            "sidebar": aio.run(get_sidebar),
+            "recent_posts": aio.fetch(
+                BlogPost.get_published().summaries().order_by("-published_at")[:5]
+            ),
+            "site_settings": load_site_settings(),
+        }
+
+        if page is not None:
+            # Offset pagination, kept for existing ?page= links
+            start = (page - 1) * posts_per_page
+            end = start + posts_per_page
+            queries["posts"] = aio.fetch(
+                posts_queryset.order_by("-published_at", "-id")[start:end]
+            )
+            queries["total_posts"] = acached_count("published_posts", posts_queryset)
+            results = await aio.gather(**queries)
+
+            posts = results["posts"]
+            has_next = end < results["total_posts"]
+            has_previous = page > 1
+        else:
+            # Keyset pagination on (published_at, id)
+            cursor = request.GET.get("cursor")
+            try:
+                if cursor:
+                    decode_cursor(cursor)
+            except InvalidCursor:
+                cursor = None
+            queries["page"] = apaginate_by_cursor(
+                posts_queryset, cursor, posts_per_page
+            )
+            results = await aio.gather(**queries)
+
+            result = results["page"]
+            posts = result.items
+            has_next = result.has_next
+            has_previous = result.has_previous
+            next_cursor = result.next_cursor
+            previous_cursor = result.previous_cursor
+
+        await aio.prefetch_references(posts)
+
+        context = {
+            "posts": posts,
+            "categories": results["sidebar"]["categories"],
+            "tags": results["sidebar"]["tags"],
+            "recent_posts": results["recent_posts"],
+            "page": page,
+            "has_next": has_next,
+            "has_previous": has_previous,
+            "next_page": page + 1 if page and has_next else None,
+            "previous_page": page - 1 if page and has_previous else None,
+            "next_cursor": next_cursor,
+            "previous_cursor": previous_cursor,
+            "page_title": "All Posts",
+        }
+        return render(request, "blog/post_list.html", context)
+
+    except Exception as e:
+        logger.error(f"Error in async post_list view: {e}")
+        return render(
+            request, "blog/error.html", {"error": "Unable to load posts"}, status=500
+        )
+
+
+@conditional(post_validators())
+@read_replica
+async def post_detail(request, slug):
+    """Individual post detail page"""
+    try:
+        results = await aio.gather(
+            post=aio.get(BlogPost.get_published(), slug=slug),
+            site_settings=load_site_settings(),
+        )
+        post = results["post"]
+
+        # Flushing the view counter may write to MongoDB
+        await aio.run(post.increment_view_count)
+
+        if post.related_post_ids:
+            related = aio.load_summaries(post.related_post_ids[:3])
+        else:
+            # Not precomputed yet, score on the fly
+            related = aio.run(post.get_related_posts, 3)
+        results = await aio.gather(
+            references=aio.prefetch_references([post]), related_posts=related
+        )
+
+        context = {
+            "post": post,
+            "related_posts": results["related_posts"],
+            "page_title": post.title,
+        }
+        return render(request, "blog/post_detail.html", context)
+
+    except DoesNotExist:
+        raise Http404("Post not found")
+    except Exception as e:
+        logger.error(f"Error in async post_detail view: {e}")
+        return render(
+            request, "blog/error.html", {"error": "Unable to load post"}, status=500
+        )
+
+
+# ============================================================================
+# Filtered Post Views
+# ============================================================================
+
+
+async def _filtered_posts(document, lookup, post_filter):
+    """Load the document a listing is filtered on, then its posts"""
+    results = await aio.gather(
+        owner=aio.get(document.objects, **lookup),
+        site_settings=load_site_settings(),
+    )
+    owner = results["owner"]
+    posts = await aio.fetch(
+        BlogPost.get_published()
+        .summaries()
+        .filter(**{post_filter: owner})
+        .order_by("-published_at")
+    )
+    return owner, await aio.prefetch_references(posts)
+
+
+@cache_page_for(
+    "posts_by_author", lambda username: [f"author:{username}", "site_settings"]
+)
+@conditional(listing_validators())
+@read_replica
+async def posts_by_author(request, username):
+    """Posts by specific author"""
+    try:
+        author, posts = await _filtered_posts(Author, {"username": username}, "author")
+
+        context = {
+            "author": author,
+            "posts": posts,
+            "page_title": f"Posts by {author.full_name or author.username}",
+        }
+        return render(request, "blog/posts_by_author.html", context)
+
+    except DoesNotExist:
+        raise Http404("Author not found")
+    except Exception as e:
+        logger.error(f"Error in async posts_by_author view: {e}")
+        return render(
+            request,
+            "blog/error.html",
+            {"error": "Unable to load author posts"},
+            status=500,
+        )
+
+
+@cache_page_for("posts_by_tag", lambda slug: [f"tag:{slug}", "site_settings"])
+@conditional(listing_validators())
+@read_replica
+async def posts_by_tag(request, slug):
+    """Posts by specific tag"""
+    try:
+        tag, posts = await _filtered_posts(Tag, {"slug": slug}, "tags")
+
+        context = {
+            "tag": tag,
+            "posts": posts,
+            "page_title": f'Posts tagged "{tag.name}"',
+        }
+        return render(request, "blog/posts_by_tag.html", context)
+
+    except DoesNotExist:
+        raise Http404("Tag not found")
+    except Exception as e:
+        logger.error(f"Error in async posts_by_tag view: {e}")
+        return render(
+            request,
+            "blog/error.html",
+            {"error": "Unable to load tag posts"},
+            status=500,
+        )
+
+
+@cache_page_for("posts_by_category", lambda slug: [f"category:{slug}", "site_settings"])
+@conditional(listing_validators())
+@read_replica
+async def posts_by_category(request, slug):
+    """Posts by specific category"""
+    try:
+        results = await aio.gather(
+            category=aio.get(Category.objects, slug=slug),
+            site_settings=load_site_settings(),
+        )
+        category = results["category"]
+        # Posts in the category and all of its subcategories
+        results = await aio.gather(
+            below=aio.fetch(Category.objects(ancestors=category.id).only("id")),
+            breadcrumbs=aio.in_bulk(Category.objects, category.ancestors),
+        )
+        posts = await aio.fetch(
+            BlogPost.get_published()
+            .summaries()
+            .filter(category__in=[category.id] + [c.id for c in results["below"]])
+            .order_by("-published_at")
+        )
+        await aio.prefetch_references(posts)
+        breadcrumbs = results["breadcrumbs"]
+
+        context = {
+            "category": category,
+            "breadcrumbs": [
+                breadcrumbs[i] for i in category.ancestors if i in breadcrumbs
+            ],
+            "posts": posts,
+            "page_title": f'Posts in "{category.name}"',
+        }
+        return render(request, "blog/posts_by_category.html", context)
+
+    except DoesNotExist:
+        raise Http404("Category not found")
+    except Exception as e:
+        logger.error(f"Error in async posts_by_category view: {e}")
+        return render(
+            request,
+            "blog/error.html",
+            {"error": "Unable to load category posts"},
+            status=500,
+        )
+
+
+# ============================================================================
+# API Endpoints
+# ============================================================================
+
+
+@conditional(listing_validators(site_settings=False))
+@read_replica
+async def api_posts(request):
+    """API endpoint for posts with pagination"""
+    try:
+        # 1 to 50 posts per page; a limit of 0 would never advance a cursor
+        limit = max(1, min(int(request.GET.get("limit", 10)), 50))
+        posts_queryset = BlogPost.get_published().summaries()
+
+        if "cursor" in request.GET or request.GET.get("pagination") == "cursor":
+            cursor = request.GET.get("cursor")
+            try:
+                if cursor:
+                    decode_cursor(cursor)
+            except InvalidCursor as e:
+                return JsonResponse({"error": str(e)}, status=400)
+
+            queries = {"page": apaginate_by_cursor(posts_queryset, cursor, limit)}
+            if request.GET.get("include_total") in ("1", "true"):
+                queries["total"] = acached_count("published_posts", posts_queryset)
+            results = await aio.gather(**queries)
+
+            result = results["page"]
+            posts = result.items
+            pagination = {
+                "mode": "cursor",
+                "limit": limit,
+                "next": result.next_cursor,
+                "prev": result.previous_cursor,
+                "has_next": result.has_next,
+                "has_previous": result.has_previous,
+            }
+            if "total" in results:
+                pagination["total"] = results["total"]
+        else:
+            page = max(1, int(request.GET.get("page", 1)))
+            offset = (page - 1) * limit
+
+            results = await aio.gather(
+                posts=aio.fetch(
+                    posts_queryset.order_by("-published_at", "-id")[
+                        offset : offset + limit
+                    ]
+                ),
+                total=acached_count("published_posts", posts_queryset),
+            )
+            posts, total = results["posts"], results["total"]
+            pagination = {
+                "page": page,
+                "limit": limit,
+                "total": total,
+                "pages": (total + limit - 1) // limit,
+                "has_next": offset + limit < total,
+                "has_previous": page > 1,
+            }
+
+        await aio.prefetch_references(posts)
+
+        return JsonResponse(
+            {
+                "posts": [serialize_post_summary(post) for post in posts],
+                "pagination": pagination,
+            }
+        )
+
+    except Exception as e:
+        logger.error(f"Error in async api_posts: {e}")
+        return JsonResponse({"error": "Unable to fetch posts"}, status=500)
+
+
+@conditional(post_validators(site_settings=False))
+@read_replica
+async def api_post_detail(request, slug):
+    """API endpoint for single post"""
+    try:
+        post = await aio.get(BlogPost.get_published(), slug=slug)
+
+        await aio.run(post.increment_view_count)
+        await aio.prefetch_references([post])
+
+        return JsonResponse(serialize_post(post))
+
+    except DoesNotExist:
+        return JsonResponse({"error": "Post not found"}, status=404)
+    except Exception as e:
+        logger.error(f"Error in async api_post_detail: {e}")
+        return JsonResponse({"error": "Unable to fetch post"}, status=500)
+
+
+@read_replica
+async def api_posts_export(request):
+    """Stream live posts as NDJSON, or the changes since ``updated_since``"""
+    try:
+        updated_since = parse_updated_since(request.GET.get("updated_since"))
+    except ValueError:
+        return JsonResponse(
+            {"error": "updated_since must be an ISO 8601 datetime"}, status=400
+        )
+
+    lines = export_lines(export_changes(updated_since), serialize_post)
+
+    async def stream():
+        # Each batch is fetched and serialised on a worker thread
+        while (chunk := await aio.run(next, lines, None)) is not None:
+            yield chunk
+
+    return StreamingHttpResponse(stream(), content_type="application/x-ndjson")
@@ -0,0 +1,211 @@
+"""Authentication against the MongoEngine User model
+
+:class:`MongoUserBackend` checks passwords and loads the user of each
+request. The per-request lookup is cached for AUTH_USER_CACHE_TTL seconds
+with only the fields a request needs, so most requests resolve their user
+without a query; ``save()`` and ``check_password()`` read the rest back. Logging in stamps ``last_login`` with a single ``$set``,
+and a hash made with outdated hasher parameters is upgraded on a background
+thread after the login has been answered.
+
+Django's ``login()`` and ``AuthenticationMiddleware`` expect a Django model
+primary key, so :func:`login` and :class:`AuthenticationMiddleware` here are
+the MongoEngine versions of both. Like Django's, they store the user's
+session auth hash at login and end sessions whose hash no longer matches,
+so changing a password logs out every other session;
+:func:`update_session_auth_hash` keeps the current one.
+
+The cache is the ``default`` one. Saving a user drops its cached copy there,
+which reaches every worker only when that cache is shared (Redis,
+Memcached); with the per-process locmem cache other workers see the change
+after at most AUTH_USER_CACHE_TTL seconds, so keep it short.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from bson import ObjectId
+from bson.errors import InvalidId
+from django.conf import settings
+from django.contrib.auth import (
+    BACKEND_SESSION_KEY,
+    HASH_SESSION_KEY,
+    SESSION_KEY,
+    load_backend,
+    user_logged_in,
+)
+from django.contrib.auth.backends import BaseBackend
+from django.contrib.auth.hashers import check_password, make_password
+from django.contrib.auth.middleware import (
+    AuthenticationMiddleware as DjangoAuthenticationMiddleware,
+)
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.auth.models import update_last_login as django_update_last_login
+from django.core.cache import cache
+from django.middleware.csrf import rotate_token
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+BACKEND_PATH = "blog.auth.MongoUserBackend"
+
+# Everything a request needs from its user; never the password hash
+REQUEST_USER_FIELDS = (
+    "id",
+    "username",
+    "email",
+    "first_name",
+    "last_name",
+    "is_active",
+    "is_staff",
+    "is_superuser",
+    "password_changed_at",
+)
+
+_rehash_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rehash")
+
+
+def _cache_key(user_id):
+    return f"auth:user:{user_id}"
+
+
+def forget_user(user_id):
+    """Drop the cached request user, e.g. after the user was saved"""
+    cache.delete(_cache_key(user_id))
+
+
+def rehash_password(user_id, encoded, raw_password):
+    """Store a hash with the current hasher parameters
+
+    Only replaces ``encoded``, so a password changed in the meantime wins.
+    """
+    try:
+        User._get_collection().update_one(
+            {"_id": user_id, "password": encoded},
+            {"$set": {"password": make_password(raw_password)}},
+        )
+    except Exception as e:
+        logger.error(f"Error upgrading the password hash of user {user_id}: {e}")
+
+
+class MongoUserBackend(BaseBackend):
+    """Authenticates by username or email and loads request users cheaply"""
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None or password is None:
+            return None
+        field = "email" if "@" in username else "username"
+        user = User.objects(**{field: username}).first()
+        if user is None:
+            # Hash anyway so unknown usernames take as long as wrong passwords
+            make_password(password)
+            return None
+
+        encoded = user.password
+        if not check_password(
+            password, encoded, setter=partial(self._upgrade, user.id, encoded)
+        ):
+            return None
+        return user if user.is_active else None
+
+    @staticmethod
+    def _upgrade(user_id, encoded, raw_password):
+        # Called by check_password when the hasher parameters are outdated
+        if getattr(settings, "AUTH_REHASH_IN_BACKGROUND", True):
+            _rehash_executor.submit(rehash_password, user_id, encoded, raw_password)
+        else:
+            rehash_password(user_id, encoded, raw_password)
+
+    def get_user(self, user_id):
+        try:
+            user_id = ObjectId(user_id)
+        except (InvalidId, TypeError):
+            return None
+
+        key = _cache_key(user_id)
+        son = cache.get(key)
+        if son is None:
+            user = User.objects(id=user_id).only(*REQUEST_USER_FIELDS).first()
+            if user is None:
+                return None
+            son = user.to_mongo().to_dict()
+            cache.set(key, son, getattr(settings, "AUTH_USER_CACHE_TTL", 5))
+        user = User._from_son(son)
+        # save() and check_password() read these back before using them
+        user._deferred_fields = tuple(
+            name for name in User._fields if name not in REQUEST_USER_FIELDS
+        )
+        return user if user.is_active else None
+
+
+def update_last_login(sender, user, **kwargs):
+    """Stamp ``last_login`` with one ``$set`` instead of saving the user"""
+    if not isinstance(user, User):
+        return django_update_last_login(sender, user, **kwargs)
+    user.last_login = datetime.utcnow()
+    User._get_collection().update_one(
+        {"_id": user.id}, {"$set": {"last_login": user.last_login}}
+    )
+
+
+def _hash_matches(session, user):
+    return constant_time_compare(
+        session.get(HASH_SESSION_KEY, ""), user.get_session_auth_hash()
+    )
+
+
+def login(request, user, backend=BACKEND_PATH):
+    """``django.contrib.auth.login`` for MongoEngine users"""
+    if SESSION_KEY in request.session and (
+        request.session[SESSION_KEY] != str(user.id)
+        or not _hash_matches(request.session, user)
+    ):
+        # Never reuse the session of another user, or of an old password
+        request.session.flush()
+    else:
+        request.session.cycle_key()
+
+    request.session[SESSION_KEY] = str(user.id)
+    request.session[BACKEND_SESSION_KEY] = backend
+    request.session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    if hasattr(request, "user"):
+        request.user = user
+    rotate_token(request)
+    user_logged_in.send(sender=user.__class__, request=request, user=user)
+
+
+def get_user(request):
+    """The user logged in to ``request.session``, or AnonymousUser
+
+    A session whose auth hash no longer matches, because the password was
+    changed since it logged in, is flushed.
+    """
+    user_id = request.session.get(SESSION_KEY)
+    backend_path = request.session.get(BACKEND_SESSION_KEY)
+    user = None
+    if user_id and backend_path in settings.AUTHENTICATION_BACKENDS:
+        user = load_backend(backend_path).get_user(user_id)
+        if user is not None and not _hash_matches(request.session, user):
+            request.session.flush()
+            user = None
+    return user or AnonymousUser()
+
+
+def update_session_auth_hash(request, user):
+    """Keep ``request``'s session logged in after ``user`` changed password"""
+    request.session.cycle_key()
+    if request.session.get(SESSION_KEY) == str(user.id):
+        request.session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+
+
+class AuthenticationMiddleware(DjangoAuthenticationMiddleware):
+    """Sets ``request.user`` from sessions written by :func:`login`"""
+
+    def process_request(self, request):
+        request.user = SimpleLazyObject(lambda: get_user(request))
+        request.auser = partial(sync_to_async(get_user), request)
@@ -0,0 +1,235 @@
+import asyncio
+import hashlib
+import math
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from .routing import read_collection
+
+# Validators set by blog.conditional, kept with the page so hits revalidate
+VALIDATOR_HEADERS = ("ETag", "Last-Modified")
+
+
+class PageCache:
+    """Caches rendered pages keyed on route, request URL and content versions
+
+    Every cached page declares the content it depends on as a list of tags
+    such as ``"posts"`` or ``"tag:django"``. Each tag has a version stored in
+    the cache backend and the versions are part of the page key, so bumping a
+    tag makes every page that depends on it miss without touching any other
+    page. Stale entries are simply left to expire. The URL includes the host,
+    since pages embed absolute links.
+    """
+
+    version_prefix = "pagecache:version:"
+    page_prefix = "pagecache:page:"
+
+    def __init__(self, alias=None):
+        self._alias = alias
+        self._lock = threading.Lock()
+        self._hits = defaultdict(int)
+        self._misses = defaultdict(int)
+
+    @property
+    def backend(self):
+        return caches[self._alias or getattr(settings, "PAGE_CACHE_ALIAS", "pages")]
+
+    def versions(self, tags):
+        """Current version of each tag, creating missing ones"""
+        keys = [self.version_prefix + tag for tag in tags]
+        versions = self.backend.get_many(keys)
+        for key in keys:
+            if key not in versions:
+                # A fresh unique value, so an evicted version never reuses
+                # the key of a page rendered before the eviction
+                self.backend.add(key, time.time_ns(), timeout=None)
+                versions[key] = self.backend.get(key)
+        return [versions[key] for key in keys]
+
+    def invalidate(self, *tags):
+        """Bump the version of each tag so dependent pages are re-rendered"""
+        self.backend.set_many(
+            {self.version_prefix + tag: time.time_ns() for tag in tags}, timeout=None
+        )
+
+    def make_key(self, route, url, tags):
+        versions = ",".join(str(version) for version in self.versions(tags))
+        digest = hashlib.md5(f"{url}|{versions}".encode()).hexdigest()
+        return f"{self.page_prefix}{route}:{digest}"
+
+    def get(self, key, route):
+        page = self.backend.get(key)
+        with self._lock:
+            if page is None:
+                self._misses[route] += 1
+            else:
+                self._hits[route] += 1
+        return page
+
+    def set(self, key, page, timeout=None):
+        if timeout is None:
+            self.backend.set(key, page)
+        else:
+            self.backend.set(key, page, timeout)
+
+    def stats(self):
+        """Hit and miss counters per route for this process"""
+        with self._lock:
+            routes = sorted(set(self._hits) | set(self._misses))
+            stats = {}
+            for route in routes:
+                hits, misses = self._hits[route], self._misses[route]
+                stats[route] = {
+                    "hits": hits,
+                    "misses": misses,
+                    "hit_ratio": hits / (hits + misses) if hits + misses else 0.0,
+                }
+            return stats
+
+    def reset_stats(self):
+        with self._lock:
+            self._hits.clear()
+            self._misses.clear()
+
+
+page_cache = PageCache()
+
+
+def is_cacheable_request(request):
+    """Only anonymous GETs without a session or pending messages are shared"""
+    if request.method not in ("GET", "HEAD"):
+        return False
+    if settings.SESSION_COOKIE_NAME in request.COOKIES:
+        return False
+    return "messages" not in request.COOKIES
+
+
+def page_timeout():
+    """Seconds a page rendered now may stay cached
+
+    A scheduled post going live bumps no tag, so no page outlives the next
+    scheduled publication; pages showing it are rendered again from then on.
+    """
+    from .models import BlogPost  # The models invalidate this cache
+
+    timeout = page_cache.backend.default_timeout
+    now = datetime.utcnow()
+    scheduled = read_collection(BlogPost).find_one(
+        {"is_published": True, "published_at": {"$gt": now}},
+        projection={"_id": 0, "published_at": 1},
+        sort=[("published_at", 1)],
+    )
+    if scheduled is None:
+        return timeout
+    until = math.ceil((scheduled["published_at"] - now).total_seconds())
+    return until if timeout is None else min(timeout, until)
+
+
+def _cached_page(route, request, dependencies, kwargs):
+    """Return ``(key, response)``; the response is None on a miss"""
+    key = page_cache.make_key(
+        route, request.build_absolute_uri(), dependencies(**kwargs)
+    )
+    page = page_cache.get(key, route)
+    if page is None:
+        return key, None
+    content, content_type, validators = page
+    response = HttpResponse(content, content_type=content_type, headers=validators)
+    response["X-Page-Cache"] = "hit"
+    # A client already holding this page gets a 304 without any query
+    last_modified = parse_http_date_safe(validators.get("Last-Modified", ""))
+    response = get_conditional_response(
+        request,
+        etag=validators.get("ETag"),
+        last_modified=last_modified,
+        response=response,
+    )
+    return key, response
+
+
+def _store_when_sent(key, chunks, content_type, validators, timeout):
+    """Yield ``chunks``, caching the whole page once the last one was sent"""
+    sent = []
+    for chunk in chunks:
+        sent.append(chunk)
+        yield chunk
+    page_cache.set(key, (b"".join(sent), content_type, validators), timeout)
+
+
+def _store_page(key, response, timeout):
+    if response.status_code == 200:
+        validators = {
+            name: response[name] for name in VALIDATOR_HEADERS if name in response
+        }
+        if not response.streaming:
+            page_cache.set(
+                key,
+                (response.content, response["Content-Type"], validators),
+                timeout,
+            )
+        elif not response.is_async:
+            # Streamed pages are cached once fully sent; hits are served whole
+            response.streaming_content = _store_when_sent(
+                key,
+                response.streaming_content,
+                response["Content-Type"],
+                validators,
+                timeout,
+            )
+    response["X-Page-Cache"] = "miss"
+    return response
+
+
+def cache_page_for(route, dependencies):
+    """Serve a view from the page cache for anonymous visitors
+
+    ``dependencies`` receives the view's URL keyword arguments and returns
+    the tags the rendered page depends on. Works on sync and async views;
+    both page cache backends are local, so lookups do not block for long,
+    and async views look up the timeout of a page to store on a thread.
+    """
+
+    def decorator(view):
+        if asyncio.iscoroutinefunction(view):
+
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if not is_cacheable_request(request):
+                    return await view(request, *args, **kwargs)
+                key, response = _cached_page(route, request, dependencies, kwargs)
+                if response is not None:
+                    return response
+                response = await view(request, *args, **kwargs)
+                timeout = None
+                if response.status_code == 200:
+                    timeout = await sync_to_async(
+                        page_timeout, thread_sensitive=False
+                    )()
+                return _store_page(key, response, timeout)
+
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not is_cacheable_request(request):
+                return view(request, *args, **kwargs)
+            key, response = _cached_page(route, request, dependencies, kwargs)
+            if response is not None:
+                return response
+            response = view(request, *args, **kwargs)
+            timeout = page_timeout() if response.status_code == 200 else None
+            return _store_page(key, response, timeout)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,179 @@
+"""HTTP conditional requests for post pages, listings and the JSON API
+
+A view decorated with :func:`conditional` computes its validators first: for
+a post, one projected lookup of its ``updated_at`` plus the
+:class:`~blog.models.ChangeVersion` of the collections its page shows (its
+author, tags and category, and the related posts); for a listing, the
+change versions of every collection it shows. A client whose
+``If-None-Match`` or ``If-Modified-Since`` still matches gets a 304 without
+the document being loaded, serialised or rendered. Everything else gets the
+full response with ``ETag`` and ``Last-Modified`` set.
+
+A scheduled post going live changes no version, so listings of posts also
+include the ``published_at`` of the newest live post, one lookup on the
+published index.
+"""
+
+import asyncio
+import calendar
+import hashlib
+from collections import namedtuple
+from datetime import datetime
+from functools import wraps
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from . import aio
+from .cache import is_cacheable_request
+from .counters import view_counter
+from .models import BlogPost, ChangeVersion, SiteSettings
+from .routing import read_collection, read_replica
+
+# ``not_modified`` runs instead of the view when the answer is a 304
+Validators = namedtuple(
+    "Validators", ["etag", "last_modified", "not_modified"], defaults=[None]
+)
+
+LISTING_COLLECTIONS = ("blog_posts", "authors", "tags", "categories")
+
+# What a post page shows besides the post: its author, tags and category,
+# and the related posts
+POST_COLLECTIONS = ("blog_posts", "authors", "tags", "categories")
+
+
+def _etag(*parts):
+    digest = hashlib.md5("|".join(str(part) for part in parts).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def _timestamp(value):
+    return calendar.timegm(value.utctimetuple()) if value else None
+
+
+def latest_publication():
+    """``published_at`` of the newest live post, None when there is none"""
+    post = read_collection(BlogPost).find_one(
+        {"is_published": True, "published_at": {"$lte": datetime.utcnow()}},
+        projection={"_id": 0, "published_at": 1},
+        sort=[("published_at", -1)],
+    )
+    return post["published_at"] if post else None
+
+
+def post_validators(site_settings=True):
+    """Validators of one live post and what its page shows
+
+    Views are still counted on a 304, since the reader did see the post.
+    HTML pages also depend on the site settings, which are cached in process.
+    """
+
+    def validators(request, slug):
+        post = read_collection(BlogPost).find_one(
+            {
+                "slug": slug,
+                "is_published": True,
+                "published_at": {"$lte": datetime.utcnow()},
+            },
+            projection={"updated_at": 1},
+        )
+        if post is None:
+            return None
+        versions = ChangeVersion.current(POST_COLLECTIONS)
+        # Last-Modified only has whole seconds, the ETag keeps milliseconds
+        parts = [post["_id"], post["updated_at"].isoformat()]
+        parts += [version for version, _ in versions]
+        modified = [post["updated_at"]] + [updated_at for _, updated_at in versions]
+        if site_settings:
+            site = SiteSettings.get_settings()
+            parts.append(site.version)
+            modified.append(site.updated_at)
+        return Validators(
+            _etag(*parts),
+            max(filter(None, modified)),
+            lambda: view_counter.increment(post["_id"]),
+        )
+
+    return validators
+
+
+def listing_validators(collections=LISTING_COLLECTIONS, site_settings=True):
+    """Validators of a listing from the change versions of ``collections``"""
+
+    def validators(request, *args, **kwargs):
+        versions = ChangeVersion.current(collections)
+        parts = [request.get_full_path()] + [version for version, _ in versions]
+        modified = [updated_at for _, updated_at in versions]
+        if "blog_posts" in collections:
+            published_at = latest_publication()
+            parts.append(published_at)
+            modified.append(published_at)
+        if site_settings:
+            site = SiteSettings.get_settings()
+            parts.append(site.version)
+            modified.append(site.updated_at)
+        modified = [value for value in modified if value]
+        return Validators(_etag(*parts), max(modified) if modified else None)
+
+    return validators
+
+
+def _check(validators, request, args, kwargs):
+    """Return ``(validators, response)``; the response is None unless a 304"""
+    if not is_cacheable_request(request):
+        return None, None
+    found = validators(request, *args, **kwargs)
+    if found is None:
+        return None, None
+    response = get_conditional_response(
+        request, etag=found.etag, last_modified=_timestamp(found.last_modified)
+    )
+    if response is not None and response.status_code == 304 and found.not_modified:
+        found.not_modified()
+    return found, response
+
+
+def _set_headers(response, found):
+    if found is None or response.status_code not in (200, 304):
+        return response
+    response.headers.setdefault("ETag", found.etag)
+    if found.last_modified:
+        response.headers.setdefault(
+            "Last-Modified", http_date(_timestamp(found.last_modified))
+        )
+    return response
+
+
+def conditional(validators):
+    """Answer revalidations of a sync or async view with 304 when unchanged
+
+    Only applies where the page cache would: the validators do not cover
+    session-specific content, so requests with a session are always served
+    in full. Lookups are routed like the read views.
+    """
+    validators = read_replica(validators)
+
+    def decorator(view):
+        if asyncio.iscoroutinefunction(view):
+
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                found, response = await aio.run(
+                    _check, validators, request, args, kwargs
+                )
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                return _set_headers(response, found)
+
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            found, response = _check(validators, request, args, kwargs)
+            if response is None:
+                response = view(request, *args, **kwargs)
+            return _set_headers(response, found)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,21 @@
+import logging
+
+from django.utils.functional import SimpleLazyObject
+
+from .models import SiteSettings
+
+logger = logging.getLogger(__name__)
+
+
+def _load_site_settings():
+    try:
+        return SiteSettings.get_settings()
+    except Exception as e:
+        # Error pages must still render when MongoDB is unavailable
+        logger.error(f"Error loading site settings: {e}")
+        return None
+
+
+def site_settings(request):
+    """Expose the cached SiteSettings to every template as ``site_settings``"""
+    return {"site_settings": SimpleLazyObject(_load_site_settings)}
@@ -0,0 +1,105 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCounter:
+    """Buffers post view increments in process and flushes them in bulk
+
+    Increments are collected per post id and written with a single unordered
+    ``bulk_write`` of ``$inc`` operations once the flush interval has elapsed
+    or the buffer grows past ``max_pending``. ``$inc`` is commutative, so any
+    number of workers can flush independently without losing views.
+    """
+
+    def __init__(self, field="view_count", flush_interval=None, max_pending=None):
+        self.field = field
+        self._flush_interval = flush_interval
+        self._max_pending = max_pending
+        self._lock = threading.Lock()
+        self._pending = defaultdict(int)
+        self._pending_total = 0
+        self._last_flush = time.monotonic()
+
+    @property
+    def flush_interval(self):
+        if self._flush_interval is not None:
+            return self._flush_interval
+        return getattr(settings, "VIEW_COUNT_FLUSH_INTERVAL", 5.0)
+
+    @property
+    def max_pending(self):
+        if self._max_pending is not None:
+            return self._max_pending
+        return getattr(settings, "VIEW_COUNT_MAX_PENDING", 1000)
+
+    def increment(self, post_id, amount=1):
+        """Record views for a post, flushing if the buffer is due"""
+        with self._lock:
+            self._pending[post_id] += amount
+            self._pending_total += amount
+            due = (
+                self._pending_total >= self.max_pending
+                or time.monotonic() - self._last_flush >= self.flush_interval
+            )
+        if due:
+            self.flush()
+
+    def pending(self, post_id):
+        """Views recorded for a post that have not been flushed yet"""
+        with self._lock:
+            return self._pending.get(post_id, 0)
+
+    def flush(self):
+        """Write all buffered increments; returns the number of posts updated"""
+        with self._lock:
+            batch = self._pending
+            self._pending = defaultdict(int)
+            self._pending_total = 0
+            self._last_flush = time.monotonic()
+
+        if not batch:
+            return 0
+
+        # Imported lazily to avoid a circular import with blog.models
+        from .models import BlogPost
+
+        requests = [
+            UpdateOne({"_id": post_id}, {"$inc": {self.field: count}})
+            for post_id, count in batch.items()
+        ]
+        try:
+            BlogPost._get_collection().bulk_write(requests, ordered=False)
+        except Exception as e:
+            logger.error(f"Error flushing view counts: {e}")
+            # Put the increments back so the next flush retries them
+            with self._lock:
+                for post_id, count in batch.items():
+                    self._pending[post_id] += count
+                    self._pending_total += count
+            return 0
+        return len(requests)
+
+    def reset(self):
+        """Drop all buffered increments without writing them"""
+        with self._lock:
+            self._pending = defaultdict(int)
+            self._pending_total = 0
+            self._last_flush = time.monotonic()
+
+
+view_counter = ViewCounter()
+
+atexit.register(view_counter.flush)
+
+# A forked worker must not flush increments buffered by its parent
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=view_counter.reset)
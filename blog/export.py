@@ -0,0 +1,138 @@
+"""Streaming NDJSON export of live posts for search and analytics sync
+
+Posts are read from server-side cursors in change order, EXPORT_BATCH_SIZE
+documents per round trip. Each batch has its authors, tags and categories
+resolved with one ``$in`` query per collection, is serialised and yielded
+as NDJSON lines, then dropped, so memory stays flat however many posts
+there are.
+
+Every line carries a ``changed_at``. A client syncs incrementally by
+passing the ``changed_at`` of the last line it received as
+``updated_since``. Changes at exactly that instant are sent again, so
+consumers should upsert by ``id``. An incremental export also reports
+posts that are gone:
+
+- it sends a tombstone, ``{"id": ..., "deleted": true, "changed_at": ...}``,
+  for a post that was deleted, unpublished or rescheduled since then;
+- it sends a scheduled post that went live since then at its
+  ``published_at``, since going live does not touch ``updated_at``.
+
+A full export, without ``updated_since``, only has live posts.
+"""
+
+import heapq
+import json
+from datetime import datetime, timezone
+
+from django.conf import settings
+
+from .models import BlogPost, DeletedPost, prefetch_references
+from .routing import current_read_alias, read_collection, reading_from
+
+
+def parse_updated_since(value):
+    """Naive UTC datetime from an ISO 8601 string; raises ValueError"""
+    if not value:
+        return None
+    since = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    return since
+
+
+def _is_live(document, now):
+    published_at = document.get("published_at")
+    return bool(document.get("is_published") and published_at and published_at <= now)
+
+
+def _changes(cursor, time_field, now):
+    # Anything but a live post, deleted post records included, is a tombstone
+    for document in cursor:
+        live = _is_live(document, now)
+        yield document[time_field], document["_id"], document if live else None
+
+
+def export_changes(updated_since=None, batch_size=None, now=None):
+    """``(changed_at, id, document)`` of each change, oldest first
+
+    ``document`` is the raw post, or None for a tombstone. The cursors are
+    bound to the collection reads route to when this is called.
+    """
+    batch_size = batch_size or getattr(settings, "EXPORT_BATCH_SIZE", 500)
+    now = now or datetime.utcnow()
+    posts = read_collection(BlogPost)
+
+    if updated_since is None:
+        live = {"is_published": True, "published_at": {"$lte": now}}
+        cursor = posts.find(live).sort([("updated_at", 1), ("_id", 1)])
+        return _changes(cursor.batch_size(batch_size), "updated_at", now)
+
+    # Every post changed since, live or not: the rest become tombstones
+    changed = (
+        posts.find({"updated_at": {"$gte": updated_since}})
+        .sort([("updated_at", 1), ("_id", 1)])
+        .batch_size(batch_size)
+    )
+    # Posts that went live since without being changed
+    went_live = (
+        posts.find(
+            {
+                "is_published": True,
+                "published_at": {"$gte": updated_since, "$lte": now},
+                "updated_at": {"$lt": updated_since},
+            }
+        )
+        .sort([("published_at", 1), ("_id", 1)])
+        .batch_size(batch_size)
+    )
+    deleted = (
+        read_collection(DeletedPost)
+        .find({"deleted_at": {"$gte": updated_since}})
+        .sort([("deleted_at", 1), ("_id", 1)])
+        .batch_size(batch_size)
+    )
+    return heapq.merge(
+        _changes(changed, "updated_at", now),
+        _changes(went_live, "published_at", now),
+        _changes(deleted, "deleted_at", now),
+        key=lambda change: change[:2],
+    )
+
+
+def _render(changes, serialize, alias):
+    posts = [BlogPost._from_son(document) for _, _, document in changes if document]
+    # The response is streamed after the view returned, so routing is
+    # restored here for the reference lookups
+    with reading_from(alias):
+        posts = iter(prefetch_references(posts))
+
+    lines = []
+    for changed_at, post_id, document in changes:
+        if document:
+            row = serialize(next(posts))
+        else:
+            row = {"id": str(post_id), "deleted": True}
+        row["changed_at"] = changed_at.isoformat()
+        lines.append(json.dumps(row) + "\n")
+    return "".join(lines)
+
+
+def export_lines(changes, serialize, batch_size=None):
+    """Iterator of NDJSON chunks, one per batch of ``changes``
+
+    Call it in the view: the read alias is captured now, not when the
+    response starts streaming.
+    """
+    batch_size = batch_size or getattr(settings, "EXPORT_BATCH_SIZE", 500)
+    return _chunks(changes, serialize, batch_size, current_read_alias())
+
+
+def _chunks(changes, serialize, batch_size, alias):
+    batch = []
+    for change in changes:
+        batch.append(change)
+        if len(batch) >= batch_size:
+            yield _render(batch, serialize, alias)
+            batch = []
+    if batch:
+        yield _render(batch, serialize, alias)
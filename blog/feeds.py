@@ -0,0 +1,185 @@
+"""Sitemaps and RSS/Atom feeds of the published posts
+
+Both are generated from projected cursors over the raw collection, so no
+post document is ever built. A sitemap holds at most SITEMAP_MAX_URLS
+(50,000, the protocol limit) URLs. Above that, ``sitemap.xml`` becomes a
+sitemap index of numbered sections ordered by ``_id``, and each section is
+streamed in chunks of SITEMAP_CHUNK_SIZE URLs. The ``_id`` each section
+starts at is found once per change of the posts and cached, so a section is
+read as an ``_id`` range rather than by skipping the ones before it. Feeds
+carry the newest FEED_ITEMS posts.
+
+The views cache the output in the page cache under the ``posts`` tag, so it
+is regenerated only after a post changes, and answer revalidations with 304
+through :mod:`blog.conditional`.
+"""
+
+from datetime import datetime, timezone
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils import feedgenerator
+
+from .cache import page_cache, page_timeout
+from .models import BlogPost
+from .routing import read_collection
+
+SITEMAP_HEADER = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+)
+SITEMAP_FOOTER = "</urlset>\n"
+SITEMAP_STARTS_KEY = "sitemap:section-starts"
+
+
+def _published(now=None):
+    return {"is_published": True, "published_at": {"$lte": now or datetime.utcnow()}}
+
+
+def _max_urls():
+    return getattr(settings, "SITEMAP_MAX_URLS", 50000)
+
+
+def _w3c_date(value):
+    return value.replace(tzinfo=timezone.utc).isoformat(timespec="seconds")
+
+
+# ============================================================================
+# Sitemaps
+# ============================================================================
+
+
+def _find_section_starts():
+    """``_id`` of the first post of every section after the first one"""
+    collection = read_collection(BlogPost)
+    live = _published()
+    starts = []
+    while True:
+        after = {"_id": {"$gte": starts[-1]}} if starts else {}
+        following = list(
+            collection.find({**live, **after}, {"_id": 1})
+            .sort("_id", 1)
+            .skip(_max_urls())
+            .limit(1)
+        )
+        if not following:
+            return starts
+        starts.append(following[0]["_id"])
+
+
+def sitemap_section_starts():
+    """Section boundaries, found again only once the posts changed
+
+    Cached with the page cache's ``posts`` version, and for at most as long
+    as a sitemap page, so sections follow posts going live too.
+    """
+    version = page_cache.versions(["posts"])[0]
+    cached = cache.get(SITEMAP_STARTS_KEY)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    starts = _find_section_starts()
+    cache.set(SITEMAP_STARTS_KEY, (version, starts), page_timeout())
+    return starts
+
+
+def sitemap_section_count():
+    """Number of sitemap sections the published posts need"""
+    return len(sitemap_section_starts()) + 1
+
+
+def sitemap_cursor(section=None):
+    """Slug and ``updated_at`` of the posts in ``section``, or of all posts"""
+    query = _published()
+    if section is not None:
+        starts = sitemap_section_starts()
+        bounds = {}
+        if section > 1:
+            bounds["$gte"] = starts[section - 2]
+        if section <= len(starts):
+            bounds["$lt"] = starts[section - 1]
+        if bounds:
+            query["_id"] = bounds
+    return (
+        read_collection(BlogPost)
+        .find(query, {"_id": 0, "slug": 1, "updated_at": 1})
+        .sort("_id", 1)
+    )
+
+
+def sitemap_chunks(cursor, build_url, chunk_size=None):
+    """Iterator of ``<urlset>`` XML chunks for the posts of ``cursor``"""
+    chunk_size = chunk_size or getattr(settings, "SITEMAP_CHUNK_SIZE", 1000)
+    yield SITEMAP_HEADER
+    lines = []
+    for doc in cursor:
+        location = escape(build_url(reverse("blog:post_detail", args=[doc["slug"]])))
+        lastmod = _w3c_date(doc["updated_at"])
+        lines.append(f"<url><loc>{location}</loc><lastmod>{lastmod}</lastmod></url>\n")
+        if len(lines) >= chunk_size:
+            yield "".join(lines)
+            lines = []
+    yield "".join(lines) + SITEMAP_FOOTER
+
+
+def sitemap_index(sections, build_url):
+    """The ``<sitemapindex>`` listing every section"""
+    entries = "".join(
+        f"<sitemap><loc>"
+        f"{escape(build_url(reverse('blog:sitemap_section', args=[section])))}"
+        f"</loc></sitemap>\n"
+        for section in range(1, sections + 1)
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+        f"{entries}</sitemapindex>\n"
+    )
+
+
+# ============================================================================
+# Feeds
+# ============================================================================
+
+
+def feed_items(limit=None):
+    """The newest published posts, projected to what a feed entry shows"""
+    limit = limit or getattr(settings, "FEED_ITEMS", 50)
+    return list(
+        read_collection(BlogPost)
+        .find(
+            _published(),
+            {"slug": 1, "title": 1, "excerpt": 1, "published_at": 1, "updated_at": 1},
+        )
+        .sort([("published_at", -1), ("_id", -1)])
+        .limit(limit)
+    )
+
+
+def build_feed(feed_class, site, feed_url, build_url, items):
+    """A ``django.utils.feedgenerator`` feed of ``items``"""
+    feed = feed_class(
+        title=site.site_name,
+        link=build_url(reverse("blog:home")),
+        description=site.site_description or site.site_name,
+        feed_url=feed_url,
+        language=settings.LANGUAGE_CODE,
+    )
+    for item in items:
+        link = build_url(reverse("blog:post_detail", args=[item["slug"]]))
+        feed.add_item(
+            title=item["title"],
+            link=link,
+            description=item.get("excerpt") or "",
+            unique_id=link,
+            pubdate=item["published_at"].replace(tzinfo=timezone.utc),
+            updateddate=item["updated_at"].replace(tzinfo=timezone.utc),
+        )
+    return feed
+
+
+FEED_CLASSES = {
+    "rss": feedgenerator.Rss201rev2Feed,
+    "atom": feedgenerator.Atom1Feed,
+}
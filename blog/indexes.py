@@ -0,0 +1,334 @@
+"""Index audit and synchronisation for the blog Documents
+
+The indexes each Document declares in ``meta["indexes"]``, plus the ones
+``unique=True`` fields imply, are the source of truth. :func:`index_plan`
+compares them with the indexes each collection has: missing ones are
+created, and one whose options changed (say a plain index becoming a TTL
+index) is created again under the same name. Of the indexes no Document
+declares, only the redundant ones, whose keys lead a declared index, are
+dropped; the others, such as indexes added by hand, are reported and only
+dropped with ``drop_undeclared``. Indexes are read and written through the raw
+collections, since ``_get_collection()`` would first try to create the
+declared indexes and fail on exactly those option conflicts.
+
+:func:`audit_queries` runs ``explain()`` for the query shapes the views
+send and reports plans that scan the whole collection (COLLSCAN) or sort in
+memory (SORT).
+"""
+
+from collections import namedtuple
+from datetime import datetime
+
+from bson import ObjectId
+
+from .models import (
+    Author,
+    BlogPost,
+    Category,
+    ChangeVersion,
+    DeletedPost,
+    Newsletter,
+    NewsletterSend,
+    SiteSettings,
+    Tag,
+    User,
+    UserSession,
+)
+
+DOCUMENTS = (
+    User,
+    Author,
+    Tag,
+    Category,
+    BlogPost,
+    DeletedPost,
+    Newsletter,
+    NewsletterSend,
+    UserSession,
+    ChangeVersion,
+    SiteSettings,
+)
+
+# Options that make two indexes on the same keys different indexes
+INDEX_OPTIONS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression")
+
+# Plan stages that mean the query is not served by an index
+PROBLEM_STAGES = ("COLLSCAN", "SORT")
+
+IndexChange = namedtuple("IndexChange", "action collection name spec")
+QueryPlan = namedtuple("QueryPlan", "name collection indexes problems")
+
+
+# ============================================================================
+# Declared and existing indexes
+# ============================================================================
+
+
+def _raw_collection(document):
+    return document._get_db()[document._get_collection_name()]
+
+
+def index_name(spec):
+    """The name MongoDB gives the index of a mongoengine index spec"""
+    if spec.get("name"):
+        return spec["name"]
+    return "_".join(f"{field}_{direction}" for field, direction in spec["fields"])
+
+
+def _options(index):
+    options = {key: index[key] for key in INDEX_OPTIONS if key in index}
+    for flag in ("unique", "sparse"):
+        if not options.get(flag):
+            options.pop(flag, None)
+    return options
+
+
+def declared_indexes(document):
+    """``{name: spec}`` of the indexes ``document`` declares"""
+    return {index_name(spec): spec for spec in document._meta["index_specs"]}
+
+
+def redundant_indexes(document):
+    """``(name, covered_by)`` of declared indexes a longer one already serves
+
+    An index is redundant when its keys are a prefix of another declared
+    index's keys and it adds no options, such as ``unique``, of its own.
+    """
+    specs = list(document._meta["index_specs"])
+    redundant = []
+    for spec in specs:
+        if _options(spec) or spec.get("name"):
+            continue
+        fields = spec["fields"]
+        for other in specs:
+            if other is not spec and other["fields"][: len(fields)] == fields:
+                redundant.append((index_name(spec), index_name(other)))
+                break
+    return redundant
+
+
+def _keys(fields):
+    # Servers may report 1.0 for 1; text and hashed keys are strings
+    return [
+        (field, int(kind) if isinstance(kind, float) else kind)
+        for field, kind in fields
+    ]
+
+
+def _leads_declared(index, declared):
+    """Whether a declared index serves every query ``index`` does"""
+    keys = _keys(index["key"])
+    return not _options(index) and any(
+        _keys(spec["fields"])[: len(keys)] == keys for spec in declared.values()
+    )
+
+
+def index_plan(documents=DOCUMENTS, drop_undeclared=False):
+    """The :class:`IndexChange` list bringing the collections in line
+
+    Undeclared indexes that are not redundant come back as ``"undeclared"``
+    changes, which are not applied, unless ``drop_undeclared`` is set.
+    """
+    changes = []
+    for document in documents:
+        collection = _raw_collection(document)
+        existing = collection.index_information()
+        declared = declared_indexes(document)
+
+        for name, spec in declared.items():
+            if name not in existing:
+                changes.append(IndexChange("create", collection.name, name, spec))
+            elif _options(existing[name]) != _options(spec):
+                changes.append(IndexChange("recreate", collection.name, name, spec))
+        for name, index in existing.items():
+            if name == "_id_" or name in declared:
+                continue
+            drop = drop_undeclared or _leads_declared(index, declared)
+            action = "drop" if drop else "undeclared"
+            changes.append(IndexChange(action, collection.name, name, index))
+    return changes
+
+
+def _recreate(collection, name, fields, options):
+    # MongoDB refuses two indexes on the same keys, so a stand-in with _id
+    # appended serves the queries while the index is rebuilt
+    stand_in = None
+    if "_id" not in dict(fields):
+        stand_in = f"{name}_rebuild"
+        collection.create_index(list(fields) + [("_id", 1)], name=stand_in)
+    collection.drop_index(name)
+    collection.create_index(fields, name=name, **options)
+    if stand_in:
+        collection.drop_index(stand_in)
+
+
+def apply_index_plan(changes, documents=DOCUMENTS):
+    """Apply ``changes``; returns the number applied
+
+    Indexes are created before any is dropped, and a recreated index is
+    stood in for while it is rebuilt, so the queries keep an index to use
+    throughout. ``"undeclared"`` changes are left alone.
+    """
+    collections = {
+        document._get_collection_name(): _raw_collection(document)
+        for document in documents
+    }
+    order = {"create": 0, "recreate": 1, "drop": 2}
+    applied = 0
+    changes = [change for change in changes if change.action in order]
+    for change in sorted(changes, key=lambda change: order[change.action]):
+        collection = collections[change.collection]
+        if change.action == "drop":
+            collection.drop_index(change.name)
+        else:
+            options = dict(change.spec)
+            fields = options.pop("fields")
+            options.pop("name", None)
+            if change.action == "create":
+                collection.create_index(fields, name=change.name, **options)
+            else:
+                _recreate(collection, change.name, fields, options)
+        applied += 1
+    return applied
+
+
+# ============================================================================
+# Query plans
+# ============================================================================
+
+
+def query_shapes():
+    """``(name, document, build)`` for each query shape the views send
+
+    ``build()`` returns the queryset. Filter values are placeholders; the
+    plan depends on the shape only.
+    """
+    now = datetime.utcnow()
+    some_id = ObjectId()
+
+    def published():
+        return BlogPost.get_published()
+
+    return [
+        ("featured posts", BlogPost, lambda: BlogPost.get_featured().limit(3)),
+        (
+            "recent posts",
+            BlogPost,
+            lambda: published().order_by("-published_at").limit(6),
+        ),
+        (
+            "post list page",
+            BlogPost,
+            lambda: published().order_by("-published_at", "-id").limit(11),
+        ),
+        (
+            "posts by author",
+            BlogPost,
+            lambda: published().filter(author=some_id).order_by("-published_at"),
+        ),
+        (
+            "posts by tag",
+            BlogPost,
+            lambda: published().filter(tags=some_id).order_by("-published_at"),
+        ),
+        (
+            "posts by category",
+            BlogPost,
+            lambda: published().filter(category=some_id).order_by("-published_at"),
+        ),
+        (
+            "next scheduled post",
+            BlogPost,
+            lambda: BlogPost.objects(is_published=True, published_at__gt=now)
+            .order_by("published_at")
+            .limit(1),
+        ),
+        (
+            "sitemap section",
+            BlogPost,
+            lambda: published().filter(id__gte=some_id, id__lt=some_id).order_by("id"),
+        ),
+        (
+            "post detail",
+            BlogPost,
+            lambda: BlogPost.get_published().filter(slug="slug"),
+        ),
+        (
+            "post export",
+            BlogPost,
+            lambda: BlogPost.objects(updated_at__gte=now).order_by("updated_at", "id"),
+        ),
+        (
+            "export deletions",
+            DeletedPost,
+            lambda: DeletedPost.objects(deleted_at__gte=now).order_by(
+                "deleted_at", "id"
+            ),
+        ),
+        (
+            "related neighbours",
+            BlogPost,
+            lambda: BlogPost.objects(related_post_ids=some_id),
+        ),
+        (
+            "dashboard recent",
+            BlogPost,
+            lambda: BlogPost.objects.order_by("-created_at").limit(5),
+        ),
+        ("author page", Author, lambda: Author.objects(username="username")),
+        ("tag page", Tag, lambda: Tag.objects(slug="slug")),
+        ("category page", Category, lambda: Category.objects(slug="slug")),
+        ("login by username", User, lambda: User.objects(username="username")),
+        ("login by email", User, lambda: User.objects(email="user@example.com")),
+        (
+            "newsletter signup",
+            Newsletter,
+            lambda: Newsletter.objects(email="user@example.com"),
+        ),
+        (
+            "newsletter batch",
+            Newsletter,
+            lambda: Newsletter.objects(is_active=True, id__gt=some_id)
+            .order_by("id")
+            .limit(500),
+        ),
+        (
+            "session lookup",
+            UserSession,
+            lambda: UserSession.objects(session_key="key", expire_date__gt=now),
+        ),
+    ]
+
+
+def plan_stages(plan):
+    """``(stage, index_name)`` of every stage of an explained plan"""
+    # Plans run by the slot based engine nest the plan under queryPlan
+    plan = plan.get("queryPlan", plan)
+    stages = [(plan.get("stage"), plan.get("indexName"))]
+    children = plan.get("inputStages") or []
+    if "inputStage" in plan:
+        children = [plan["inputStage"]]
+    for child in children:
+        stages.extend(plan_stages(child))
+    return stages
+
+
+def explain_plan(name, document, build):
+    """The :class:`QueryPlan` of the winning plan of ``build()``'s queryset"""
+    collection = document._get_collection_name()
+    try:
+        # Building the queryset may create indexes, so it can fail too
+        explained = build().explain()
+    except Exception as e:
+        return QueryPlan(name, collection, [], [f"explain failed: {e}"])
+
+    stages = plan_stages(explained["queryPlanner"]["winningPlan"])
+    indexes = [index for _, index in stages if index]
+    problems = [stage for stage, _ in stages if stage in PROBLEM_STAGES]
+    return QueryPlan(name, collection, indexes, problems)
+
+
+def audit_queries(shapes=None):
+    """A :class:`QueryPlan` for each of ``shapes``, by default the views'"""
+    shapes = query_shapes() if shapes is None else shapes
+    return [explain_plan(*shape) for shape in shapes]
@@ -0,0 +1,221 @@
+"""Batched newsletter mailing
+
+:func:`send_digest` mails a digest of recent posts to every active
+subscriber. Subscribers are read in ``_id`` ranges of NEWSLETTER_BATCH_SIZE,
+each range one indexed query starting after the last id, so memory stays
+flat however long the list is. Batches are rendered on a pool of
+NEWSLETTER_WORKERS threads while earlier batches are sent, in order, over
+one connection of NEWSLETTER_EMAIL_BACKEND. Any Django email backend works;
+the default console backend only prints.
+
+Progress is checkpointed in :class:`~blog.models.NewsletterSend` after each
+batch. Running again with the same key resumes after the last completed
+batch, so a crash between sending a batch and recording it sends that one
+batch twice, never skips one. A run leases the send for
+NEWSLETTER_LEASE_SECONDS, renewed at each checkpoint, and a second run with
+the same key raises :class:`SendInProgress` instead of sending alongside it.
+
+Every digest carries a signed link to unsubscribe its recipient, also in
+the ``List-Unsubscribe`` headers for one-click unsubscribing.
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from functools import partial
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.mail import EmailMessage, get_connection
+from django.template.loader import render_to_string
+from django.urls import reverse
+
+from mongoengine import NotUniqueError
+
+from .models import BlogPost, Newsletter, NewsletterSend, SiteSettings
+from .routing import read_collection
+
+DIGEST_FIELDS = {"title": 1, "slug": 1, "excerpt": 1, "published_at": 1}
+
+
+class SendInProgress(Exception):
+    """Another run holds the lease on the mailing"""
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def subscriber_batches(after=None, batch_size=None):
+    """Active subscribers in ``_id`` order, ``batch_size`` per list"""
+    batch_size = batch_size or _setting("NEWSLETTER_BATCH_SIZE", 500)
+    collection = Newsletter._get_collection()
+    while True:
+        query = {"is_active": True}
+        if after is not None:
+            query["_id"] = {"$gt": after}
+        batch = list(
+            collection.find(query, {"email": 1, "name": 1})
+            .sort("_id", 1)
+            .limit(batch_size)
+        )
+        if not batch:
+            return
+        yield batch
+        after = batch[-1]["_id"]
+
+
+def digest_posts(since, now=None):
+    """The newest posts published since ``since``, projected for the digest"""
+    now = now or datetime.utcnow()
+    return list(
+        read_collection(BlogPost)
+        .find(
+            {"is_published": True, "published_at": {"$gte": since, "$lte": now}},
+            DIGEST_FIELDS,
+        )
+        .sort("published_at", -1)
+        .limit(_setting("NEWSLETTER_DIGEST_POSTS", 10))
+    )
+
+
+def _posts_by_ids(post_ids):
+    found = {
+        doc["_id"]: doc
+        for doc in read_collection(BlogPost).find(
+            {"_id": {"$in": post_ids}}, DIGEST_FIELDS
+        )
+    }
+    return [found[post_id] for post_id in post_ids if post_id in found]
+
+
+def site_base_url(site):
+    """Absolute URL the digest links start with
+
+    Raises ImproperlyConfigured when neither ``site.site_url`` nor
+    NEWSLETTER_SITE_URL is an absolute URL; mail clients ignore relative ones.
+    """
+    base = site.site_url or _setting("NEWSLETTER_SITE_URL", "")
+    parts = urlsplit(base)
+    if parts.scheme not in ("http", "https") or not parts.netloc:
+        raise ImproperlyConfigured(
+            "Set the site URL in the site settings or NEWSLETTER_SITE_URL "
+            "to an absolute http(s) URL to send the newsletter"
+        )
+    return base.rstrip("/")
+
+
+def render_batch(subject, posts, site, batch):
+    """One EmailMessage per subscriber of ``batch``"""
+    site_url = site_base_url(site)
+    links = [
+        dict(post, url=site_url + reverse("blog:post_detail", args=[post["slug"]]))
+        for post in posts
+    ]
+    from_email = site.admin_email or settings.DEFAULT_FROM_EMAIL
+    messages = []
+    for subscriber in batch:
+        token = Newsletter.unsubscribe_token(subscriber["email"])
+        unsubscribe_url = site_url + reverse(
+            "blog:newsletter_unsubscribe", args=[token]
+        )
+        context = {
+            "name": subscriber.get("name"),
+            "posts": links,
+            "site": site,
+            "unsubscribe_url": unsubscribe_url,
+        }
+        messages.append(
+            EmailMessage(
+                subject,
+                render_to_string("blog/newsletter_digest.txt", context),
+                from_email,
+                [subscriber["email"]],
+                headers={
+                    "List-Unsubscribe": f"<{unsubscribe_url}>",
+                    "List-Unsubscribe-Post": "List-Unsubscribe=One-Click",
+                },
+            )
+        )
+    return messages
+
+
+def start_send(key, since, subject=None):
+    """The NewsletterSend for ``key``, created with its digest if new"""
+    send = NewsletterSend.objects(key=key).first()
+    if send is None:
+        site = SiteSettings.get_settings()
+        try:
+            send = NewsletterSend(
+                key=key,
+                subject=subject or f"New on {site.site_name}",
+                post_ids=[post["_id"] for post in digest_posts(since)],
+            ).save(force_insert=True)
+        except NotUniqueError:
+            # Another run started it first; its lease decides who sends
+            send = NewsletterSend.objects.get(key=key)
+    return send
+
+
+def send_digest(
+    key, since=None, subject=None, batch_size=None, workers=None, connection=None
+):
+    """Send or resume the digest mailing ``key``; returns its NewsletterSend
+
+    Raises SendInProgress while another run is sending it, and
+    ImproperlyConfigured without an absolute site URL.
+    """
+    since = since or datetime.utcnow() - timedelta(days=7)
+    workers = workers or _setting("NEWSLETTER_WORKERS", 4)
+    lease = _setting("NEWSLETTER_LEASE_SECONDS", 600)
+    # Fails before anything is recorded when links cannot be absolute
+    site_base_url(SiteSettings.get_settings())
+    send = start_send(key, since, subject)
+    if send.finished_at:
+        return send
+    if not send.claim(lease):
+        raise SendInProgress(f"Mailing {key!r} is being sent by another run")
+    try:
+        _send_claimed(send, workers, batch_size, connection, lease)
+    finally:
+        # Only still held when the run stopped early
+        if send.running_until is not None:
+            send.release()
+    return send
+
+
+def _send_claimed(send, workers, batch_size, connection, lease):
+    if send.finished_at:
+        return
+
+    posts = _posts_by_ids(send.post_ids)
+    if not posts:
+        # Nothing was published, so there is nothing to mail
+        send.finish()
+        return
+
+    render = partial(render_batch, send.subject, posts, SiteSettings.get_settings())
+    connection = connection or get_connection(
+        _setting(
+            "NEWSLETTER_EMAIL_BACKEND", "django.core.mail.backends.console.EmailBackend"
+        )
+    )
+
+    def deliver(last_id, rendered):
+        messages = rendered.result()
+        sent = connection.send_messages(messages) or 0
+        if not send.checkpoint(last_id, sent, len(messages) - sent, lease):
+            raise SendInProgress(f"Mailing {send.key!r} was taken over by another run")
+
+    # At most ``workers`` batches are rendered ahead of the one being sent
+    in_flight = deque()
+    with connection, ThreadPoolExecutor(max_workers=workers) as pool:
+        for batch in subscriber_batches(send.last_subscriber_id, batch_size):
+            in_flight.append((batch[-1]["_id"], pool.submit(render, batch)))
+            if len(in_flight) >= workers:
+                deliver(*in_flight.popleft())
+        while in_flight:
+            deliver(*in_flight.popleft())
+
+    send.finish()
@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand
+
+from blog.indexes import (
+    DOCUMENTS,
+    apply_index_plan,
+    audit_queries,
+    index_plan,
+    redundant_indexes,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Explain the views' queries, report collection scans and in-memory "
+        "sorts, and sync the indexes with the ones the models declare"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--apply", action="store_true", help="create and drop indexes"
+        )
+        parser.add_argument(
+            "--drop-undeclared",
+            action="store_true",
+            help="also drop indexes no model declares, such as ones added by hand",
+        )
+
+    def handle(self, *args, **options):
+        for document in DOCUMENTS:
+            for name, covered_by in redundant_indexes(document):
+                self.stdout.write(
+                    self.style.WARNING(
+                        f"{document.__name__}: {name} is redundant with {covered_by}"
+                    )
+                )
+
+        changes = index_plan(drop_undeclared=options["drop_undeclared"])
+        self.stdout.write("Index changes:")
+        for change in changes:
+            self.stdout.write(
+                f"  {change.action:<10} {change.collection}.{change.name}"
+            )
+        if any(change.action == "undeclared" for change in changes):
+            self.stdout.write(
+                "Undeclared indexes are kept; pass --drop-undeclared to drop them"
+            )
+        if not changes:
+            self.stdout.write("  none, the indexes match the models")
+        elif options["apply"]:
+            applied = apply_index_plan(changes)
+            self.stdout.write(self.style.SUCCESS(f"Applied {applied} index changes"))
+        else:
+            self.stdout.write("Run with --apply to make these changes")
+
+        self.stdout.write("Query plans:")
+        problems = 0
+        for plan in audit_queries():
+            indexes = ", ".join(plan.indexes) or "no index"
+            line = f"  {plan.name:<20} {plan.collection:<22} {indexes}"
+            if plan.problems:
+                problems += 1
+                line = self.style.WARNING(f"{line}  {', '.join(plan.problems)}")
+            self.stdout.write(line)
+
+        if problems:
+            self.stdout.write(self.style.WARNING(f"{problems} queries need attention"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Every query is served by an index"))
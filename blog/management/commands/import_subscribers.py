@@ -0,0 +1,27 @@
+import csv
+
+from django.core.management.base import BaseCommand
+
+from blog.models import Newsletter
+
+
+class Command(BaseCommand):
+    help = "Subscribe the email[,name] rows of a CSV file with bulk upserts"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        with open(options["path"], newline="") as rows:
+            subscribers = (
+                (row[0], row[1] if len(row) > 1 else "")
+                for row in csv.reader(rows)
+                if row
+            )
+            created, reactivated = Newsletter.bulk_subscribe(
+                subscribers, batch_size=options["batch_size"]
+            )
+        self.stdout.write(
+            self.style.SUCCESS(f"Created {created}, reactivated {reactivated}")
+        )
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from blog.models import Category
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored ancestors of every category from its parent"
+
+    def handle(self, *args, **options):
+        updated = Category.rebuild_ancestors()
+        self.stdout.write(self.style.SUCCESS(f"Updated {updated} category paths"))
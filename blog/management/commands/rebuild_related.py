@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from blog.models import BlogPost
+
+
+class Command(BaseCommand):
+    help = "Recompute the precomputed related posts of every post"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        updated = BlogPost.rebuild_related(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Updated {updated} related lists"))
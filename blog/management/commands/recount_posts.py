@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from blog.models import BlogPost
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the stored post counts of every tag and category; run it "
+        "regularly so scheduled posts are counted once they go live"
+    )
+
+    def handle(self, *args, **options):
+        fixed = BlogPost.recount_posts()
+        self.stdout.write(self.style.SUCCESS(f"Fixed {fixed} post counts"))
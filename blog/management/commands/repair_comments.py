@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from blog.models import BlogPost
+
+
+class Command(BaseCommand):
+    help = "Backfill comment ids and recompute stored approved comment counts"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        updated = BlogPost.repair_comments(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Applied {updated} updates"))
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.models import BlogPost
+from blog.seeding import Seeder, drop_seeded_collections
+
+
+class Command(BaseCommand):
+    help = "Generate a reproducible synthetic dataset with batched inserts"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--posts", type=int, default=10000)
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--authors", type=int, default=100)
+        parser.add_argument("--tags", type=int, default=200)
+        parser.add_argument("--categories", type=int, default=20)
+        parser.add_argument(
+            "--comments", type=float, default=3.0, help="mean comments per post"
+        )
+        parser.add_argument(
+            "--days", type=int, default=730, help="span of the creation dates"
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--drop", action="store_true", help="drop the seeded collections first"
+        )
+        parser.add_argument(
+            "--related", action="store_true", help="also precompute related posts"
+        )
+
+    def handle(self, *args, **options):
+        if options["authors"] < 1:
+            raise CommandError("At least one author is needed to write the posts")
+
+        if options["drop"]:
+            drop_seeded_collections()
+
+        seeder = Seeder(
+            users=options["users"],
+            authors=options["authors"],
+            tags=options["tags"],
+            categories=options["categories"],
+            posts=options["posts"],
+            comments=options["comments"],
+            days=options["days"],
+            seed=options["seed"],
+            batch_size=options["batch_size"],
+        )
+        inserted = seeder.run()
+        summary = ", ".join(f"{count} {name}" for name, count in inserted.items())
+        self.stdout.write(self.style.SUCCESS(f"Inserted {summary}"))
+
+        if options["related"]:
+            updated = BlogPost.rebuild_related()
+            self.stdout.write(self.style.SUCCESS(f"Updated {updated} related lists"))
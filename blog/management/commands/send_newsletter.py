@@ -0,0 +1,40 @@
+from datetime import date, datetime, timedelta
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.mailing import SendInProgress, send_digest
+
+
+class Command(BaseCommand):
+    help = "Mail the digest of recent posts to every active subscriber"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--key",
+            default=None,
+            help="name of the mailing; rerun with the same key to resume",
+        )
+        parser.add_argument("--days", type=int, default=7, help="digest period")
+        parser.add_argument("--subject", default=None)
+        parser.add_argument("--batch-size", type=int, default=None)
+        parser.add_argument("--workers", type=int, default=None)
+
+    def handle(self, *args, **options):
+        key = options["key"] or f"digest-{date.today().isoformat()}"
+        try:
+            send = send_digest(
+                key,
+                since=datetime.utcnow() - timedelta(days=options["days"]),
+                subject=options["subject"],
+                batch_size=options["batch_size"],
+                workers=options["workers"],
+            )
+        except (ImproperlyConfigured, SendInProgress) as e:
+            raise CommandError(str(e))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{send.key}: sent {send.sent}, failed {send.failed}, "
+                f"{len(send.post_ids)} posts"
+            )
+        )
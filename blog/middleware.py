@@ -0,0 +1,107 @@
+import json
+import logging
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .monitoring import profiling
+
+logger = logging.getLogger(__name__)
+
+
+class QueryProfilerMiddleware:
+    """Profile the MongoDB commands each request issues
+
+    Commands are recorded by ``blog.monitoring.command_profiler``. In DEBUG
+    the summary goes into ``X-Mongo-*`` response headers; otherwise it is
+    logged as one JSON line, at warning level when a collection was hit by
+    QUERY_PROFILER_N_PLUS_ONE or more single-id lookups (an N+1 pattern).
+
+    Placed right after SecurityMiddleware, so session loading and saving and
+    ``request.user`` are profiled too. A streamed body queries while it is
+    sent, after this middleware returned, so profiling resumes around each
+    chunk and the summary is logged once the body is done, headers being
+    already sent by then.
+    """
+
+    async_capable = True
+    sync_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "QUERY_PROFILER_ENABLED", True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = getattr(settings, "QUERY_PROFILER_N_PLUS_ONE", 3)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with profiling() as profile:
+            response = self.get_response(request)
+        return self.finish(request, response, profile)
+
+    async def __acall__(self, request):
+        with profiling() as profile:
+            response = await self.get_response(request)
+        return self.finish(request, response, profile)
+
+    def finish(self, request, response, profile):
+        if not response.streaming:
+            self.report(request, response, profile)
+        elif response.is_async:
+            response.streaming_content = self._aprofiled(
+                request, response, profile, response.streaming_content
+            )
+        else:
+            response.streaming_content = self._profiled(
+                request, response, profile, response.streaming_content
+            )
+        return response
+
+    def _profiled(self, request, response, profile, chunks):
+        chunks = iter(chunks)
+        try:
+            while True:
+                with profiling(profile):
+                    chunk = next(chunks, None)
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            self.report(request, response, profile, headers=False)
+
+    async def _aprofiled(self, request, response, profile, chunks):
+        chunks = aiter(chunks)
+        try:
+            while True:
+                with profiling(profile):
+                    chunk = await anext(chunks, None)
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            self.report(request, response, profile, headers=False)
+
+    def report(self, request, response, profile, headers=True):
+        summary = profile.summary(self.threshold)
+        if settings.DEBUG and headers:
+            response["X-Mongo-Commands"] = str(summary["commands"])
+            response["X-Mongo-Time-Ms"] = f"{summary['time_ms']:.3f}"
+            response["X-Mongo-Documents"] = str(summary["documents"])
+            if summary["n_plus_one"]:
+                response["X-Mongo-N-Plus-One"] = ", ".join(
+                    f"{name}={count}" for name, count in summary["n_plus_one"].items()
+                )
+            return
+        if not summary["commands"]:
+            return
+        summary.update(
+            method=request.method,
+            path=request.path,
+            status=response.status_code,
+        )
+        level = logging.WARNING if summary["n_plus_one"] else logging.INFO
+        logger.log(level, json.dumps(summary, sort_keys=True))
@@ -11,11 +11,27 @@ from mongoengine import (
     IntField,
     BooleanField,
     URLField,
+    ObjectIdField,
+    ValidationError,
+    DoesNotExist,
 )
-from datetime import datetime
+from bson import DBRef, ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from datetime import datetime, timedelta
+from django.conf import settings as django_settings
+from django.core import signing
 from django.utils.text import slugify
 from django.contrib.auth.hashers import make_password, check_password
+from django.utils.crypto import salted_hmac
+from .cache import page_cache
+from .counters import view_counter
+from .routing import RoutedQuerySet, primary, read_collection
+import logging
 import secrets
+import time
+
+logger = logging.getLogger(__name__)
 
 
 class User(Document):
@@ -35,6 +51,7 @@ class User(Document):
     # Timestamps
     date_joined = DateTimeField(default=datetime.utcnow)
     last_login = DateTimeField()
+    password_changed_at = DateTimeField()  # Set by set_password()
 
     # Profile fields
     bio = StringField(max_length=500)
@@ -42,19 +59,73 @@ class User(Document):
 
     meta = {
         "collection": "users",
-        "indexes": ["username", "email", "date_joined"],
+        # username and email are indexed by unique=True
+        "indexes": ["date_joined"],
         "ordering": ["-date_joined"],
+        "queryset_class": RoutedQuerySet,
     }
 
+    # Fields a request user was loaded without, see blog.auth
+    _deferred_fields = ()
+
     def __str__(self):
         return self.username
 
+    def _load_deferred(self):
+        """Read the deferred fields from the database, keeping any changes"""
+        if not self._deferred_fields:
+            return
+        changed = set(self._get_changed_fields())
+        fields = [
+            self._fields[name]
+            for name in self._deferred_fields
+            if self._fields[name].db_field not in changed
+        ]
+        stored = (
+            User._get_collection().find_one(
+                {"_id": self.id}, {field.db_field: 1 for field in fields}
+            )
+            or {}
+        )
+        for field in fields:
+            value = stored.get(field.db_field)
+            # Set in _data so the read values are not written back
+            self._data[field.name] = None if value is None else field.to_python(value)
+        self._deferred_fields = ()
+
+    def save(self, *args, **kwargs):
+        self._load_deferred()
+        result = super().save(*args, **kwargs)
+        # Imported lazily: blog.auth imports this module
+        from .auth import forget_user
+
+        forget_user(self.id)
+        return result
+
     def set_password(self, raw_password):
         """Hash and set password"""
         self.password = make_password(raw_password)
+        self.password_changed_at = datetime.utcnow()
+
+    def get_session_auth_hash(self):
+        """HMAC stored in the session at login; set_password() changes it
+
+        Built from ``password_changed_at`` rather than the password hash, so
+        upgrading an outdated hash in the background keeps sessions valid,
+        and request users loaded without the password can still check it.
+        """
+        changed = self.password_changed_at
+        # MongoDB stores milliseconds; unsaved values have microseconds
+        changed = changed.isoformat(timespec="milliseconds") if changed else ""
+        return salted_hmac(
+            "blog.models.User.get_session_auth_hash",
+            f"{self.id}:{changed}",
+            algorithm="sha256",
+        ).hexdigest()
 
     def check_password(self, raw_password):
         """Check if provided password matches hashed password"""
+        self._load_deferred()
         return check_password(raw_password, self.password)
 
     @property
@@ -118,8 +189,9 @@ class Author(Document):
 
     meta = {
         "collection": "authors",
-        "indexes": ["username", "email", "created_at", "user"],
+        "indexes": ["created_at", "user"],
         "ordering": ["-created_at"],
+        "queryset_class": RoutedQuerySet,
     }
 
     def __str__(self):
@@ -131,7 +203,15 @@ class Author(Document):
 
     def save(self, *args, **kwargs):
         self.updated_at = datetime.utcnow()
-        return super().save(*args, **kwargs)
+        result = super().save(*args, **kwargs)
+        posts = BlogPost._get_collection()
+        invalidate_pages(
+            author_ids=[self.id],
+            tag_ids=posts.distinct("tags", {"author": self.id}),
+            category_ids=posts.distinct("category", {"author": self.id}),
+        )
+        ChangeVersion.bump("authors")
+        return result
 
     @classmethod
     def create_from_user(cls, user):
@@ -154,8 +234,15 @@ class Tag(Document):
     slug = StringField(max_length=50, required=True, unique=True)
     description = StringField(max_length=200)
     created_at = DateTimeField(default=datetime.utcnow)
+    post_count = IntField(default=0)  # Live posts, kept by BlogPost
 
-    meta = {"collection": "tags", "indexes": ["name", "slug"]}
+    meta = {
+        # name and slug are indexed by unique=True
+        "collection": "tags",
+        # The sidebar lists the most used tags first
+        "indexes": ["-post_count"],
+        "queryset_class": RoutedQuerySet,
+    }
 
     def __str__(self):
         return self.name
@@ -163,19 +250,42 @@ class Tag(Document):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
-        return super().save(*args, **kwargs)
+        result = super().save(*args, **kwargs)
+        posts = BlogPost._get_collection()
+        invalidate_pages(
+            author_ids=posts.distinct("author", {"tags": self.id}),
+            tag_ids=[self.id],
+            category_ids=posts.distinct("category", {"tags": self.id}),
+            extra=["tags"],
+        )
+        ChangeVersion.bump("tags")
+        _clear_sidebar()
+        return result
 
 
 class Category(Document):
-    """Blog categories"""
+    """Blog categories
+
+    ``ancestors`` holds the ids from the root down to the parent and is
+    maintained on save, so a subtree is one indexed query on ``ancestors``
+    and breadcrumbs are one ``$in``. Moving a category rewrites the
+    ancestors of its descendants with one bulk write. ``post_count`` counts
+    the posts filed directly in a category; the sidebar adds up subtrees.
+    """
 
     name = StringField(max_length=100, required=True, unique=True)
     slug = StringField(max_length=100, required=True, unique=True)
     description = StringField(max_length=300)
     parent = ReferenceField("self")  # Self-reference for sub-categories
+    ancestors = ListField(ObjectIdField())  # Root first, derived from parent
     created_at = DateTimeField(default=datetime.utcnow)
+    post_count = IntField(default=0)  # Live posts filed directly here
 
-    meta = {"collection": "categories", "indexes": ["name", "slug", "parent"]}
+    meta = {
+        "collection": "categories",
+        "indexes": ["parent", "ancestors"],
+        "queryset_class": RoutedQuerySet,
+    }
 
     def __str__(self):
         return self.name
@@ -183,7 +293,96 @@ class Category(Document):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
-        return super().save(*args, **kwargs)
+
+        collection = Category._get_collection()
+        ancestors = []
+        parent_id = _reference_id(self._data.get("parent"))
+        if parent_id is not None:
+            parent = collection.find_one({"_id": parent_id}, {"ancestors": 1})
+            if parent is None:
+                raise ValidationError("The parent category does not exist")
+            ancestors = list(parent.get("ancestors") or []) + [parent_id]
+        if self.id is not None and self.id in ancestors:
+            raise ValidationError("A category cannot be its own ancestor")
+
+        created = self.id is None
+        previous = []
+        if not created:
+            stored = collection.find_one({"_id": self.id}, {"ancestors": 1}) or {}
+            previous = list(stored.get("ancestors") or [])
+        self.ancestors = ancestors
+
+        result = super().save(*args, **kwargs)
+        if not created and previous != ancestors:
+            self._move_descendants(ancestors)
+
+        posts = BlogPost._get_collection()
+        invalidate_pages(
+            author_ids=posts.distinct("author", {"category": self.id}),
+            tag_ids=posts.distinct("tags", {"category": self.id}),
+            # Listings include subcategories, so old and new ancestors change
+            category_ids=[self.id, *previous],
+            extra=["categories"],
+        )
+        ChangeVersion.bump("categories")
+        _clear_sidebar()
+        return result
+
+    def _move_descendants(self, ancestors):
+        """Rewrite the path above this category in every descendant
+
+        The cycle check in ``save`` reads ancestors that a concurrent move
+        may be rewriting, so two categories moved under each other at the
+        same time can end up in a cycle. Run ``rebuild_category_paths``
+        after such a move to recompute the paths from ``parent``.
+        """
+        collection = Category._get_collection()
+        requests = []
+        for doc in collection.find({"ancestors": self.id}, {"ancestors": 1}):
+            below = doc["ancestors"][doc["ancestors"].index(self.id) :]
+            requests.append(
+                UpdateOne(
+                    {"_id": doc["_id"]}, {"$set": {"ancestors": ancestors + below}}
+                )
+            )
+        if requests:
+            collection.bulk_write(requests, ordered=False)
+        return len(requests)
+
+    def subtree_ids(self):
+        """Ids of this category and every category below it"""
+        return [self.id, *Category.objects(ancestors=self.id).scalar("id")]
+
+    def breadcrumbs(self):
+        """The ancestors of this category, root first"""
+        loaded = Category.objects.in_bulk(self.ancestors) if self.ancestors else {}
+        return [loaded[i] for i in self.ancestors if i in loaded]
+
+    @classmethod
+    def rebuild_ancestors(cls):
+        """Recompute every ancestors list from parent; returns lists changed"""
+        collection = cls._get_collection()
+        docs = {
+            doc["_id"]: doc
+            for doc in collection.find({}, {"parent": 1, "ancestors": 1})
+        }
+
+        def path(category_id, seen=()):
+            parent_id = _reference_id(docs[category_id].get("parent"))
+            if parent_id not in docs or parent_id in seen:
+                return []
+            return path(parent_id, seen + (category_id,)) + [parent_id]
+
+        requests = []
+        for category_id, doc in docs.items():
+            ancestors = path(category_id)
+            if doc.get("ancestors") != ancestors:
+                requests.append(
+                    UpdateOne({"_id": category_id}, {"$set": {"ancestors": ancestors}})
+                )
+        if requests:
+            collection.bulk_write(requests, ordered=False)
+        return len(requests)
 
 
 class Comment(EmbeddedDocument):
@@ -194,11 +393,228 @@ class Comment(EmbeddedDocument):
     content = StringField(required=True)
     created_at = DateTimeField(default=datetime.utcnow)
     is_approved = BooleanField(default=False)
+    comment_id = ObjectIdField(default=ObjectId)  # Target for positional updates
 
     def __str__(self):
         return f"Comment by {self.author_name}"
 
 
+def _reference_id(value):
+    """Id of a reference whether it is loaded, a DBRef or a raw ObjectId"""
+    if isinstance(value, (Document, DBRef)):
+        return value.id
+    return value
+
+
+def invalidate_pages(author_ids=(), tag_ids=(), category_ids=(), extra=()):
+    """Invalidate cached listing pages for the given authors, tags and categories
+
+    Listing pages are cached per author username, tag slug and category slug,
+    so the ids are resolved to those keys with one projected query each. The
+    global ``posts`` listings are only invalidated when something changed
+    that they show.
+    """
+    author_ids = [i for i in author_ids if i is not None]
+    tag_ids = [i for i in tag_ids if i is not None]
+    category_ids = [i for i in category_ids if i is not None]
+    tags = list(extra)
+
+    if author_ids:
+        usernames = Author.objects(id__in=author_ids).scalar("username")
+        tags += [f"author:{username}" for username in usernames]
+        tags.append("posts")
+    if tag_ids:
+        tags += [f"tag:{slug}" for slug in Tag.objects(id__in=tag_ids).scalar("slug")]
+    if category_ids:
+        # Category listings include subcategories, so ancestors change too
+        categories = Category.objects(id__in=category_ids).only("slug", "ancestors")
+        slugs, ancestor_ids = [], set()
+        for category in categories:
+            slugs.append(category.slug)
+            ancestor_ids.update(category.ancestors)
+        ancestor_ids -= set(category_ids)
+        if ancestor_ids:
+            slugs += Category.objects(id__in=list(ancestor_ids)).scalar("slug")
+        tags += [f"category:{slug}" for slug in slugs]
+
+    if tags:
+        page_cache.invalidate(*tags)
+
+
+def _clear_sidebar():
+    # Imported lazily to avoid a circular import with blog.sidebar
+    from .sidebar import clear_sidebar
+
+    clear_sidebar()
+
+
+# Post fields the tag and category post counts are derived from and kept in
+COUNT_FIELDS = {
+    "tags": 1,
+    "category": 1,
+    "is_published": 1,
+    "published_at": 1,
+    "counted_tags": 1,
+    "counted_category": 1,
+    "counts_version": 1,
+}
+
+
+def _counted_ids(post, now=None):
+    """Tag and category ids a raw post should count towards, if it is live"""
+    published_at = post.get("published_at")
+    if not (post.get("is_published") and published_at):
+        return set(), set()
+    if published_at > (now or datetime.utcnow()):
+        return set(), set()
+    tag_ids = set(post.get("tags") or [])
+    category_ids = {post.get("category")} - {None}
+    return tag_ids, category_ids
+
+
+def _stored_counts(post):
+    """Tag and category ids a raw post is currently counted in"""
+    return set(post.get("counted_tags") or []), {post.get("counted_category")} - {None}
+
+
+def _count_swap(post, counted):
+    """Filter and update storing ``counted`` on ``post`` unless another came first"""
+    tag_ids, category_ids = counted
+    return (
+        {"_id": post["_id"], "counts_version": post.get("counts_version")},
+        {
+            "$set": {
+                "counted_tags": sorted(tag_ids),
+                "counted_category": next(iter(category_ids), None),
+            },
+            "$inc": {"counts_version": 1},
+        },
+    )
+
+
+def update_post_counts(post_id, removing=False, attempts=5):
+    """Bring the tag and category post counts in line with a post as stored"""
+    collection = BlogPost._get_collection()
+    for _ in range(attempts):
+        post = collection.find_one({"_id": post_id}, COUNT_FIELDS)
+        if post is None:
+            return False
+        before = _stored_counts(post)
+        after = (set(), set()) if removing else _counted_ids(post)
+        if before == after:
+            return False
+        # Conditional on counts_version: of racing saves one applies each
+        # change, and the others retry against the state it stored
+        if collection.update_one(*_count_swap(post, after)).modified_count:
+            for document, old, new in zip((Tag, Category), before, after):
+                for ids, step in ((new - old, 1), (old - new, -1)):
+                    if ids:
+                        document._get_collection().update_many(
+                            {"_id": {"$in": list(ids)}}, {"$inc": {"post_count": step}}
+                        )
+            _clear_sidebar()
+            return True
+    logger.error(f"Gave up updating the post counts of {post_id}; run recount_posts")
+    return False
+
+
+def collect_references(posts):
+    """Unresolved author, tag and category ids referenced by ``posts``"""
+    author_ids, tag_ids, category_ids = set(), set(), set()
+
+    for post in posts:
+        author = post._data.get("author")
+        if isinstance(author, DBRef):
+            author_ids.add(author.id)
+        category = post._data.get("category")
+        if isinstance(category, DBRef):
+            category_ids.add(category.id)
+        for tag in post._data.get("tags") or []:
+            if isinstance(tag, DBRef):
+                tag_ids.add(tag.id)
+
+    return author_ids, tag_ids, category_ids
+
+
+def attach_references(posts, authors, tags, categories):
+    """Replace references in ``posts`` with the loaded documents by id"""
+    # Write straight into _data so the posts are not marked as changed
+    for post in posts:
+        author = post._data.get("author")
+        if isinstance(author, DBRef) and author.id in authors:
+            post._data["author"] = authors[author.id]
+        category = post._data.get("category")
+        if isinstance(category, DBRef) and category.id in categories:
+            post._data["category"] = categories[category.id]
+        if post._data.get("tags"):
+            post._data["tags"] = [
+                tags.get(tag.id, tag) if isinstance(tag, DBRef) else tag
+                for tag in post._data["tags"]
+            ]
+
+    return posts
+
+
+def prefetch_references(posts):
+    """Resolve author, tags and category for a list of posts in bulk
+
+    Collects every referenced id across ``posts`` and loads each collection
+    with a single ``$in`` query, so rendering a page costs a fixed number of
+    queries instead of one per reference.
+    """
+    posts = list(posts)
+    author_ids, tag_ids, category_ids = collect_references(posts)
+
+    authors = Author.objects.in_bulk(list(author_ids)) if author_ids else {}
+    tags = Tag.objects.in_bulk(list(tag_ids)) if tag_ids else {}
+    categories = Category.objects.in_bulk(list(category_ids)) if category_ids else {}
+
+    return attach_references(posts, authors, tags, categories)
+
+
+# Fields listing pages and the posts API display. Summaries never load the
+# content, the embedded comments or the metadata dict.
+SUMMARY_FIELDS = (
+    "title",
+    "slug",
+    "excerpt",
+    "author",
+    "tags",
+    "category",
+    "is_published",
+    "is_featured",
+    "published_at",
+    "created_at",
+    "updated_at",
+    "view_count",
+    "like_count",
+    "approved_comment_count",
+)
+
+
+def load_summaries(post_ids):
+    """Post summaries for ``post_ids`` in the given order, references loaded"""
+    posts_by_id = BlogPost.objects.summaries().in_bulk(post_ids) if post_ids else {}
+    posts = [posts_by_id[post_id] for post_id in post_ids if post_id in posts_by_id]
+    return prefetch_references(posts)
+
+
+# Fields the related-posts score is computed from
+RELATED_FIELDS = ("tags", "category", "author", "is_published", "published_at")
+
+
+class BlogPostQuerySet(RoutedQuerySet):
+    """QuerySet for blog posts with batched reference resolution"""
+
+    def summaries(self):
+        """Only load the fields listing pages need"""
+        return self.only(*SUMMARY_FIELDS)
+
+    def prefetch_references(self):
+        """Evaluate the queryset and resolve its references in bulk"""
+        return prefetch_references(self)
+
+
 class BlogPost(Document):
     """Main blog post model"""
 
@@ -224,27 +640,50 @@ class BlogPost(Document):
     # Engagement metrics
     view_count = IntField(default=0)
     like_count = IntField(default=0)
+    approved_comment_count = IntField(default=0)  # Kept in sync on save
 
     # Comments (embedded)
     comments = ListField(EmbeddedDocumentField(Comment))
 
+    # The tags and category whose post_count includes this post, kept by
+    # update_post_counts
+    counted_tags = ListField(ObjectIdField())
+    counted_category = ObjectIdField()
+    counts_version = IntField()
+
+    # Precomputed by blog.related, best match first
+    related_post_ids = ListField(ObjectIdField())
+    related_computed_at = DateTimeField()  # Unset until the list is computed
+
     # Additional metadata
     metadata = DictField()
 
     meta = {
         "collection": "blog_posts",
         "indexes": [
-            "slug",
+            # slug is indexed by unique=True. Listings filter on equality
+            # first and sort on published_at last, so each one is served in
+            # index order; see the audit_indexes command.
             "title",
-            "author",
             "created_at",
-            "published_at",
-            "is_published",
-            "is_featured",
-            ("is_published", "-published_at"),
-            ("author", "-created_at"),
+            "related_post_ids",
+            # The trailing id keeps keyset pagination order stable on ties
+            ("is_published", "-published_at", "-id"),
+            ("is_published", "is_featured", "-published_at"),
+            ("author", "is_published", "-published_at"),
+            ("tags", "is_published", "-published_at"),
+            ("category", "is_published", "-published_at"),
+            # The export walks posts in change order, live or not
+            ("updated_at", "id"),
+            {
+                "fields": ["$title", "$excerpt", "$content"],
+                "default_language": "english",
+                "weights": {"title": 10, "excerpt": 4, "content": 1},
+                "name": "post_text_search",
+            },
         ],
         "ordering": ["-created_at"],
+        "queryset_class": BlogPostQuerySet,
     }
 
     def __str__(self):
@@ -263,7 +702,75 @@ class BlogPost(Document):
             self.published_at = datetime.utcnow()
 
         self.updated_at = datetime.utcnow()
-        return super().save(*args, **kwargs)
+
+        # Summaries do not load comments, so only recount when they changed
+        if not self.id or any(
+            field.startswith("comments") for field in self._get_changed_fields()
+        ):
+            self.approved_comment_count = len(self.approved_comments)
+
+        # Related lists only depend on these, so other edits skip the refresh
+        refresh_related = not self.id or any(
+            field in RELATED_FIELDS for field in self._get_changed_fields()
+        )
+
+        # The previous references decide which old listings need invalidating
+        previous = {}
+        if self.id:
+            previous = (
+                BlogPost._get_collection().find_one(
+                    {"_id": self.id}, {"author": 1, "tags": 1, "category": 1}
+                )
+                or {}
+            )
+
+        result = super().save(*args, **kwargs)
+        update_post_counts(self.id)
+        author_ids = {_reference_id(self._data.get("author")), previous.get("author")}
+        tag_ids = {_reference_id(tag) for tag in self._data.get("tags") or []}
+        category_ids = {
+            _reference_id(self._data.get("category")),
+            previous.get("category"),
+        }
+        invalidate_pages(
+            author_ids=author_ids,
+            tag_ids=tag_ids | set(previous.get("tags") or []),
+            category_ids=category_ids,
+        )
+        ChangeVersion.bump("blog_posts")
+
+        if refresh_related:
+            # Imported lazily to avoid a circular import with blog.related
+            from .related import refresh_neighbours
+
+            try:
+                refresh_neighbours(BlogPost._get_collection(), self.id)
+            except Exception as e:
+                logger.error(f"Error refreshing related posts for {self.id}: {e}")
+        return result
+
+    def delete(self, *args, **kwargs):
+        previous = (
+            BlogPost._get_collection().find_one(
+                {"_id": self.id}, {"author": 1, "tags": 1, "category": 1}
+            )
+            or {}
+        )
+        update_post_counts(self.id, removing=True)
+        result = super().delete(*args, **kwargs)
+        invalidate_pages(
+            author_ids=[previous.get("author")],
+            tag_ids=previous.get("tags") or [],
+            category_ids=[previous.get("category")],
+        )
+        ChangeVersion.bump("blog_posts")
+        # Lets incremental exports report the deletion
+        DeletedPost._get_collection().replace_one(
+            {"_id": self.id},
+            {"_id": self.id, "deleted_at": datetime.utcnow()},
+            upsert=True,
+        )
+        return result
 
     @property
     def approved_comments(self):
@@ -271,19 +778,148 @@ class BlogPost(Document):
 
     @property
     def comment_count(self):
-        return len(self.approved_comments)
+        return self.approved_comment_count
 
     def add_comment(self, author_name, author_email, content):
+        """Append a comment with an atomic $push
+
+        The post is not rewritten, so concurrent commenters cannot overwrite
+        each other. This instance is left as it is; reload() to see the new
+        comment.
+        """
         comment = Comment(
             author_name=author_name, author_email=author_email, content=content
         )
-        self.comments.append(comment)
-        self.save()
+        comment.validate()
+        BlogPost.objects(id=self.id).update_one(push__comments=comment)
         return comment
 
+    def set_comment_approval(self, comment_id, approved=True):
+        """Approve or unapprove one comment with a positional $set
+
+        approved_comment_count is moved by $inc in the same update, which
+        only matches while the flag still has the opposite value, so repeated
+        calls never double count. Returns True if the comment changed.
+        """
+        updated = BlogPost.objects(
+            id=self.id,
+            comments__match={"comment_id": comment_id, "is_approved": not approved},
+        ).update_one(
+            set__comments__S__is_approved=approved,
+            inc__approved_comment_count=1 if approved else -1,
+            set__updated_at=datetime.utcnow(),
+        )
+        if updated:
+            invalidate_pages(
+                author_ids=[_reference_id(self._data.get("author"))],
+                tag_ids=[_reference_id(tag) for tag in self._data.get("tags") or []],
+                category_ids=[_reference_id(self._data.get("category"))],
+            )
+            ChangeVersion.bump("blog_posts")
+        return bool(updated)
+
+    def approve_comment(self, comment_id):
+        return self.set_comment_approval(comment_id, approved=True)
+
+    def unapprove_comment(self, comment_id):
+        return self.set_comment_approval(comment_id, approved=False)
+
     def increment_view_count(self):
-        self.view_count += 1
-        self.save()
+        """Buffer a view; it is written later as part of a bulk $inc"""
+        view_counter.increment(self.id)
+
+    @property
+    def total_view_count(self):
+        """Stored view count plus views still waiting to be flushed"""
+        return self.view_count + view_counter.pending(self.id)
+
+    @classmethod
+    def recount_posts(cls, batch_size=1000):
+        """Recompute every tag and category post_count; returns counts fixed"""
+        # Scheduled posts only start counting here, once live, so this runs
+        # regularly; it also repairs drift from raw writes
+        collection = cls._get_collection()
+        now = datetime.utcnow()
+        swaps = []
+        for post in collection.find({}, COUNT_FIELDS):
+            counted = _counted_ids(post, now)
+            if _stored_counts(post) != counted:
+                swaps.append(UpdateOne(*_count_swap(post, counted)))
+            if len(swaps) >= batch_size:
+                collection.bulk_write(swaps, ordered=False)
+                swaps = []
+        if swaps:
+            collection.bulk_write(swaps, ordered=False)
+
+        fixed = 0
+        for document, field in ((Tag, "counted_tags"), (Category, "counted_category")):
+            pipeline = [{"$match": {field: {"$ne": None}}}]
+            if field == "counted_tags":
+                pipeline.append({"$unwind": "$counted_tags"})
+            pipeline.append({"$group": {"_id": f"${field}", "count": {"$sum": 1}}})
+            counts = {
+                row["_id"]: row["count"] for row in collection.aggregate(pipeline)
+            }
+
+            requests = [
+                UpdateOne(
+                    {"_id": doc["_id"]},
+                    {"$set": {"post_count": counts.get(doc["_id"], 0)}},
+                )
+                for doc in document._get_collection().find({}, {"post_count": 1})
+                if doc.get("post_count") != counts.get(doc["_id"], 0)
+            ]
+            if requests:
+                document._get_collection().bulk_write(requests, ordered=False)
+                fixed += len(requests)
+        if fixed:
+            _clear_sidebar()
+        return fixed
+
+    @classmethod
+    def repair_comments(cls, batch_size=1000):
+        """Backfill comment ids and fix drifted approved_comment_count values
+
+        Comments are addressed by index with a guard on the missing id, so
+        comments appended meanwhile are never touched. Returns the number of
+        updates applied.
+        """
+        collection = cls._get_collection()
+        cursor = collection.find(
+            {},
+            {
+                "comments.is_approved": 1,
+                "comments.comment_id": 1,
+                "approved_comment_count": 1,
+            },
+        ).batch_size(batch_size)
+
+        updated = 0
+        requests = []
+        for doc in cursor:
+            comments = doc.get("comments", [])
+            for index, comment in enumerate(comments):
+                if "comment_id" not in comment:
+                    field = f"comments.{index}.comment_id"
+                    requests.append(
+                        UpdateOne(
+                            {"_id": doc["_id"], field: {"$exists": False}},
+                            {"$set": {field: ObjectId()}},
+                        )
+                    )
+            count = sum(1 for comment in comments if comment.get("is_approved"))
+            if doc.get("approved_comment_count") != count:
+                requests.append(
+                    UpdateOne(
+                        {"_id": doc["_id"]}, {"$set": {"approved_comment_count": count}}
+                    )
+                )
+            if len(requests) >= batch_size:
+                updated += collection.bulk_write(requests, ordered=False).modified_count
+                requests = []
+        if requests:
+            updated += collection.bulk_write(requests, ordered=False).modified_count
+        return updated
 
     @classmethod
     def get_published(cls):
@@ -291,34 +927,60 @@ class BlogPost(Document):
 
     @classmethod
     def get_featured(cls):
+        # Newest first, served in order by the featured index
         return cls.objects(
             is_published=True, is_featured=True, published_at__lte=datetime.utcnow()
-        )
+        ).order_by("-published_at")
+
+    @classmethod
+    def rebuild_related(cls, batch_size=500):
+        """Recompute every stored related-posts list; returns lists changed"""
+        from .related import refresh_related
+
+        # Ids are read in _id ranges; distinct() would return all of them in
+        # one reply, which outgrows the 16MB limit around a million posts
+        collection = cls._get_collection()
+        changed, last_id = 0, None
+        while True:
+            query = {} if last_id is None else {"_id": {"$gt": last_id}}
+            batch = [
+                doc["_id"]
+                for doc in collection.find(query, {"_id": 1})
+                .sort("_id", 1)
+                .limit(batch_size)
+            ]
+            if not batch:
+                return changed
+            changed += refresh_related(collection, batch, batch_size=batch_size)
+            last_id = batch[-1]
 
     def get_related_posts(self, limit=3):
-        """Get related posts excluding current post"""
-        related = []
+        """Related post summaries from the precomputed ``related_post_ids``
 
-        # Get posts with same tags
-        if self.tags:
-            tag_posts = list(
-                BlogPost.get_published().filter(tags__in=self.tags).limit(10)
-            )
-            # Filter out current post
-            tag_posts = [p for p in tag_posts if p.id != self.id]
-            related.extend(tag_posts[:limit])
-
-        # Fill with author's other posts if needed
-        if len(related) < limit:
-            author_posts = list(
-                BlogPost.get_published().filter(author=self.author).limit(10)
+        Posts saved before the lists existed are scored on the fly until
+        ``rebuild_related`` has run; a computed empty list is used as is.
+        """
+        related_ids = self.related_post_ids
+        if self.related_computed_at is None:
+            from .related import compute_related_ids
+
+            related_ids = compute_related_ids(
+                read_collection(BlogPost), self.to_mongo(), limit
             )
-            # Filter out current post and already included posts
-            existing_ids = [p.id for p in related] + [self.id]
-            author_posts = [p for p in author_posts if p.id not in existing_ids]
-            related.extend(author_posts[: limit - len(related)])
+        return load_summaries(related_ids[:limit])
 
-        return related[:limit]
+
+class DeletedPost(Document):
+    """Tombstone of a deleted post, reported by incremental exports"""
+
+    id = ObjectIdField(primary_key=True)
+    deleted_at = DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        "collection": "deleted_posts",
+        "indexes": [("deleted_at", "id")],
+        "queryset_class": RoutedQuerySet,
+    }
 
 
 class Newsletter(Document):
@@ -332,37 +994,307 @@ class Newsletter(Document):
 
     meta = {
         "collection": "newsletter_subscribers",
-        "indexes": ["email", "is_active", "subscribed_at"],
+        # The mailing pipeline walks active subscribers in _id ranges
+        "indexes": ["subscribed_at", ("is_active", "id")],
+        "queryset_class": RoutedQuerySet,
     }
 
+    # Outcomes of subscribe()
+    CREATED, REACTIVATED, ALREADY_ACTIVE = "created", "reactivated", "already_active"
+
+    UNSUBSCRIBE_SALT = "blog.newsletter.unsubscribe"
+
     def __str__(self):
         return self.email
 
+    @classmethod
+    def _subscribe_update(cls, name, now):
+        return {
+            "$set": {"is_active": True},
+            "$unset": {"unsubscribed_at": ""},
+            "$setOnInsert": {"name": name, "subscribed_at": now},
+        }
+
+    @classmethod
+    def subscribe(cls, email, name=""):
+        """Subscribe or reactivate ``email`` with one atomic upsert
+
+        Returns CREATED, REACTIVATED or ALREADY_ACTIVE from the document as
+        it was before the update. Raises ValidationError for a bad address.
+        """
+        cls(email=email, name=name or None).validate()
+        update = cls._subscribe_update(name or None, datetime.utcnow())
+        for attempt in range(2):
+            try:
+                before = cls._get_collection().find_one_and_update(
+                    {"email": email},
+                    update,
+                    projection={"is_active": 1},
+                    upsert=True,
+                    return_document=ReturnDocument.BEFORE,
+                )
+                break
+            except DuplicateKeyError:
+                # A concurrent signup inserted it first; now it matches
+                if attempt:
+                    raise
+        if before is None:
+            return cls.CREATED
+        return cls.ALREADY_ACTIVE if before.get("is_active") else cls.REACTIVATED
+
+    @classmethod
+    def unsubscribe_token(cls, email):
+        """Signed token of the unsubscribe link mailed to ``email``"""
+        return signing.dumps(email, salt=cls.UNSUBSCRIBE_SALT)
+
+    @classmethod
+    def email_from_token(cls, token):
+        """The address of an unsubscribe token; raises signing.BadSignature"""
+        return signing.loads(token, salt=cls.UNSUBSCRIBE_SALT)
+
+    @classmethod
+    def unsubscribe(cls, email):
+        """Deactivate ``email``; returns whether it was subscribed"""
+        result = cls._get_collection().update_one(
+            {"email": email, "is_active": True},
+            {"$set": {"is_active": False, "unsubscribed_at": datetime.utcnow()}},
+        )
+        return bool(result.modified_count)
+
+    @classmethod
+    def bulk_subscribe(cls, subscribers, batch_size=1000):
+        """Upsert ``(email, name)`` pairs in unordered bulk writes
+
+        Returns ``(created, reactivated)``. Addresses are lowercased; invalid
+        ones are skipped and logged. An upsert racing a signup of the same
+        address fails with a duplicate key error and is retried, and then
+        matches the subscriber the signup created.
+        """
+        collection = cls._get_collection()
+        now = datetime.utcnow()
+        created = reactivated = 0
+        requests = []
+
+        def flush():
+            pending, inserted, modified = requests, 0, 0
+            for attempt in range(2):
+                try:
+                    result = collection.bulk_write(pending, ordered=False)
+                except BulkWriteError as e:
+                    errors = e.details["writeErrors"]
+                    duplicates = [
+                        pending[error["index"]]
+                        for error in errors
+                        if error["code"] == 11000
+                    ]
+                    if attempt or len(duplicates) < len(errors):
+                        raise
+                    inserted += e.details["nUpserted"]
+                    modified += e.details["nModified"]
+                    pending = duplicates
+                    continue
+                return (
+                    inserted + result.upserted_count,
+                    modified + result.modified_count,
+                )
+
+        for email, name in subscribers:
+            email = (email or "").strip().lower()
+            try:
+                cls(email=email, name=name or None).validate()
+            except ValidationError as e:
+                logger.error(f"Skipping newsletter subscriber {email!r}: {e}")
+                continue
+            # Only inactive subscribers are modified, so modified_count
+            # counts reactivations
+            update = cls._subscribe_update(name or None, now)
+            requests.append(UpdateOne({"email": email}, update, upsert=True))
+            if len(requests) >= batch_size:
+                inserted, modified = flush()
+                created, reactivated = created + inserted, reactivated + modified
+                requests = []
+        if requests:
+            inserted, modified = flush()
+            created, reactivated = created + inserted, reactivated + modified
+        return created, reactivated
+
+
+class NewsletterSend(Document):
+    """Progress of one newsletter mailing, so an interrupted send can resume
+
+    Subscribers are sent in ``_id`` order and ``last_subscriber_id`` is
+    stored after every batch, so a resumed send continues after the last
+    completed batch. ``post_ids`` fixes the digest when the send starts.
+
+    A run holds the send by setting ``running_until`` with one atomic
+    update, renews it at every checkpoint and clears it when it stops, so
+    two runs with the same key never send at once. A run that died leaves
+    the lease to expire, after which the send can be resumed.
+    """
+
+    key = StringField(primary_key=True)
+    subject = StringField(required=True)
+    post_ids = ListField(ObjectIdField())
+    last_subscriber_id = ObjectIdField()
+    sent = IntField(default=0)
+    failed = IntField(default=0)
+    started_at = DateTimeField(default=datetime.utcnow)
+    updated_at = DateTimeField()
+    finished_at = DateTimeField()
+    running_until = DateTimeField()  # Lease of the run sending it
+
+    meta = {"collection": "newsletter_sends", "queryset_class": RoutedQuerySet}
+
+    def __str__(self):
+        return self.key
+
+    @staticmethod
+    def _lease_end(now, seconds):
+        # Stored as MongoDB does, to the millisecond, so it can be matched
+        end = now + timedelta(seconds=seconds)
+        return end.replace(microsecond=end.microsecond // 1000 * 1000)
+
+    def _held(self):
+        """Filter matching this send only while this run holds the lease"""
+        return {"_id": self.key, "running_until": self.running_until}
+
+    def claim(self, seconds):
+        """Take the lease for ``seconds`` and reload the progress
+
+        Returns False when another run holds an unexpired lease.
+        """
+        now = datetime.utcnow()
+        running_until = self._lease_end(now, seconds)
+        claimed = NewsletterSend._get_collection().find_one_and_update(
+            {
+                "_id": self.key,
+                "$or": [
+                    {"running_until": None},
+                    {"running_until": {"$lte": now}},
+                ],
+            },
+            {"$set": {"running_until": running_until}},
+            projection={"_id": 1},
+        )
+        if claimed is None:
+            return False
+        # Another run may have progressed since this one was loaded
+        self.reload()
+        self.running_until = running_until
+        return True
+
+    def checkpoint(self, last_subscriber_id, sent, failed=0, seconds=None):
+        """Record a completed batch with one ``$set``/``$inc``
+
+        Also renews the lease for ``seconds``. Returns False, recording
+        nothing, when the lease expired and another run took the send over.
+        """
+        now = datetime.utcnow()
+        fields = {"last_subscriber_id": last_subscriber_id, "updated_at": now}
+        if seconds is not None:
+            fields["running_until"] = self._lease_end(now, seconds)
+        result = NewsletterSend._get_collection().update_one(
+            self._held(), {"$set": fields, "$inc": {"sent": sent, "failed": failed}}
+        )
+        if not result.modified_count:
+            return False
+        self.last_subscriber_id = last_subscriber_id
+        self.sent += sent
+        self.failed += failed
+        self.updated_at = now
+        self.running_until = fields.get("running_until", self.running_until)
+        return True
+
+    def finish(self):
+        self.finished_at = datetime.utcnow()
+        NewsletterSend._get_collection().update_one(
+            self._held(),
+            {
+                "$set": {"finished_at": self.finished_at},
+                "$unset": {"running_until": ""},
+            },
+        )
+        self.running_until = None
+
+    def release(self):
+        """Give up the lease so the send can be resumed straight away"""
+        NewsletterSend._get_collection().update_one(
+            self._held(), {"$unset": {"running_until": ""}}
+        )
+        self.running_until = None
+
 
 class UserSession(Document):
-    """Custom session model for MongoDB"""
+    """Custom session model for MongoDB, used by the ``blog.sessions`` engine"""
 
     session_key = StringField(max_length=40, required=True, unique=True)
     session_data = StringField(required=True)
     expire_date = DateTimeField(required=True)
 
-    meta = {"collection": "user_sessions", "indexes": ["session_key", "expire_date"]}
+    meta = {
+        "collection": "user_sessions",
+        "indexes": [
+            # MongoDB deletes sessions once expire_date has passed. Databases
+            # with the older plain expire_date_1 index need
+            # ``audit_indexes --apply`` to recreate it as this TTL index.
+            {"fields": ["expire_date"], "expireAfterSeconds": 0},
+        ],
+        "queryset_class": RoutedQuerySet,
+    }
 
     @classmethod
     def create_session(cls, session_key, session_data, expire_date):
-        """Create or update session"""
-        try:
-            session = cls.objects.get(session_key=session_key)
-            session.session_data = session_data
-            session.expire_date = expire_date
-            session.save()
-        except cls.DoesNotExist:
-            session = cls(
-                session_key=session_key,
-                session_data=session_data,
-                expire_date=expire_date,
-            ).save()
-        return session
+        """Create or update a session with one atomic upsert"""
+        return cls.objects(session_key=session_key).modify(
+            upsert=True,
+            new=True,
+            set__session_data=session_data,
+            set__expire_date=expire_date,
+        )
+
+
+class ChangeVersion(Document):
+    """Change counter per collection, the validator of listing responses
+
+    Bumped by every save that changes what listings show, so an ETag built
+    from the versions changes with the content in every worker, without
+    scanning the collections themselves.
+    """
+
+    name = StringField(primary_key=True)
+    version = IntField(default=0)
+    updated_at = DateTimeField(default=datetime.utcnow)
+
+    meta = {"collection": "change_versions", "queryset_class": RoutedQuerySet}
+
+    @classmethod
+    def bump(cls, *names):
+        now = datetime.utcnow()
+        cls._get_collection().bulk_write(
+            [
+                UpdateOne(
+                    {"_id": name},
+                    {"$inc": {"version": 1}, "$set": {"updated_at": now}},
+                    upsert=True,
+                )
+                for name in names
+            ],
+            ordered=False,
+        )
+
+    @classmethod
+    def current(cls, names):
+        """``(version, updated_at)`` of each name from one query"""
+        docs = {
+            doc["_id"]: doc
+            for doc in read_collection(cls).find({"_id": {"$in": list(names)}})
+        }
+        return [
+            (docs[name]["version"], docs[name]["updated_at"])
+            if name in docs
+            else (0, None)
+            for name in names
+        ]
 
 
 class SiteSettings(Document):
@@ -378,16 +1310,76 @@ class SiteSettings(Document):
     social_links = DictField()
     analytics_code = StringField()
     updated_at = DateTimeField(default=datetime.utcnow)
+    version = IntField(default=0)  # Incremented by every save, see save()
+
+    meta = {"collection": "site_settings", "queryset_class": RoutedQuerySet}
 
-    meta = {"collection": "site_settings"}
+    # Process-local cache: (settings, version, checked_at)
+    _cache = None
 
     def save(self, *args, **kwargs):
         self.updated_at = datetime.utcnow()
-        return super().save(*args, **kwargs)
+        if self.id is None:
+            self.version = 1
+            result = super().save(*args, **kwargs)
+            SiteSettings._cache = (self, self.version, time.monotonic())
+            # Pages rendered before the first save already used the defaults
+            return result
+
+        # The changes and the version bump are one update, so the document
+        # read back is exactly what that version means, whatever else saves
+        self.validate()
+        changes, removed = self._delta()
+        changes.pop("version", None)
+        update = {"$inc": {"version": 1}}
+        if changes:
+            update["$set"] = changes
+        if removed:
+            update["$unset"] = removed
+        stored = SiteSettings._get_collection().find_one_and_update(
+            {"_id": self.id}, update, return_document=ReturnDocument.AFTER
+        )
+        if stored is None:
+            raise DoesNotExist("The site settings were deleted")
+        self.version = stored["version"]
+        self._clear_changed_fields()
+        saved = SiteSettings._from_son(stored)
+        SiteSettings._cache = (saved, saved.version, time.monotonic())
+        page_cache.invalidate("site_settings")
+        return self
 
     @classmethod
     def get_settings(cls):
-        settings = cls.objects.first()
-        if not settings:
-            settings = cls().save()
-        return settings
+        """Return the site settings, cached per process
+
+        The cached copy is trusted for SITE_SETTINGS_CACHE_TTL seconds. After
+        that only the ``version`` field is read, and the full document is
+        reloaded only if another worker has saved a newer version.
+        """
+        # Always read the primary: a lagging replica could report no settings
+        # document and make this create a second one
+        with primary():
+            cached = cls._cache
+            now = time.monotonic()
+            ttl = getattr(django_settings, "SITE_SETTINGS_CACHE_TTL", 60)
+
+            if cached:
+                site_settings, version, checked_at = cached
+                if now - checked_at < ttl:
+                    return site_settings
+                stored = cls.objects.only("version").as_pymongo().first()
+                # Documents saved before ``version`` existed load it as 0
+                if stored is not None and stored.get("version", 0) == version:
+                    cls._cache = (site_settings, version, now)
+                    return site_settings
+
+            site_settings = cls.objects.first()
+            if not site_settings:
+                return cls().save()
+            cls._cache = (site_settings, site_settings.version, now)
+            return site_settings
+
+    @classmethod
+    def clear_cache(cls):
+        """Forget the cached settings so the next call reads the database"""
+        cls._cache = None
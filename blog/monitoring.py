@@ -0,0 +1,280 @@
+import contextvars
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from pymongo import monitoring
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Connection pool counters per server, fed by pymongo pool events
+
+    Passed to the client through ``event_listeners`` in MONGODB_SETTINGS.
+    Tracks open and in-use connections, checkouts, failed checkouts and how
+    long requests waited for a connection, which is what to look at when
+    sizing ``maxPoolSize`` against the number of worker threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._servers = defaultdict(self._empty)
+        # Checkout events fire on the requesting thread, so the start of a
+        # wait is keyed by thread
+        self._waiting = {}
+
+    @staticmethod
+    def _empty():
+        return {
+            "open": 0,
+            "in_use": 0,
+            "max_in_use": 0,
+            "checkouts": 0,
+            "checkout_failures": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+            "cleared": 0,
+        }
+
+    def _server(self, address):
+        return self._servers[f"{address[0]}:{address[1]}"]
+
+    def pool_created(self, event):
+        with self._lock:
+            self._server(event.address)
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self._server(event.address)["cleared"] += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self._server(event.address)["open"] += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            server = self._server(event.address)
+            server["open"] = max(server["open"] - 1, 0)
+
+    def connection_check_out_started(self, event):
+        self._waiting[(event.address, threading.get_ident())] = time.perf_counter()
+
+    def _waited(self, address):
+        started = self._waiting.pop((address, threading.get_ident()), None)
+        return time.perf_counter() - started if started is not None else 0.0
+
+    def connection_check_out_failed(self, event):
+        self._waited(event.address)
+        with self._lock:
+            self._server(event.address)["checkout_failures"] += 1
+
+    def connection_checked_out(self, event):
+        waited = self._waited(event.address)
+        with self._lock:
+            server = self._server(event.address)
+            server["checkouts"] += 1
+            server["in_use"] += 1
+            server["max_in_use"] = max(server["max_in_use"], server["in_use"])
+            server["wait_time_total"] += waited
+            server["wait_time_max"] = max(server["wait_time_max"], waited)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            server = self._server(event.address)
+            server["in_use"] = max(server["in_use"] - 1, 0)
+
+    def snapshot(self):
+        """Counters per server, with wait times in milliseconds"""
+        with self._lock:
+            servers = {}
+            for name, counters in sorted(self._servers.items()):
+                checkouts = counters["checkouts"]
+                servers[name] = {
+                    "open": counters["open"],
+                    "in_use": counters["in_use"],
+                    "max_in_use": counters["max_in_use"],
+                    "checkouts": checkouts,
+                    "checkout_failures": counters["checkout_failures"],
+                    "cleared": counters["cleared"],
+                    "wait_ms_avg": counters["wait_time_total"] * 1000 / checkouts
+                    if checkouts
+                    else 0.0,
+                    "wait_ms_max": counters["wait_time_max"] * 1000,
+                }
+            return servers
+
+    def reset(self):
+        """Drop the counters of closed connections and past checkouts"""
+        with self._lock:
+            for counters in self._servers.values():
+                counters.update(
+                    max_in_use=counters["in_use"],
+                    checkouts=0,
+                    checkout_failures=0,
+                    wait_time_total=0.0,
+                    wait_time_max=0.0,
+                    cleared=0,
+                )
+
+
+pool_metrics = PoolMetrics()
+
+
+def warm_up(alias="default"):
+    """Select a server and open a pooled connection before the first request
+
+    Runs a ``ping``, which pays for server discovery, the TCP and TLS
+    handshakes and authentication up front. pymongo then keeps
+    ``minPoolSize`` connections open in the background.
+    """
+    # Imported lazily so base.settings can import this module
+    import mongoengine
+
+    started = time.perf_counter()
+    mongoengine.get_connection(alias).admin.command("ping")
+    return time.perf_counter() - started
+
+
+# ============================================================================
+# Per-request command profiling
+# ============================================================================
+
+_current_profile = contextvars.ContextVar("query_profile", default=None)
+
+# Operators whose list argument is a set of values, not nested conditions
+_VALUE_LIST_OPERATORS = {"$in", "$nin", "$all"}
+
+
+def filter_shape(value):
+    """``value`` with every literal replaced by ``"?"``, keeping the keys"""
+    if isinstance(value, dict):
+        return {
+            key: "?" if key in _VALUE_LIST_OPERATORS else filter_shape(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)) and value and isinstance(value[0], dict):
+        return [filter_shape(item) for item in value]
+    return "?"
+
+
+def _command_filter(name, command):
+    if name in ("find", "count", "delete", "distinct"):
+        return command.get("filter", command.get("query"))
+    if name == "aggregate":
+        stages = command.get("pipeline") or []
+        match = stages[0].get("$match") if stages else None
+        return {"$match": match} if match is not None else None
+    if name == "update":
+        updates = command.get("updates") or [{}]
+        return updates[0].get("q")
+    if name == "findAndModify":
+        return command.get("query")
+    return None
+
+
+def _documents_returned(reply):
+    cursor = reply.get("cursor")
+    if cursor:
+        return len(cursor.get("firstBatch", cursor.get("nextBatch", [])))
+    if "values" in reply:
+        return len(reply["values"])
+    return reply.get("n", 0)
+
+
+class QueryProfile:
+    """The MongoDB commands issued while serving one request"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started = {}
+        self.commands = []
+
+    def started(self, event):
+        name = event.command_name
+        collection = event.command.get(name)
+        if name == "getMore":
+            collection = event.command.get("collection")
+        if not isinstance(collection, str):
+            return
+        with self._lock:
+            self._started[(event.connection_id, event.request_id)] = {
+                "command": name,
+                "collection": collection,
+                "filter": filter_shape(_command_filter(name, event.command)),
+            }
+
+    def finished(self, event, reply=None):
+        with self._lock:
+            command = self._started.pop((event.connection_id, event.request_id), None)
+            if command is None:
+                return
+            command["duration_ms"] = event.duration_micros / 1000
+            command["documents"] = _documents_returned(reply) if reply else 0
+            command["failed"] = reply is None
+            self.commands.append(command)
+
+    def n_plus_one(self, threshold):
+        """Collections hit by ``threshold`` or more single-id lookups"""
+        lookups = defaultdict(int)
+        for command in self.commands:
+            if command["command"] == "find" and command["filter"] == {"_id": "?"}:
+                lookups[command["collection"]] += 1
+        return {name: count for name, count in lookups.items() if count >= threshold}
+
+    def summary(self, threshold=3):
+        by_collection = defaultdict(int)
+        for command in self.commands:
+            by_collection[command["collection"]] += 1
+        return {
+            "commands": len(self.commands),
+            "time_ms": round(sum(c["duration_ms"] for c in self.commands), 3),
+            "documents": sum(c["documents"] for c in self.commands),
+            "by_collection": dict(by_collection),
+            "n_plus_one": self.n_plus_one(threshold),
+        }
+
+
+@contextmanager
+def profiling(profile=None):
+    """Record the commands issued in this context into ``profile``
+
+    A new QueryProfile is used when none is given.
+    """
+    profile = profile or QueryProfile()
+    token = _current_profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _current_profile.reset(token)
+
+
+class CommandProfiler(monitoring.CommandListener):
+    """Feeds pymongo command events into the active request's QueryProfile
+
+    Does nothing outside :func:`profiling`. Queries run on worker threads by
+    the async views inherit the request's context, so they are recorded too.
+    """
+
+    def started(self, event):
+        profile = _current_profile.get()
+        if profile is not None:
+            profile.started(event)
+
+    def succeeded(self, event):
+        profile = _current_profile.get()
+        if profile is not None:
+            profile.finished(event, event.reply)
+
+    def failed(self, event):
+        profile = _current_profile.get()
+        if profile is not None:
+            profile.finished(event)
+
+
+command_profiler = CommandProfiler()
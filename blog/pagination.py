@@ -0,0 +1,130 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from django.conf import settings
+from django.core.cache import cache
+from mongoengine.queryset.visitor import Q
+
+from . import aio
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+
+def encode_cursor(post, direction):
+    """Opaque token pointing just past ``post`` in the given direction"""
+    payload = json.dumps(
+        {"p": post.published_at.isoformat(), "i": str(post.id), "d": direction},
+        separators=(",", ":"),
+    )
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    """Return ``(published_at, id, direction)`` for a cursor token"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        direction = payload["d"]
+        if direction not in ("next", "prev"):
+            raise InvalidCursor("Unknown cursor direction")
+        return datetime.fromisoformat(payload["p"]), ObjectId(payload["i"]), direction
+    except (binascii.Error, ValueError, KeyError, TypeError, InvalidId) as e:
+        raise InvalidCursor("Invalid pagination cursor") from e
+
+
+class CursorPage:
+    """One page of keyset-paginated posts"""
+
+    def __init__(self, items, has_next, has_previous):
+        self.items = items
+        self.has_next = has_next
+        self.has_previous = has_previous
+
+    @property
+    def next_cursor(self):
+        if self.has_next and self.items:
+            return encode_cursor(self.items[-1], "next")
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous and self.items:
+            return encode_cursor(self.items[0], "prev")
+        return None
+
+
+def _cursor_queryset(queryset, cursor, limit):
+    """The queryset for one page, fetching one extra post to detect more"""
+    if cursor:
+        published_at, post_id, direction = decode_cursor(cursor)
+    else:
+        published_at, post_id, direction = None, None, "next"
+
+    if direction == "next":
+        if cursor:
+            queryset = queryset.filter(
+                Q(published_at__lt=published_at)
+                | Q(published_at=published_at, id__lt=post_id)
+            )
+        queryset = queryset.order_by("-published_at", "-id")
+    else:
+        queryset = queryset.filter(
+            Q(published_at__gt=published_at)
+            | Q(published_at=published_at, id__gt=post_id)
+        ).order_by("published_at", "id")
+
+    return queryset.limit(limit + 1), direction
+
+
+def _cursor_page(items, direction, cursor, limit):
+    has_more = len(items) > limit
+    items = items[:limit]
+
+    if direction == "next":
+        return CursorPage(items, has_next=has_more, has_previous=bool(cursor))
+
+    items.reverse()
+    return CursorPage(items, has_next=True, has_previous=has_more)
+
+
+def paginate_by_cursor(queryset, cursor=None, limit=10):
+    """Keyset pagination over ``(published_at, id)``, newest first
+
+    Instead of ``skip()``, each page starts from the position encoded in the
+    cursor, so deep pages cost the same as the first one. The queryset must
+    only contain posts with a ``published_at`` date.
+    """
+    queryset, direction = _cursor_queryset(queryset, cursor, limit)
+    return _cursor_page(list(queryset), direction, cursor, limit)
+
+
+async def apaginate_by_cursor(queryset, cursor=None, limit=10):
+    """Async :func:`paginate_by_cursor`"""
+    queryset, direction = _cursor_queryset(queryset, cursor, limit)
+    return _cursor_page(await aio.fetch(queryset), direction, cursor, limit)
+
+
+def cached_count(key, queryset):
+    """Count ``queryset``, reusing the result for COUNT_CACHE_TTL seconds"""
+    cache_key = f"count:{key}"
+    total = cache.get(cache_key)
+    if total is None:
+        total = queryset.count()
+        cache.set(cache_key, total, getattr(settings, "COUNT_CACHE_TTL", 60))
+    return total
+
+
+async def acached_count(key, queryset):
+    """Async :func:`cached_count`"""
+    cache_key = f"count:{key}"
+    total = await cache.aget(cache_key)
+    if total is None:
+        total = await aio.count(queryset)
+        await cache.aset(cache_key, total, getattr(settings, "COUNT_CACHE_TTL", 60))
+    return total
@@ -0,0 +1,148 @@
+from datetime import datetime
+
+from django.conf import settings
+from pymongo import UpdateOne
+
+
+def _weights():
+    return {
+        "tag": getattr(settings, "RELATED_POSTS_TAG_WEIGHT", 3),
+        "category": getattr(settings, "RELATED_POSTS_CATEGORY_WEIGHT", 2),
+        "author": getattr(settings, "RELATED_POSTS_AUTHOR_WEIGHT", 1),
+    }
+
+
+def related_pipeline(post, limit, now=None):
+    """Aggregation scoring published posts against ``post``'s raw document
+
+    Each shared tag, a shared category and a shared author add their weight
+    to the score. Only posts sharing at least one of them are considered, and
+    only their ids come back.
+    """
+    now = now or datetime.utcnow()
+    weights = _weights()
+    tags = list(post.get("tags") or [])
+    category, author = post.get("category"), post.get("author")
+
+    shared = [{"tags": {"$in": tags}}] if tags else []
+    if category:
+        shared.append({"category": category})
+    if author:
+        shared.append({"author": author})
+
+    return [
+        {
+            "$match": {
+                "_id": {"$ne": post["_id"]},
+                "is_published": True,
+                "published_at": {"$lte": now},
+                "$or": shared,
+            }
+        },
+        {
+            "$project": {
+                "published_at": 1,
+                "score": {
+                    "$add": [
+                        {
+                            "$multiply": [
+                                weights["tag"],
+                                {
+                                    "$size": {
+                                        "$filter": {
+                                            "input": {"$ifNull": ["$tags", []]},
+                                            "as": "tag",
+                                            "cond": {"$in": ["$$tag", tags]},
+                                        }
+                                    }
+                                },
+                            ]
+                        },
+                        {
+                            "$cond": [
+                                {"$eq": ["$category", category]},
+                                weights["category"],
+                                0,
+                            ]
+                        },
+                        {"$cond": [{"$eq": ["$author", author]}, weights["author"], 0]},
+                    ]
+                },
+            }
+        },
+        {"$sort": {"score": -1, "published_at": -1, "_id": -1}},
+        {"$limit": limit},
+        {"$project": {"_id": 1}},
+    ]
+
+
+def compute_related_ids(collection, post, limit=None):
+    """Ids of the posts most related to ``post``, best first"""
+    limit = limit or getattr(settings, "RELATED_POSTS_LIMIT", 6)
+    if not (post.get("tags") or post.get("category") or post.get("author")):
+        return []
+    return [row["_id"] for row in collection.aggregate(related_pipeline(post, limit))]
+
+
+def refresh_related(collection, post_ids, batch_size=500):
+    """Recompute and store ``related_post_ids`` for the given posts
+
+    The lists are written with ``$set`` in bulk, so refreshing neither
+    rewrites the posts nor bumps their ``updated_at``. ``related_computed_at``
+    marks a list as computed, empty ones included, so only posts that never
+    had one are scored on the fly. Returns the number of posts whose list
+    changed.
+    """
+    post_ids = list(post_ids)
+    now = datetime.utcnow()
+    changed = 0
+    for start in range(0, len(post_ids), batch_size):
+        batch = post_ids[start : start + batch_size]
+        requests = []
+        cursor = collection.find(
+            {"_id": {"$in": batch}},
+            {
+                "tags": 1,
+                "category": 1,
+                "author": 1,
+                "related_post_ids": 1,
+                "related_computed_at": 1,
+            },
+        )
+        for post in cursor:
+            related = compute_related_ids(collection, post)
+            differs = related != post.get("related_post_ids")
+            if differs or "related_computed_at" not in post:
+                requests.append(
+                    UpdateOne(
+                        {"_id": post["_id"]},
+                        {
+                            "$set": {
+                                "related_post_ids": related,
+                                "related_computed_at": now,
+                            }
+                        },
+                    )
+                )
+                changed += differs
+        if requests:
+            collection.bulk_write(requests, ordered=False)
+    return changed
+
+
+def refresh_neighbours(collection, post_id):
+    """Refresh a post's related list and those of the posts around it
+
+    Scores are symmetric, so the posts most likely to change are the ones
+    that listed this post before and the ones it is related to now.
+    Recomputing just those keeps the update incremental; the rebuild_related
+    command recomputes everything.
+    """
+    refresh_related(collection, [post_id])
+    current = collection.find_one({"_id": post_id}, {"related_post_ids": 1}) or {}
+    affected = set(current.get("related_post_ids") or [])
+    affected |= set(collection.distinct("_id", {"related_post_ids": post_id}))
+    affected.discard(post_id)
+    if affected:
+        refresh_related(collection, affected)
+    return len(affected) + 1
@@ -0,0 +1,94 @@
+"""Send the queries of read-only views to a read replica connection
+
+Views decorated with :func:`read_replica` run with the MONGO_READ_ALIAS
+connection selected in a context variable. While it is selected, every
+query made through a :class:`RoutedQuerySet` reads from that connection,
+usually secondaries or an analytics node with a bounded staleness.
+Queryset writes, ``Document.save()`` and the raw collection writes
+(comments, view counts, newsletter) always go to the primary. Without a
+configured alias everything stays on the primary.
+"""
+
+import asyncio
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+
+import mongoengine
+from django.conf import settings
+from mongoengine import QuerySet
+
+_read_alias = contextvars.ContextVar("read_alias", default=None)
+
+
+def current_read_alias():
+    """Connection alias reads are routed to, or None for the primary"""
+    return _read_alias.get()
+
+
+@contextmanager
+def reading_from(alias):
+    """Route reads in this context to ``alias`` (None means the primary)"""
+    token = _read_alias.set(alias)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def primary():
+    """Force reads in this context back onto the primary"""
+    return reading_from(None)
+
+
+def read_collection(document):
+    """Collection to read ``document`` from in the current context"""
+    alias = current_read_alias()
+    if alias is None:
+        return document._get_collection()
+    return mongoengine.get_db(alias)[document._get_collection_name()]
+
+
+def read_replica(view):
+    """Run a sync or async view with its reads routed to MONGO_READ_ALIAS"""
+    if asyncio.iscoroutinefunction(view):
+
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            with reading_from(getattr(settings, "MONGO_READ_ALIAS", None)):
+                return await view(request, *args, **kwargs)
+
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with reading_from(getattr(settings, "MONGO_READ_ALIAS", None)):
+            return view(request, *args, **kwargs)
+
+    return wrapper
+
+
+def _on_primary(method):
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with primary():
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+class RoutedQuerySet(QuerySet):
+    """QuerySet reading from the routed connection, writing to the primary"""
+
+    @property
+    def _collection(self):
+        if current_read_alias() is None:
+            return self._collection_obj
+        return read_collection(self._document)
+
+    insert = _on_primary(QuerySet.insert)
+    update = _on_primary(QuerySet.update)
+    update_one = _on_primary(QuerySet.update_one)
+    upsert_one = _on_primary(QuerySet.upsert_one)
+    modify = _on_primary(QuerySet.modify)
+    delete = _on_primary(QuerySet.delete)
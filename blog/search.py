@@ -0,0 +1,56 @@
+from django.conf import settings
+
+from .models import BlogPost, load_summaries
+
+
+class SearchResults:
+    """One page of ranked search results"""
+
+    def __init__(self, posts, total, page, per_page, capped):
+        self.posts = posts
+        self.total = total
+        self.page = page
+        self.per_page = per_page
+        self.capped = capped  # True when more than ``total`` posts matched
+
+    @property
+    def has_next(self):
+        return self.page * self.per_page < self.total
+
+    @property
+    def has_previous(self):
+        return self.page > 1
+
+
+def ranked_queryset(query, limit):
+    """Published posts matching ``query``, best match first
+
+    A single ``$text`` query against the weighted title/excerpt/content text
+    index, projected down to ``_id`` and the relevance score and bounded by
+    ``limit`` documents and SEARCH_MAX_TIME_MS of server time.
+    """
+    return (
+        BlogPost.get_published()
+        .search_text(query)
+        .order_by("$text_score")
+        .only("id")
+        .limit(limit)
+        .max_time_ms(getattr(settings, "SEARCH_MAX_TIME_MS", 2000))
+    )
+
+
+def ranked_post_ids(query, limit):
+    """Ids of up to ``limit`` published posts matching ``query``, best first"""
+    return [doc["_id"] for doc in ranked_queryset(query, limit).as_pymongo()]
+
+
+def search_posts(query, page=1, per_page=10):
+    """Return a page of published posts ranked by relevance to ``query``"""
+    max_results = getattr(settings, "SEARCH_MAX_RESULTS", 100)
+    # Fetch one extra id to know whether the result set was cut off
+    ids = ranked_post_ids(query, max_results + 1)
+    capped = len(ids) > max_results
+    ids = ids[:max_results]
+
+    page_ids = ids[(page - 1) * per_page : page * per_page]
+    return SearchResults(load_summaries(page_ids), len(ids), page, per_page, capped)
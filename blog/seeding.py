@@ -0,0 +1,261 @@
+"""Synthetic dataset generator for load tests and benchmarks
+
+Builds users, authors, tags, categories and posts as raw documents in the
+shape the models store, with every reference resolved in memory from ids
+generated up front. Documents are produced lazily and written with
+unordered ``insert_many`` calls of ``batch_size``, so memory stays flat and
+a million posts load in minutes. Everything, ids included, is derived from
+``seed``, so the same arguments always produce the same database.
+
+Popularity is skewed the way real blogs are: a few authors write most
+posts, and a few tags and categories are used far more than the rest.
+"""
+
+import itertools
+import random
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from django.contrib.auth.hashers import make_password
+
+from .cache import page_cache
+from .models import (
+    Author,
+    BlogPost,
+    Category,
+    ChangeVersion,
+    Tag,
+    User,
+)
+
+# Seeded dates end here, so they do not depend on when the seed ran
+SEED_EPOCH = datetime(2025, 1, 1)
+SEED_PASSWORD = "seed-password"
+
+FIRST_NAMES = (
+    "Ada Alan Barbara Dennis Edsger Frances Grace Guido Ken Linus Margaret "
+    "Niklaus Radia Rob Sophie Tim Yukihiro"
+).split()
+
+WORDS = (
+    "mongodb django python index query cursor shard replica cache latency "
+    "schema document aggregate pipeline async server deploy scaling memory "
+    "profile benchmark vector search stream batch cluster design pattern "
+    "testing release monitor metric trace storage network protocol model"
+).split()
+
+
+def _object_id(created_at, number):
+    """Deterministic ObjectId: the creation time, then a per-collection counter"""
+    seconds = int((created_at - datetime(1970, 1, 1)).total_seconds())
+    return ObjectId(seconds.to_bytes(4, "big") + number.to_bytes(8, "big"))
+
+
+def _zipf_weights(count, exponent=1.1):
+    return list(
+        itertools.accumulate(1 / rank**exponent for rank in range(1, count + 1))
+    )
+
+
+def _batches(documents, size):
+    iterator = iter(documents)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+class Seeder:
+    """Generates and inserts one synthetic dataset"""
+
+    def __init__(
+        self,
+        users=1000,
+        authors=100,
+        tags=200,
+        categories=20,
+        posts=10000,
+        comments=3.0,
+        days=730,
+        seed=0,
+        batch_size=5000,
+    ):
+        self.counts = {
+            "users": max(users, authors),
+            "authors": authors,
+            "tags": tags,
+            "categories": categories,
+            "posts": posts,
+        }
+        self.comments = comments
+        self.days = days
+        self.batch_size = batch_size
+        self.random = random.Random(seed)
+        # Hashing is deliberately slow, so every seeded user shares one hash
+        self.password = make_password(SEED_PASSWORD, salt="seeded")
+
+    def _date(self):
+        return SEED_EPOCH - timedelta(seconds=self.random.uniform(0, self.days * 86400))
+
+    def _words(self, low, high):
+        return " ".join(self.random.choices(WORDS, k=self.random.randint(low, high)))
+
+    def _insert(self, document, documents):
+        collection = document._get_collection()
+        inserted = 0
+        for batch in _batches(documents, self.batch_size):
+            collection.insert_many(batch, ordered=False)
+            inserted += len(batch)
+        return inserted
+
+    # ========================================================================
+    # Documents
+    # ========================================================================
+
+    def users(self):
+        for i in range(self.counts["users"]):
+            joined = self._date()
+            yield {
+                "_id": _object_id(joined, i),
+                "username": f"user{i}",
+                "email": f"user{i}@example.com",
+                "password": self.password,
+                "first_name": self.random.choice(FIRST_NAMES),
+                "last_name": f"Seed{i}",
+                "is_active": True,
+                "is_staff": False,
+                "is_superuser": False,
+                "date_joined": joined,
+            }
+
+    def authors(self, users):
+        # The first users are the authors
+        for i, user in enumerate(itertools.islice(users, self.counts["authors"])):
+            yield {
+                "_id": _object_id(user["date_joined"], i),
+                "user": user["_id"],
+                "username": user["username"],
+                "email": user["email"],
+                "first_name": user["first_name"],
+                "last_name": user["last_name"],
+                "bio": self._words(8, 20),
+                "is_active": True,
+                "created_at": user["date_joined"],
+                "updated_at": user["date_joined"],
+            }
+
+    def tags(self):
+        for i in range(self.counts["tags"]):
+            created = self._date()
+            yield {
+                "_id": _object_id(created, i),
+                "name": f"Topic {i}",
+                "slug": f"topic-{i}",
+                "created_at": created,
+            }
+
+    def categories(self):
+        for i in range(self.counts["categories"]):
+            created = self._date()
+            yield {
+                "_id": _object_id(created, i),
+                "name": f"Section {i}",
+                "slug": f"section-{i}",
+                "created_at": created,
+            }
+
+    def comment(self, after):
+        created = after + timedelta(seconds=self.random.uniform(60, 30 * 86400))
+        return {
+            "comment_id": _object_id(created, self.random.getrandbits(64)),
+            "author_name": f"Reader {self.random.randrange(100000)}",
+            "author_email": "reader@example.com",
+            "content": self._words(5, 40),
+            "created_at": created,
+            "is_approved": self.random.random() < 0.8,
+        }
+
+    def posts(self, author_ids, tag_ids, category_ids):
+        author_weights = _zipf_weights(len(author_ids))
+        tag_weights = _zipf_weights(len(tag_ids))
+        category_weights = _zipf_weights(len(category_ids))
+
+        for i in range(self.counts["posts"]):
+            created = self._date()
+            content = " ".join(self._words(10, 30) + "." for _ in range(6))
+            author = self.random.choices(author_ids, cum_weights=author_weights)[0]
+            comments = []
+            if self.comments:
+                count = int(self.random.expovariate(1 / self.comments))
+                comments = [self.comment(created) for _ in range(count)]
+            post = {
+                "_id": _object_id(created, i),
+                "title": f"{self._words(3, 8).capitalize()} {i}",
+                "slug": f"post-{i}",
+                "content": content,
+                "excerpt": content[:297] + "..." if len(content) > 300 else content,
+                "author": author,
+                "tags": [],
+                "is_published": self.random.random() < 0.9,
+                "is_featured": False,
+                "created_at": created,
+                "updated_at": created,
+                "view_count": int(self.random.lognormvariate(4, 1.5)),
+                "like_count": int(self.random.lognormvariate(1, 1.2)),
+                "approved_comment_count": sum(c["is_approved"] for c in comments),
+                "comments": comments,
+                "related_post_ids": [],
+                "metadata": {"seeded": True},
+            }
+            if tag_ids:
+                tags = self.random.choices(
+                    tag_ids, cum_weights=tag_weights, k=self.random.randint(1, 5)
+                )
+                post["tags"] = list(dict.fromkeys(tags))
+            if category_ids:
+                post["category"] = self.random.choices(
+                    category_ids, cum_weights=category_weights
+                )[0]
+            if post["is_published"]:
+                post["published_at"] = created
+                post["is_featured"] = self.random.random() < 0.02
+            yield post
+
+    # ========================================================================
+    # Loading
+    # ========================================================================
+
+    def run(self):
+        """Insert the dataset and return the number of documents per collection"""
+        for document in (User, Author, Tag, Category, BlogPost):
+            document.ensure_indexes()
+
+        # Only the posts are streamed; the rest is small enough to hold
+        users = list(self.users())
+        authors = list(self.authors(users))
+        tags = list(self.tags())
+        categories = list(self.categories())
+        inserted = {
+            "users": self._insert(User, users),
+            "authors": self._insert(Author, authors),
+            "tags": self._insert(Tag, tags),
+            "categories": self._insert(Category, categories),
+        }
+        inserted["posts"] = self._insert(
+            BlogPost,
+            self.posts(
+                [author["_id"] for author in authors],
+                [tag["_id"] for tag in tags],
+                [category["_id"] for category in categories],
+            ),
+        )
+
+        # Raw inserts bypass BlogPost.save, which keeps these up to date
+        BlogPost.recount_posts()
+        ChangeVersion.bump("blog_posts", "authors", "tags", "categories")
+        page_cache.invalidate("posts", "tags", "categories")
+        return inserted
+
+
+def drop_seeded_collections():
+    """Drop every collection the seeder writes to"""
+    for document in (User, Author, Tag, Category, BlogPost, ChangeVersion):
+        document.drop_collection()
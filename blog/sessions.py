@@ -0,0 +1,200 @@
+"""Django session engine storing sessions in MongoDB through UserSession
+
+Enabled with ``SESSION_ENGINE = "blog.sessions"``. Sessions are written with
+a single upsert on ``session_key`` and removed by the TTL index on
+``expire_date``, so no cleanup job is needed. With SESSION_SAVE_EVERY_REQUEST
+Django saves the session on every request; here that save only reaches
+MongoDB when the data changed, or when the stored expiry is more than
+SESSION_TOUCH_INTERVAL seconds behind, which keeps expiry sliding at one
+write per interval instead of one per request.
+
+Anonymous sessions are kept in a small per-process cache for
+SESSION_LOCAL_CACHE_TTL seconds. Writes made by this process update it
+straight away; writes from other workers are seen once the entry expires.
+Sessions of logged-in users are never cached, so a logout or ``flush()`` on
+one worker ends the session on every worker at once. Reads and writes
+always go to the primary.
+
+The TTL index replaces the plain ``expire_date_1`` index older databases
+have under the same name; ``python manage.py audit_indexes --apply`` drops
+and recreates it.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.contrib.sessions.backends.base import CreateError, SessionBase
+from pymongo.errors import DuplicateKeyError
+
+from .models import UserSession
+
+
+def _naive_utc(value):
+    """MongoDB returns naive UTC datetimes; compare like with like"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class LocalSessionCache:
+    """Bounded, short-lived cache of ``(session_data, expire_date)`` by key"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    @property
+    def ttl(self):
+        return getattr(settings, "SESSION_LOCAL_CACHE_TTL", 5.0)
+
+    @property
+    def max_entries(self):
+        return getattr(settings, "SESSION_LOCAL_CACHE_SIZE", 10000)
+
+    def get(self, session_key):
+        with self._lock:
+            entry = self._entries.get(session_key)
+            if entry is None:
+                return None
+            session_data, expire_date, cached_at = entry
+            if time.monotonic() - cached_at > self.ttl:
+                del self._entries[session_key]
+                return None
+            self._entries.move_to_end(session_key)
+            return session_data, expire_date
+
+    def set(self, session_key, session_data, expire_date):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[session_key] = (session_data, expire_date, time.monotonic())
+            self._entries.move_to_end(session_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, session_key):
+        with self._lock:
+            self._entries.pop(session_key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+local_cache = LocalSessionCache()
+
+
+class SessionStore(SessionBase):
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        # Serialised data and expiry as last read or written, to skip
+        # saving a session that did not change
+        self._stored = None
+
+    @staticmethod
+    def _collection():
+        return UserSession._get_collection()
+
+    def _fetch(self, session_key):
+        """``(session_data, expire_date)`` of an unexpired session, or None"""
+        now = datetime.utcnow()
+        found = local_cache.get(session_key)
+        if found is None:
+            # The TTL monitor runs once a minute, so expiry is checked here too
+            document = self._collection().find_one(
+                {"session_key": session_key, "expire_date": {"$gt": now}},
+                projection={"_id": 0, "session_data": 1, "expire_date": 1},
+            )
+            if document is None:
+                return None
+            found = document["session_data"], document["expire_date"]
+        elif found[1] <= now:
+            local_cache.discard(session_key)
+            return None
+        return found
+
+    def _fingerprint(self, session):
+        return self.serializer().dumps(session)
+
+    @staticmethod
+    def _remember(session_key, session, session_data, expire_date):
+        # A logged-in session must end everywhere as soon as it is deleted
+        if SESSION_KEY in session:
+            local_cache.discard(session_key)
+        else:
+            local_cache.set(session_key, session_data, expire_date)
+
+    def load(self):
+        found = self._fetch(self.session_key) if self.session_key else None
+        if found is None:
+            self._session_key = None
+            return {}
+        session_data, expire_date = found
+        session = self.decode(session_data)
+        self._stored = (self._fingerprint(session), expire_date)
+        self._remember(self.session_key, session, session_data, expire_date)
+        return session
+
+    def exists(self, session_key):
+        return self._fetch(session_key) is not None
+
+    def create(self):
+        while True:
+            self._session_key = self._get_new_session_key()
+            try:
+                self.save(must_create=True)
+            except CreateError:
+                continue
+            self.modified = True
+            return
+
+    def _unchanged(self, fingerprint, expire_date):
+        if self._stored is None:
+            return False
+        stored_fingerprint, stored_expiry = self._stored
+        touch = timedelta(seconds=getattr(settings, "SESSION_TOUCH_INTERVAL", 300))
+        return fingerprint == stored_fingerprint and expire_date - stored_expiry < touch
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        session = self._get_session(no_load=must_create)
+        expire_date = _naive_utc(self.get_expiry_date())
+        fingerprint = self._fingerprint(session)
+        if not must_create and self._unchanged(fingerprint, expire_date):
+            return
+
+        session_data = self.encode(session)
+        fields = {"session_data": session_data, "expire_date": expire_date}
+        if must_create:
+            try:
+                self._collection().insert_one(
+                    dict(fields, session_key=self._session_key)
+                )
+            except DuplicateKeyError:
+                raise CreateError
+        else:
+            self._collection().update_one(
+                {"session_key": self._session_key}, {"$set": fields}, upsert=True
+            )
+        self._stored = (fingerprint, expire_date)
+        self._remember(self._session_key, session, session_data, expire_date)
+
+    def delete(self, session_key=None):
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        local_cache.discard(session_key)
+        self._collection().delete_one({"session_key": session_key})
+
+    @classmethod
+    def clear_expired(cls):
+        """The TTL index removes expired sessions; this only speeds it up"""
+        UserSession._get_collection().delete_many(
+            {"expire_date": {"$lte": datetime.utcnow()}}
+        )
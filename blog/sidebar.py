@@ -0,0 +1,66 @@
+"""Navigation sidebar shared by the listing pages
+
+Categories and the most used tags are read with one projected query per
+collection and cached for SIDEBAR_CACHE_TTL seconds in the default cache. Entries are plain dicts
+of name, slug and post_count (and description for categories), so rendering
+needs nothing else. The counts are the denormalised ``post_count`` fields
+BlogPost keeps up to date; saving a post, tag or category clears the cache.
+Category listings include subcategories, so a category's count is added up
+over its subtree from the direct counts.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Category, Tag
+from .routing import read_collection
+
+SIDEBAR_CACHE_KEY = "sidebar:navigation"
+
+
+def load_sidebar(tag_limit=None):
+    """``{"categories": [...], "tags": [...]}`` straight from the database"""
+    tag_limit = tag_limit or getattr(settings, "SIDEBAR_TAG_LIMIT", 30)
+    categories = list(
+        read_collection(Category)
+        .find(
+            {},
+            {"name": 1, "slug": 1, "description": 1, "post_count": 1, "ancestors": 1},
+        )
+        .sort("name", 1)
+    )
+    totals = {category["_id"]: 0 for category in categories}
+    for category in categories:
+        for category_id in [category["_id"], *(category.pop("ancestors", None) or [])]:
+            if category_id in totals:
+                totals[category_id] += category.get("post_count") or 0
+    for category in categories:
+        category["post_count"] = totals[category.pop("_id")]
+    tags = (
+        read_collection(Tag)
+        .find(
+            {"post_count": {"$gt": 0}},
+            {"_id": 0, "name": 1, "slug": 1, "post_count": 1},
+        )
+        .sort("post_count", -1)
+        .limit(tag_limit)
+    )
+    return {
+        "categories": categories,
+        "tags": list(tags),
+    }
+
+
+def get_sidebar():
+    """The sidebar, reloaded at most every SIDEBAR_CACHE_TTL seconds"""
+    sidebar = cache.get(SIDEBAR_CACHE_KEY)
+    if sidebar is None:
+        sidebar = load_sidebar()
+        cache.set(
+            SIDEBAR_CACHE_KEY, sidebar, getattr(settings, "SIDEBAR_CACHE_TTL", 60)
+        )
+    return sidebar
+
+
+def clear_sidebar():
+    cache.delete(SIDEBAR_CACHE_KEY)
@@ -0,0 +1,182 @@
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Author, BlogPost, Category, Newsletter, Tag
+from .routing import read_collection
+
+STATS_CACHE_KEY = "stats:dashboard"
+
+# Everything the post facets read; content and comments never enter $facet
+POST_STATS_FIELDS = (
+    "is_published",
+    "published_at",
+    "created_at",
+    "view_count",
+    "approved_comment_count",
+    "author",
+    "tags",
+    "category",
+)
+
+
+def _first(rows):
+    return rows[0] if rows else {}
+
+
+def _count(rows):
+    return _first(rows).get("count", 0)
+
+
+def _breakdown(group_by, collection, label_field, limit, unwind=False):
+    """Facet pipeline totalling posts and views per referenced document
+
+    Only the top ``limit`` groups are joined back to ``collection`` for their
+    label, so the lookups stay bounded however many groups there are.
+    """
+    stages = [{"$unwind": f"${group_by}"}] if unwind else []
+    stages += [
+        {"$match": {group_by: {"$ne": None}}},
+        {
+            "$group": {
+                "_id": f"${group_by}",
+                "posts": {"$sum": 1},
+                "views": {"$sum": "$view_count"},
+            }
+        },
+        {"$sort": {"posts": -1, "views": -1, "_id": 1}},
+        {"$limit": limit},
+        {
+            "$lookup": {
+                "from": collection,
+                "localField": "_id",
+                "foreignField": "_id",
+                "as": "doc",
+            }
+        },
+        {
+            "$project": {
+                "posts": 1,
+                "views": 1,
+                "label": {"$arrayElemAt": [f"$doc.{label_field}", 0]},
+                "slug": {"$arrayElemAt": ["$doc.slug", 0]},
+            }
+        },
+    ]
+    return stages
+
+
+def post_stats(limit=None, now=None):
+    """Totals, breakdowns and top post ids from one aggregation over posts"""
+    limit = limit or getattr(settings, "STATS_BREAKDOWN_LIMIT", 10)
+    now = now or datetime.utcnow()
+    published = {"is_published": True, "published_at": {"$lte": now}}
+
+    pipeline = [
+        {"$project": {field: 1 for field in POST_STATS_FIELDS}},
+        {
+            "$facet": {
+                "totals": [
+                    {
+                        "$group": {
+                            "_id": None,
+                            "posts": {"$sum": 1},
+                            "published": {
+                                "$sum": {
+                                    "$cond": [
+                                        {
+                                            "$and": [
+                                                {"$eq": ["$is_published", True]},
+                                                {"$lte": ["$published_at", now]},
+                                            ]
+                                        },
+                                        1,
+                                        0,
+                                    ]
+                                }
+                            },
+                            "views": {"$sum": "$view_count"},
+                            "comments": {"$sum": "$approved_comment_count"},
+                        }
+                    }
+                ],
+                "by_author": _breakdown(
+                    "author", Author._get_collection_name(), "username", limit
+                ),
+                "by_tag": _breakdown(
+                    "tags", Tag._get_collection_name(), "name", limit, unwind=True
+                ),
+                "by_category": _breakdown(
+                    "category", Category._get_collection_name(), "name", limit
+                ),
+                "recent": [
+                    {"$sort": {"created_at": -1}},
+                    {"$limit": 5},
+                    {"$project": {"_id": 1}},
+                ],
+                "popular": [
+                    {"$match": published},
+                    {"$sort": {"view_count": -1}},
+                    {"$limit": 5},
+                    {"$project": {"_id": 1}},
+                ],
+            }
+        },
+    ]
+    result = _first(list(read_collection(BlogPost).aggregate(pipeline)))
+    totals = _first(result.get("totals", []))
+
+    return {
+        "total_posts": totals.get("posts", 0),
+        "published_posts": totals.get("published", 0),
+        "total_views": totals.get("views", 0),
+        "total_comments": totals.get("comments", 0),
+        "by_author": result.get("by_author", []),
+        "by_tag": result.get("by_tag", []),
+        "by_category": result.get("by_category", []),
+        "recent_post_ids": [row["_id"] for row in result.get("recent", [])],
+        "popular_post_ids": [row["_id"] for row in result.get("popular", [])],
+    }
+
+
+def newsletter_stats():
+    """Active and total subscriber counts from one aggregation"""
+    pipeline = [
+        {
+            "$facet": {
+                "active": [{"$match": {"is_active": True}}, {"$count": "count"}],
+                "total": [{"$count": "count"}],
+            }
+        }
+    ]
+    result = _first(list(read_collection(Newsletter).aggregate(pipeline)))
+    return {
+        "newsletter_subscribers": _count(result.get("active", [])),
+        "newsletter_total": _count(result.get("total", [])),
+    }
+
+
+def collect_stats():
+    """Compute dashboard statistics without loading any documents"""
+    stats = post_stats()
+    stats.update(newsletter_stats())
+    # Plain totals need no aggregation: the collection metadata has them
+    stats["total_authors"] = read_collection(Author).estimated_document_count()
+    stats["total_tags"] = read_collection(Tag).estimated_document_count()
+    stats["total_categories"] = read_collection(Category).estimated_document_count()
+    stats["generated_at"] = datetime.utcnow()
+    return stats
+
+
+def get_dashboard_stats():
+    """Dashboard statistics, recomputed at most every STATS_CACHE_TTL seconds"""
+    stats = cache.get(STATS_CACHE_KEY)
+    if stats is None:
+        stats = collect_stats()
+        cache.set(STATS_CACHE_KEY, stats, getattr(settings, "STATS_CACHE_TTL", 30))
+    return stats
+
+
+def clear_dashboard_stats():
+    cache.delete(STATS_CACHE_KEY)
@@ -1,3 +1,2666 @@
-from django.test import TestCase
+import json
+import tempfile
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from unittest import mock
+from urllib.parse import urlsplit
 
-# Create your tests here.
+import mongoengine
+import mongomock
+from pymongo.errors import BulkWriteError
+from asgiref.sync import async_to_sync
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.core import mail, signing
+from django.core.exceptions import ImproperlyConfigured
+from django.core.cache import cache
+from django.core.mail.backends import locmem
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.urls import reverse
+
+from .auth import (
+    AuthenticationMiddleware,
+    MongoUserBackend,
+    get_user,
+    login,
+    update_session_auth_hash,
+)
+from .cache import page_cache, page_timeout
+from .mailing import SendInProgress, send_digest
+from .indexes import (
+    DOCUMENTS,
+    apply_index_plan,
+    audit_queries,
+    index_plan,
+    redundant_indexes,
+)
+from .counters import ViewCounter, view_counter
+from .middleware import QueryProfilerMiddleware
+from .monitoring import CommandProfiler, PoolMetrics, filter_shape, profiling, warm_up
+from .routing import RoutedQuerySet, reading_from, read_replica
+from .seeding import Seeder, drop_seeded_collections
+from .sessions import SessionStore, local_cache
+from .sidebar import get_sidebar
+from . import aio, async_views, feeds, search, stats, views
+from .pagination import InvalidCursor, decode_cursor, paginate_by_cursor
+from .models import (
+    BlogPost,
+    Comment,
+    Author,
+    Tag,
+    Category,
+    Newsletter,
+    NewsletterSend,
+    SiteSettings,
+    User,
+    UserSession,
+    prefetch_references,
+    update_post_counts,
+)
+
+
+# ============================================================================
+# Test Helpers
+# ============================================================================
+
+
+class QueryCounter:
+    """Counts MongoDB read commands issued per collection"""
+
+    def __init__(self):
+        self.calls = []
+        self.projections = []
+
+    def __len__(self):
+        return len(self.calls)
+
+    @property
+    def by_collection(self):
+        return Counter(name for name, _ in self.calls)
+
+
+@contextmanager
+def count_queries():
+    """Record every find/count/aggregate sent to the mongomock backend"""
+    counter = QueryCounter()
+    patches = []
+
+    for method in ("find", "count_documents", "aggregate"):
+        original = getattr(mongomock.collection.Collection, method)
+
+        def wrapper(self, *args, _original=original, _method=method, **kwargs):
+            counter.calls.append((self.name, _method))
+            if _method == "find":
+                counter.projections.append((self.name, kwargs.get("projection")))
+            return _original(self, *args, **kwargs)
+
+        patches.append(
+            mock.patch.object(mongomock.collection.Collection, method, wrapper)
+        )
+
+    for patch in patches:
+        patch.start()
+    try:
+        yield counter
+    finally:
+        for patch in patches:
+            patch.stop()
+
+
+class MongoTestCase(SimpleTestCase):
+    """Base test case running against an in-memory mongomock database"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        mongoengine.disconnect()
+        mongoengine.connect("blog_test", mongo_client_class=mongomock.MongoClient)
+
+    @classmethod
+    def tearDownClass(cls):
+        mongoengine.disconnect()
+        super().tearDownClass()
+
+    def tearDown(self):
+        view_counter.reset()
+        SiteSettings.clear_cache()
+        page_cache.backend.clear()
+        page_cache.reset_stats()
+        cache.clear()
+        db = mongoengine.get_db()
+        for name in db.list_collection_names():
+            db.drop_collection(name)
+        super().tearDown()
+
+    def create_posts(self, count, tags_per_post=3):
+        user = User.create_user("writer", "writer@example.com", "secret123")
+        author = Author.create_from_user(user)
+        categories = [Category(name=f"Category {i}").save() for i in range(3)]
+        tags = [Tag(name=f"Tag {i}").save() for i in range(5)]
+
+        posts = []
+        for i in range(count):
+            posts.append(
+                BlogPost(
+                    title=f"Post {i}",
+                    content=f"Content for post {i}",
+                    author=author,
+                    category=categories[i % len(categories)],
+                    tags=tags[i % 2 : i % 2 + tags_per_post],
+                    is_published=True,
+                ).save()
+            )
+        return posts
+
+
+# ============================================================================
+# Reference Prefetching
+# ============================================================================
+
+
+class PrefetchReferencesTests(MongoTestCase):
+    def touch_references(self, posts):
+        for post in posts:
+            post.author.username
+            post.category.name
+            [tag.name for tag in post.tags]
+
+    def test_prefetch_resolves_each_collection_once(self):
+        self.create_posts(8)
+
+        with count_queries() as queries:
+            posts = BlogPost.get_published().prefetch_references()
+            self.touch_references(posts)
+
+        self.assertEqual(len(posts), 8)
+        self.assertEqual(
+            queries.by_collection,
+            {"blog_posts": 1, "authors": 1, "tags": 1, "categories": 1},
+        )
+
+    def test_prefetch_matches_lazy_dereferencing(self):
+        self.create_posts(4)
+
+        lazy = list(BlogPost.objects.order_by("title"))
+        prefetched = BlogPost.objects.order_by("title").prefetch_references()
+
+        for a, b in zip(lazy, prefetched):
+            self.assertEqual(a.author.id, b.author.id)
+            self.assertEqual(a.category.id, b.category.id)
+            self.assertEqual([t.id for t in a.tags], [t.id for t in b.tags])
+
+    def test_prefetch_does_not_mark_posts_changed(self):
+        self.create_posts(2)
+
+        posts = prefetch_references(BlogPost.objects.all())
+
+        for post in posts:
+            self.assertEqual(post._get_changed_fields(), [])
+
+    def list_urls(self):
+        return [
+            reverse("blog:home"),
+            reverse("blog:post_list"),
+            reverse("blog:posts_by_author", args=["writer"]),
+            reverse("blog:posts_by_tag", args=["tag-1"]),
+            reverse("blog:posts_by_category", args=["category-0"]),
+            reverse("blog:api_posts"),
+        ]
+
+    def test_list_views_cost_fixed_number_of_queries(self):
+        self.create_posts(2)
+        urls = self.list_urls()
+        with count_queries() as small:
+            for url in urls:
+                self.assertContains(self.client.get(url), "writer")
+
+        self.tearDown()
+        self.create_posts(10)
+        urls = self.list_urls()
+        with count_queries() as large:
+            for url in urls:
+                self.assertContains(self.client.get(url), "writer")
+
+        self.assertEqual(small.by_collection, large.by_collection)
+
+
+# ============================================================================
+# View Counting
+# ============================================================================
+
+
+class ViewCounterTests(MongoTestCase):
+    def test_increments_are_buffered_until_flush(self):
+        post = self.create_posts(1)[0]
+        counter = ViewCounter(flush_interval=3600, max_pending=100)
+
+        for _ in range(3):
+            counter.increment(post.id)
+
+        self.assertEqual(counter.pending(post.id), 3)
+        self.assertEqual(post.reload().view_count, 0)
+
+        self.assertEqual(counter.flush(), 1)
+        self.assertEqual(counter.pending(post.id), 0)
+        self.assertEqual(post.reload().view_count, 3)
+
+    def test_flush_is_a_single_bulk_write(self):
+        posts = self.create_posts(5)
+        counter = ViewCounter(flush_interval=3600, max_pending=100)
+        for post in posts:
+            counter.increment(post.id, 2)
+
+        collection_class = type(BlogPost._get_collection())
+        with mock.patch.object(
+            collection_class,
+            "bulk_write",
+            autospec=True,
+            side_effect=collection_class.bulk_write,
+        ) as bulk_write:
+            counter.flush()
+
+        self.assertEqual(bulk_write.call_count, 1)
+        self.assertEqual([p.reload().view_count for p in posts], [2] * 5)
+
+    def test_flushes_when_buffer_is_full(self):
+        post = self.create_posts(1)[0]
+        counter = ViewCounter(flush_interval=3600, max_pending=4)
+
+        for _ in range(4):
+            counter.increment(post.id)
+
+        self.assertEqual(counter.pending(post.id), 0)
+        self.assertEqual(post.reload().view_count, 4)
+
+    def test_concurrent_increments_are_not_lost(self):
+        post = self.create_posts(1)[0]
+        counter = ViewCounter(flush_interval=3600, max_pending=50)
+
+        def worker():
+            for _ in range(200):
+                counter.increment(post.id)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        counter.flush()
+
+        self.assertEqual(post.reload().view_count, 1600)
+
+    def test_increment_does_not_save_document(self):
+        post = self.create_posts(1)[0]
+        updated_at = post.reload().updated_at
+
+        with mock.patch.object(BlogPost, "save") as save:
+            post.increment_view_count()
+
+        save.assert_not_called()
+        self.assertEqual(post.total_view_count, 1)
+        view_counter.flush()
+        post.reload()
+        self.assertEqual(post.view_count, 1)
+        self.assertEqual(post.updated_at, updated_at)
+
+
+# ============================================================================
+# Site Settings
+# ============================================================================
+
+
+class SiteSettingsCacheTests(MongoTestCase):
+    def test_settings_are_read_once_within_ttl(self):
+        SiteSettings(site_name="Cached Blog").save()
+        SiteSettings.clear_cache()
+
+        with count_queries() as queries:
+            for _ in range(5):
+                self.assertEqual(SiteSettings.get_settings().site_name, "Cached Blog")
+
+        self.assertEqual(len(queries), 1)
+
+    def test_save_refreshes_local_cache(self):
+        settings = SiteSettings.get_settings()
+        settings.site_name = "Renamed"
+        settings.save()
+
+        with count_queries() as queries:
+            self.assertEqual(SiteSettings.get_settings().site_name, "Renamed")
+
+        self.assertEqual(len(queries), 0)
+
+    def test_expired_cache_reloads_only_when_version_changes(self):
+        SiteSettings(site_name="Original").save()
+        SiteSettings.clear_cache()
+
+        with self.settings(SITE_SETTINGS_CACHE_TTL=0):
+            SiteSettings.get_settings()
+
+            with count_queries() as unchanged:
+                self.assertEqual(SiteSettings.get_settings().site_name, "Original")
+            self.assertEqual(len(unchanged), 1)
+
+            # Simulate a save from another worker
+            SiteSettings.objects.update(set__site_name="Elsewhere", inc__version=1)
+
+            with count_queries() as changed:
+                self.assertEqual(SiteSettings.get_settings().site_name, "Elsewhere")
+            self.assertEqual(len(changed), 2)
+
+    def test_concurrent_saves_get_their_own_versions(self):
+        SiteSettings(site_name="Original").save()
+        first, second = SiteSettings.objects.first(), SiteSettings.objects.first()
+
+        first.site_description = "First"
+        first.save()
+        second.site_name = "Second"
+        second.save()
+
+        self.assertEqual((first.version, second.version), (2, 3))
+        cached, version, _ = SiteSettings._cache
+        stored = SiteSettings.objects.first()
+        self.assertEqual(version, stored.version)
+        self.assertEqual(
+            (cached.site_name, cached.site_description), ("Second", "First")
+        )
+
+    def test_settings_without_a_version_are_not_reloaded(self):
+        SiteSettings._get_collection().insert_one({"site_name": "Legacy"})
+        SiteSettings.clear_cache()
+
+        with self.settings(SITE_SETTINGS_CACHE_TTL=0):
+            SiteSettings.get_settings()
+
+            with count_queries() as queries:
+                self.assertEqual(SiteSettings.get_settings().site_name, "Legacy")
+            self.assertEqual(len(queries), 1)
+
+    def test_context_processor_provides_site_settings(self):
+        SiteSettings(site_name="Processor Blog").save()
+
+        response = self.client.get(reverse("blog:home"))
+
+        self.assertContains(response, "Processor Blog")
+
+
+# ============================================================================
+# Page Cache
+# ============================================================================
+
+
+class PageCacheTests(MongoTestCase):
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response["X-Page-Cache"]
+
+    def test_repeat_visit_is_served_without_queries(self):
+        self.create_posts(3)
+        url = reverse("blog:post_list")
+
+        self.assertEqual(self.get(url), "miss")
+        with count_queries() as queries:
+            self.assertEqual(self.get(url), "hit")
+
+        self.assertEqual(len(queries), 0)
+
+    def test_pages_are_keyed_on_page_number(self):
+        self.create_posts(3)
+        url = reverse("blog:post_list")
+
+        self.assertEqual(self.get(url), "miss")
+        self.assertEqual(self.get(url + "?page=2"), "miss")
+        self.assertEqual(self.get(url + "?page=2"), "hit")
+
+    def test_post_save_invalidates_only_affected_listings(self):
+        posts = self.create_posts(3)
+        tag_url = reverse("blog:posts_by_tag", args=["tag-0"])
+        other_tag_url = reverse("blog:posts_by_tag", args=["tag-4"])
+        home_url = reverse("blog:home")
+        for url in (tag_url, other_tag_url, home_url):
+            self.get(url)
+
+        # Post 0 is tagged Tag 0..2, never Tag 4
+        posts[0].title = "Retitled"
+        posts[0].save()
+
+        self.assertEqual(self.get(tag_url), "miss")
+        self.assertEqual(self.get(home_url), "miss")
+        self.assertEqual(self.get(other_tag_url), "hit")
+
+    def test_deleting_a_post_invalidates_its_listings(self):
+        posts = self.create_posts(2)
+        url = reverse("blog:post_list")
+        tag_url = reverse("blog:posts_by_tag", args=["tag-0"])
+        self.get(tag_url)
+        etag = self.client.get(url)["ETag"]
+
+        posts[0].delete()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Page-Cache"], "miss")
+        self.assertNotContains(response, f"/post/{posts[0].slug}/")
+        self.assertEqual(self.get(tag_url), "miss")
+
+    def test_removed_tag_listing_is_invalidated(self):
+        posts = self.create_posts(1)
+        tag_url = reverse("blog:posts_by_tag", args=["tag-0"])
+        self.get(tag_url)
+
+        posts[0].tags = [Tag.objects.get(slug="tag-4")]
+        posts[0].save()
+
+        self.assertEqual(self.get(tag_url), "miss")
+
+    def test_tag_rename_invalidates_category_pages_showing_it(self):
+        self.create_posts(1)
+        category_url = reverse("blog:posts_by_category", args=["category-0"])
+        other_url = reverse("blog:posts_by_category", args=["category-1"])
+        self.get(category_url)
+        self.get(other_url)
+
+        tag = Tag.objects.get(slug="tag-0")
+        tag.name = "Renamed Tag"
+        tag.save()
+
+        self.assertEqual(self.get(category_url), "miss")
+        self.assertEqual(self.get(other_url), "hit")
+
+    @override_settings(ALLOWED_HOSTS=["one.example", "two.example"])
+    def test_pages_are_keyed_on_host(self):
+        self.create_posts(1)
+        url = reverse("blog:home")
+
+        self.client.get(url, HTTP_HOST="one.example")
+        response = self.client.get(url, HTTP_HOST="two.example")
+
+        self.assertEqual(response["X-Page-Cache"], "miss")
+        self.assertNotContains(response, "one.example")
+
+    def test_pages_expire_when_a_scheduled_post_goes_live(self):
+        posts = self.create_posts(1)
+        self.assertEqual(page_timeout(), page_cache.backend.default_timeout)
+        BlogPost(
+            title="Scheduled",
+            content="Content",
+            author=posts[0].author,
+            is_published=True,
+            published_at=datetime.utcnow() + timedelta(seconds=90),
+        ).save()
+
+        with mock.patch.object(page_cache, "set", wraps=page_cache.set) as store:
+            self.get(reverse("blog:home"))
+
+        self.assertTrue(0 < store.call_args.args[2] <= 90)
+
+    def test_visitors_with_a_session_bypass_the_cache(self):
+        self.create_posts(1)
+        url = reverse("blog:home")
+        self.get(url)
+
+        self.client.cookies["sessionid"] = "abc"
+        response = self.client.get(url)
+
+        self.assertNotIn("X-Page-Cache", response)
+
+    def test_file_backend(self):
+        self.create_posts(1)
+        url = reverse("blog:home")
+
+        with tempfile.TemporaryDirectory() as directory:
+            caches = {
+                "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+                "pages": {
+                    "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                    "LOCATION": directory,
+                },
+            }
+            with self.settings(CACHES=caches):
+                self.assertEqual(self.get(url), "miss")
+                self.assertEqual(self.get(url), "hit")
+                Tag(name="New Tag").save()
+                self.assertEqual(self.get(url), "hit")
+                Category.objects.first().save()
+                self.assertEqual(self.get(url), "miss")
+
+    def test_hit_ratio_counters(self):
+        self.create_posts(1)
+        url = reverse("blog:home")
+        for _ in range(4):
+            self.get(url)
+
+        stats = page_cache.stats()["home"]
+
+        self.assertEqual((stats["hits"], stats["misses"]), (3, 1))
+        self.assertEqual(stats["hit_ratio"], 0.75)
+
+
+# ============================================================================
+# Keyset Pagination
+# ============================================================================
+
+
+class CursorPaginationTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        posts = self.create_posts(7)
+        # Two posts share a timestamp to exercise the id tiebreaker
+        base = datetime(2024, 1, 1)
+        for i, post in enumerate(posts):
+            post.published_at = base + timedelta(hours=min(i, 5))
+            post.save()
+        self.expected = [
+            p.id
+            for p in sorted(posts, key=lambda p: (p.published_at, p.id), reverse=True)
+        ]
+
+    def walk_forward(self, limit):
+        ids, cursor = [], None
+        while True:
+            page = paginate_by_cursor(BlogPost.get_published(), cursor, limit)
+            ids += [post.id for post in page.items]
+            if not page.has_next:
+                return ids, page
+            cursor = page.next_cursor
+
+    def test_forward_walk_visits_every_post_once_in_order(self):
+        ids, _ = self.walk_forward(limit=2)
+
+        self.assertEqual(ids, self.expected)
+
+    def test_previous_cursor_returns_preceding_page(self):
+        first = paginate_by_cursor(BlogPost.get_published(), None, 3)
+        second = paginate_by_cursor(BlogPost.get_published(), first.next_cursor, 3)
+        back = paginate_by_cursor(BlogPost.get_published(), second.previous_cursor, 3)
+
+        self.assertFalse(first.has_previous)
+        self.assertTrue(second.has_previous)
+        self.assertEqual([p.id for p in back.items], [p.id for p in first.items])
+        self.assertFalse(back.has_previous)
+        self.assertTrue(back.has_next)
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(InvalidCursor):
+            decode_cursor("not-a-cursor")
+
+    def test_api_cursor_mode(self):
+        url = reverse("blog:api_posts")
+        response = self.client.get(url, {"pagination": "cursor", "limit": 4})
+        data = response.json()
+
+        self.assertEqual(data["pagination"]["mode"], "cursor")
+        self.assertNotIn("total", data["pagination"])
+        self.assertIsNone(data["pagination"]["prev"])
+
+        response = self.client.get(
+            url, {"cursor": data["pagination"]["next"], "limit": 4, "include_total": 1}
+        )
+        data_next = response.json()
+
+        ids = [p["id"] for p in data["posts"] + data_next["posts"]]
+        self.assertEqual(ids, [str(i) for i in self.expected])
+        self.assertFalse(data_next["pagination"]["has_next"])
+        self.assertEqual(data_next["pagination"]["total"], 7)
+
+    def test_api_limit_is_at_least_one(self):
+        url = reverse("blog:api_posts")
+        for view in (views.api_posts, async_to_sync(async_views.api_posts)):
+            for limit in (0, -3):
+                with self.subTest(view=view, limit=limit):
+                    request = RequestFactory().get(
+                        url, {"pagination": "cursor", "limit": limit}
+                    )
+                    data = json.loads(view(request).content)
+                    self.assertEqual(data["pagination"]["limit"], 1)
+                    self.assertEqual(len(data["posts"]), 1)
+                    self.assertIsNotNone(data["pagination"]["next"])
+
+    def test_api_rejects_invalid_cursor(self):
+        response = self.client.get(reverse("blog:api_posts"), {"cursor": "bogus"})
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_api_offset_mode_reuses_cached_count(self):
+        url = reverse("blog:api_posts")
+        self.client.get(url)
+
+        with count_queries() as queries:
+            data = self.client.get(url, {"page": 2, "limit": 5}).json()
+
+        self.assertEqual(data["pagination"]["total"], 7)
+        self.assertNotIn(("blog_posts", "count_documents"), queries.calls)
+
+    def test_api_offset_mode_breaks_timestamp_ties_by_id(self):
+        url = reverse("blog:api_posts")
+        ids = []
+        for page in (1, 2, 3, 4):
+            data = self.client.get(url, {"page": page, "limit": 2}).json()
+            ids += [post["id"] for post in data["posts"]]
+
+        self.assertEqual(ids, [str(i) for i in self.expected])
+
+    def test_post_list_links_use_cursor(self):
+        cursor = paginate_by_cursor(BlogPost.get_published(), None, 1).next_cursor
+        response = self.client.get(reverse("blog:post_list"), {"cursor": cursor})
+
+        self.assertContains(response, "?cursor=")
+        self.assertNotContains(response, "?page=")
+
+
+# ============================================================================
+# Search
+# ============================================================================
+
+
+class SearchTests(MongoTestCase):
+    # mongomock does not implement $text, so the ranked id lookup is stubbed
+    def test_ranked_query_uses_text_index_with_bounds(self):
+        with self.settings(SEARCH_MAX_TIME_MS=500):
+            queryset = search.ranked_queryset("mongodb", 25)
+
+        self.assertEqual(queryset._query["$text"], {"$search": "mongodb"})
+        self.assertEqual(queryset._ordering, [("_text_score", {"$meta": "textScore"})])
+        self.assertEqual(queryset._limit, 25)
+        self.assertEqual(queryset._max_time_ms, 500)
+        self.assertEqual(queryset._cursor_args["projection"]["_id"], 1)
+        self.assertNotIn("content", queryset._cursor_args["projection"])
+
+    def test_text_index_is_declared(self):
+        text_indexes = [
+            spec
+            for spec in BlogPost._meta["index_specs"]
+            if any(direction == "text" for _, direction in spec["fields"])
+        ]
+
+        self.assertEqual(len(text_indexes), 1)
+        self.assertEqual(text_indexes[0]["weights"]["title"], 10)
+
+    def test_results_keep_rank_order_and_paginate(self):
+        posts = self.create_posts(5)
+        ranked = [posts[3].id, posts[0].id, posts[4].id, posts[1].id]
+
+        with mock.patch.object(search, "ranked_post_ids", return_value=ranked):
+            first = search.search_posts("post", page=1, per_page=3)
+            second = search.search_posts("post", page=2, per_page=3)
+
+        self.assertEqual([p.id for p in first.posts], ranked[:3])
+        self.assertEqual([p.id for p in second.posts], ranked[3:])
+        self.assertEqual(first.total, 4)
+        self.assertTrue(first.has_next)
+        self.assertFalse(second.has_next)
+        self.assertTrue(second.has_previous)
+
+    def test_results_are_capped(self):
+        posts = self.create_posts(4)
+        ranked = [post.id for post in posts]
+
+        with self.settings(SEARCH_MAX_RESULTS=3):
+            with mock.patch.object(search, "ranked_post_ids", return_value=ranked):
+                results = search.search_posts("post")
+
+        self.assertEqual(results.total, 3)
+        self.assertTrue(results.capped)
+
+    def test_search_view_renders_ranked_page(self):
+        posts = self.create_posts(12)
+        ranked = [post.id for post in reversed(posts)]
+
+        with mock.patch.object(search, "ranked_post_ids", return_value=ranked):
+            with count_queries() as queries:
+                response = self.client.get(reverse("blog:search"), {"q": "post"})
+
+        self.assertContains(response, "Post 11")
+        self.assertNotContains(response, "/post/post-1/")
+        self.assertContains(response, "page=2")
+        self.assertEqual(queries.by_collection["blog_posts"], 1)
+
+
+# ============================================================================
+# Post Summaries
+# ============================================================================
+
+
+class PostSummaryTests(MongoTestCase):
+    def test_summaries_skip_content_comments_and_metadata(self):
+        post = self.create_posts(1)[0]
+        post.metadata = {"reading_time": 5}
+        post.save()
+
+        summary = BlogPost.objects.summaries().first()
+
+        self.assertEqual(summary.title, post.title)
+        self.assertIsNone(summary.content)
+        self.assertEqual(summary.comments, [])
+        self.assertEqual(summary.metadata, {})
+
+    def test_comment_count_is_stored(self):
+        post = self.create_posts(1)[0]
+        post.comments = [
+            Comment(author_name="A", author_email="a@example.com", content="x"),
+            Comment(
+                author_name="B",
+                author_email="b@example.com",
+                content="y",
+                is_approved=True,
+            ),
+        ]
+        post.save()
+
+        summary = BlogPost.objects.summaries().get(id=post.id)
+        self.assertEqual(summary.comment_count, 1)
+
+        post.comments[0].is_approved = True
+        post.save()
+        self.assertEqual(BlogPost.objects.summaries().get(id=post.id).comment_count, 2)
+
+    def test_summaries_cannot_be_saved_over_full_posts(self):
+        post = self.create_posts(1)[0]
+
+        summary = BlogPost.objects.summaries().get(id=post.id)
+        summary.title = "Retitled"
+        with self.assertRaises(mongoengine.ValidationError):
+            summary.save()
+
+        self.assertEqual(post.reload().content, "Content for post 0")
+
+    def test_listings_never_load_content(self):
+        self.create_posts(3)
+        urls = [
+            reverse("blog:home"),
+            reverse("blog:post_list"),
+            reverse("blog:posts_by_tag", args=["tag-1"]),
+            reverse("blog:api_posts"),
+        ]
+
+        with count_queries() as queries:
+            for url in urls:
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+        post_projections = [
+            p for name, p in queries.projections if name == "blog_posts"
+        ]
+        self.assertTrue(post_projections)
+        for projection in post_projections:
+            self.assertIsNotNone(projection)
+            self.assertNotIn("content", projection)
+            self.assertNotIn("comments", projection)
+
+
+# ============================================================================
+# Comments
+# ============================================================================
+
+
+class CommentTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.post = self.create_posts(1)[0]
+
+    def add(self, name="Reader"):
+        return self.post.add_comment(name, "reader@example.com", "Nice post")
+
+    def test_add_comment_pushes_without_saving(self):
+        with mock.patch.object(BlogPost, "save") as save:
+            comment = self.add()
+
+        save.assert_not_called()
+        self.post.reload()
+        self.assertEqual(len(self.post.comments), 1)
+        self.assertEqual(self.post.comments[0].comment_id, comment.comment_id)
+        self.assertEqual(self.post.approved_comment_count, 0)
+
+    def test_add_comment_validates(self):
+        with self.assertRaises(mongoengine.ValidationError):
+            self.post.add_comment("Reader", "not-an-email", "Nice post")
+
+    def test_concurrent_comments_are_all_kept(self):
+        def worker(n):
+            for i in range(10):
+                self.add(f"Reader {n}-{i}")
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(self.post.reload().comments), 50)
+
+    def test_approval_targets_one_comment_and_counts_once(self):
+        self.add("First")
+        second = self.add("Second")
+
+        self.assertTrue(self.post.approve_comment(second.comment_id))
+        self.assertFalse(self.post.approve_comment(second.comment_id))
+
+        self.post.reload()
+        self.assertEqual([c.is_approved for c in self.post.comments], [False, True])
+        self.assertEqual(self.post.approved_comment_count, 1)
+
+        self.assertTrue(self.post.unapprove_comment(second.comment_id))
+        self.assertEqual(self.post.reload().approved_comment_count, 0)
+
+    def test_approval_invalidates_listing_pages(self):
+        url = reverse("blog:posts_by_tag", args=["tag-0"])
+        comment = self.add()
+        self.client.get(url)
+
+        self.post.approve_comment(comment.comment_id)
+
+        self.assertEqual(self.client.get(url)["X-Page-Cache"], "miss")
+
+    def test_repair_comments_backfills_ids_and_counts(self):
+        BlogPost._get_collection().update_one(
+            {"_id": self.post.id},
+            {
+                "$push": {
+                    "comments": {
+                        "author_name": "A",
+                        "author_email": "a@example.com",
+                        "content": "x",
+                        "is_approved": True,
+                    }
+                }
+            },
+        )
+
+        self.assertEqual(BlogPost.repair_comments(), 2)
+        self.post.reload()
+        self.assertIsNotNone(self.post.comments[0].comment_id)
+        self.assertEqual(self.post.approved_comment_count, 1)
+        self.assertEqual(BlogPost.repair_comments(), 0)
+
+    def test_add_comment_view(self):
+        response = self.client.post(
+            reverse("blog:add_comment", args=[self.post.slug]),
+            data=json.dumps(
+                {
+                    "author_name": "Reader",
+                    "author_email": "reader@example.com",
+                    "content": "Nice post",
+                }
+            ),
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.json()["status"], "success")
+        self.assertEqual(len(self.post.reload().comments), 1)
+
+
+# ============================================================================
+# Dashboard statistics
+# ============================================================================
+
+
+class DashboardStatsTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.posts = self.create_posts(6)
+        for i, post in enumerate(self.posts):
+            BlogPost.objects(id=post.id).update_one(set__view_count=i * 10)
+        BlogPost(
+            title="Draft",
+            content="Unpublished",
+            author=self.posts[0].author,
+        ).save()
+        Newsletter(email="a@example.com").save()
+        Newsletter(email="b@example.com", is_active=False).save()
+
+    def test_totals_match_documents(self):
+        result = stats.collect_stats()
+
+        self.assertEqual(result["total_posts"], 7)
+        self.assertEqual(result["published_posts"], 6)
+        self.assertEqual(result["total_views"], 150)
+        self.assertEqual(result["total_authors"], 1)
+        self.assertEqual(result["total_tags"], 5)
+        self.assertEqual(result["total_categories"], 3)
+        self.assertEqual(result["newsletter_subscribers"], 1)
+        self.assertEqual(result["newsletter_total"], 2)
+
+    def test_breakdowns(self):
+        result = stats.collect_stats()
+
+        self.assertEqual(result["by_author"][0]["label"], "writer")
+        self.assertEqual(result["by_author"][0]["posts"], 7)
+
+        by_tag = {row["slug"]: row["posts"] for row in result["by_tag"]}
+        self.assertEqual(by_tag["tag-0"], 3)
+        self.assertEqual(by_tag["tag-2"], 6)
+
+        by_category = {row["label"]: row["views"] for row in result["by_category"]}
+        self.assertEqual(by_category["Category 0"], 0 + 30)
+        self.assertEqual(by_category["Category 2"], 20 + 50)
+
+        self.assertEqual(result["popular_post_ids"][0], self.posts[5].id)
+
+    def test_one_aggregation_per_collection_and_cached(self):
+        with count_queries() as queries:
+            stats.get_dashboard_stats()
+            stats.get_dashboard_stats()
+
+        # mongomock runs aggregations through find(), so only count these
+        aggregates = [call for call in queries.calls if call[1] == "aggregate"]
+        self.assertEqual(
+            aggregates,
+            [("blog_posts", "aggregate"), ("newsletter_subscribers", "aggregate")],
+        )
+
+    def test_facets_read_projected_posts(self):
+        collection = mock.MagicMock()
+        collection.aggregate.return_value = []
+        with mock.patch.object(stats, "read_collection", return_value=collection):
+            stats.post_stats()
+
+        first_stage = collection.aggregate.call_args.args[0][0]
+        self.assertIn("$project", first_stage)
+        self.assertNotIn("content", first_stage["$project"])
+        self.assertNotIn("comments", first_stage["$project"])
+
+    def test_dashboard_view_does_not_scan_posts(self):
+        with count_queries() as queries:
+            response = self.client.get(reverse("blog:dashboard"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Top Tags")
+        # Only the recent and popular posts are loaded as documents, and
+        # only as summaries
+        loads = [
+            projection
+            for name, projection in queries.projections
+            if name == "blog_posts" and projection
+        ]
+        self.assertEqual(len(loads), 2)
+        for projection in loads:
+            self.assertNotIn("content", projection)
+
+
+# ============================================================================
+# Related posts
+# ============================================================================
+
+
+class RelatedPostsTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        user = User.create_user("writer", "writer@example.com", "secret123")
+        self.author = Author.create_from_user(user)
+        other = User.create_user("other", "other@example.com", "secret123")
+        self.other = Author.create_from_user(other)
+        self.tags = [Tag(name=f"Tag {i}").save() for i in range(4)]
+        self.category = Category(name="Python").save()
+
+    def post(self, title, tags=(), category=None, author=None, **kwargs):
+        return BlogPost(
+            title=title,
+            content="Body",
+            author=author or self.other,
+            tags=list(tags),
+            category=category,
+            is_published=True,
+            **kwargs,
+        ).save()
+
+    def test_scores_weighted_overlap(self):
+        t = self.tags
+        base = self.post("Base", [t[0], t[1], t[2]], self.category, self.author)
+        two_tags = self.post("Two tags", [t[0], t[1]])
+        one_tag_category = self.post("Tag and category", [t[2]], self.category)
+        author_only = self.post("Same author", author=self.author)
+        self.post("Unrelated", [t[3]])
+
+        base.reload()
+        self.assertEqual(
+            base.related_post_ids,
+            [two_tags.id, one_tag_category.id, author_only.id],
+        )
+
+    def test_saving_a_post_refreshes_its_neighbours(self):
+        first = self.post("First", [self.tags[0]], author=self.author)
+        second = self.post("Second", [self.tags[0]])
+        self.assertEqual(first.reload().related_post_ids, [second.id])
+
+        second.tags = [self.tags[3]]
+        second.save()
+        self.assertEqual(first.reload().related_post_ids, [])
+
+        second.tags = [self.tags[0]]
+        second.save()
+        self.assertEqual(first.reload().related_post_ids, [second.id])
+
+    def test_unpublished_posts_are_dropped(self):
+        first = self.post("First", [self.tags[0]])
+        second = self.post("Second", [self.tags[0]])
+
+        second.is_published = False
+        second.save()
+
+        self.assertEqual(first.reload().related_post_ids, [])
+
+    def test_unrelated_edits_skip_the_refresh(self):
+        post = self.post("First", [self.tags[0]])
+        with mock.patch("blog.related.refresh_neighbours") as refresh:
+            post.title = "Renamed"
+            post.save()
+        refresh.assert_not_called()
+
+    def test_rebuild_fills_legacy_posts(self):
+        first = self.post("First", [self.tags[0]])
+        second = self.post("Second", [self.tags[0]])
+        BlogPost.objects.update(
+            set__related_post_ids=[], unset__related_computed_at=True
+        )
+
+        self.assertEqual(first.reload().get_related_posts()[0].id, second.id)
+        self.assertEqual(BlogPost.rebuild_related(batch_size=1), 2)
+        self.assertEqual(first.reload().related_post_ids, [second.id])
+
+    def test_computed_empty_lists_are_not_rescored(self):
+        lonely = self.post("Lonely", [self.tags[3]])
+
+        lonely.reload()
+        self.assertEqual(lonely.related_post_ids, [])
+        self.assertIsNotNone(lonely.related_computed_at)
+        with mock.patch("blog.related.compute_related_ids") as compute:
+            self.assertEqual(lonely.get_related_posts(), [])
+        compute.assert_not_called()
+
+    def test_post_detail_loads_related_with_one_query(self):
+        t = self.tags
+        post = self.post("Base", [t[0]], self.category)
+        for i in range(4):
+            self.post(f"Related {i}", [t[0]])
+
+        with count_queries() as queries:
+            response = self.client.get(reverse("blog:post_detail", args=[post.slug]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["related_posts"]), 3)
+        # The updated_at lookup of the conditional check, the post, related
+        self.assertEqual(queries.by_collection["blog_posts"], 3)
+        self.assertNotIn("aggregate", [method for _, method in queries.calls])
+
+
+# ============================================================================
+# Async views
+# ============================================================================
+
+
+class FakeMotorCursor:
+    """Motor-like cursor over mongomock recording the options it was given"""
+
+    def __init__(self, collection, query, **kwargs):
+        self.kwargs = kwargs
+        self.options = {}
+        self.cursor = collection.find(query, kwargs.get("projection"))
+
+    def __getattr__(self, option):
+        def apply(value):
+            if option in ("sort", "skip", "limit"):
+                getattr(self.cursor, option)(value)
+            self.options[option] = value
+            return self
+
+        return apply
+
+    async def to_list(self, length=None):
+        return list(self.cursor)
+
+
+class FakeMotorCollection:
+    def __init__(self, collection):
+        self.collection = collection
+        self.cursor = None
+
+    def find(self, query, **kwargs):
+        self.cursor = FakeMotorCursor(self.collection, query, **kwargs)
+        return self.cursor
+
+
+class AsyncViewTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.posts = self.create_posts(12)
+        self.factory = RequestFactory()
+
+    def call(self, view, path, **kwargs):
+        return async_to_sync(view)(self.factory.get(path), **kwargs)
+
+    def test_gather_runs_queries_concurrently(self):
+        # Both calls must be in flight at once for the barrier to open
+        barrier = threading.Barrier(2, timeout=5)
+
+        async def both():
+            return await aio.gather(a=aio.run(barrier.wait), b=aio.run(barrier.wait))
+
+        self.assertEqual(sorted(async_to_sync(both)().values()), [0, 1])
+
+    def test_thread_driver_under_mongomock(self):
+        self.assertFalse(aio.uses_motor())
+
+    def test_motor_client_gets_the_connection_options(self):
+        listener = object()
+        options = aio.client_options(
+            {
+                "db": "blog",
+                "host": "mongo",
+                "port": 27017,
+                "username": "app",
+                "password": "secret",
+                "authentication_source": "admin",
+                "connect": False,
+                "maxPoolSize": 20,
+                "waitQueueTimeoutMS": 2000,
+                "event_listeners": [listener],
+            }
+        )
+
+        self.assertEqual(
+            options,
+            {
+                "maxPoolSize": 20,
+                "waitQueueTimeoutMS": 2000,
+                "event_listeners": [listener],
+                "username": "app",
+                "password": "secret",
+                "authSource": "admin",
+            },
+        )
+
+    def test_motor_path_sends_the_queryset_options(self):
+        collection = FakeMotorCollection(BlogPost._get_collection())
+        queryset = (
+            BlogPost.get_published()
+            .summaries()
+            .order_by("-published_at")
+            .hint([("is_published", 1), ("published_at", -1), ("_id", -1)])
+            .max_time_ms(500)
+            .limit(3)
+        )
+
+        with mock.patch.object(aio, "uses_motor", return_value=True), mock.patch.object(
+            aio, "get_motor_db", return_value={"blog_posts": collection}
+        ):
+            posts = async_to_sync(aio.fetch)(queryset)
+
+        self.assertEqual([p.id for p in posts], [p.id for p in self.posts[::-1][:3]])
+        cursor = collection.cursor
+        self.assertIn("title", cursor.kwargs["projection"])
+        self.assertNotIn("content", cursor.kwargs["projection"])
+        self.assertEqual(cursor.options["max_time_ms"], 500)
+        self.assertEqual(cursor.options["hint"][0], ("is_published", 1))
+
+    def test_api_posts_matches_sync_view(self):
+        for query in ("?page=2&limit=5", "?pagination=cursor&limit=5&include_total=1"):
+            path = reverse("blog:api_posts") + query
+            expected = json.loads(views.api_posts(self.factory.get(path)).content)
+            response = self.call(async_views.api_posts, path)
+            self.assertEqual(json.loads(response.content), expected)
+
+    def test_api_posts_rejects_bad_cursor(self):
+        response = self.call(async_views.api_posts, "/api/posts/?cursor=%%%")
+        self.assertEqual(response.status_code, 400)
+
+    def test_pages_render(self):
+        oldest, newest = self.posts[0], self.posts[-1]
+        pages = [
+            (async_views.home, "/", {}, newest),
+            (async_views.post_list, "/posts/", {}, newest),
+            (async_views.post_list, "/posts/?page=2", {}, oldest),
+            (async_views.post_detail, "/post/x/", {"slug": oldest.slug}, oldest),
+            (async_views.posts_by_author, "/author/x/", {"username": "writer"}, oldest),
+            (async_views.posts_by_tag, "/tag/x/", {"slug": "tag-1"}, oldest),
+            (async_views.posts_by_category, "/c/", {"slug": "category-0"}, oldest),
+        ]
+        for view, path, kwargs, post in pages:
+            with self.subTest(view=view.__name__, path=path):
+                response = self.call(view, path, **kwargs)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn(post.title.encode(), response.content)
+                link = reverse("blog:post_detail", args=[post.slug])
+                if view is not async_views.post_detail:
+                    self.assertIn(link.encode(), response.content)
+
+    def test_post_detail_missing(self):
+        with self.assertRaises(Http404):
+            self.call(async_views.post_detail, "/post/x/", slug="missing")
+
+    def test_page_cache_wraps_async_views(self):
+        first = self.call(async_views.post_list, "/posts/")
+        second = self.call(async_views.post_list, "/posts/")
+
+        self.assertEqual(first["X-Page-Cache"], "miss")
+        self.assertEqual(second["X-Page-Cache"], "hit")
+        self.assertEqual(first.content, second.content)
+
+
+# ============================================================================
+# Connection pool
+# ============================================================================
+
+
+class PoolMetricsTests(SimpleTestCase):
+    address = ("db.example.com", 27017)
+
+    def test_counts_checkouts_and_waits(self):
+        from pymongo import monitoring
+
+        metrics = PoolMetrics()
+        metrics.pool_created(monitoring.PoolCreatedEvent(self.address, {}))
+        for connection_id in (1, 2):
+            metrics.connection_created(
+                monitoring.ConnectionCreatedEvent(self.address, connection_id)
+            )
+            metrics.connection_check_out_started(
+                monitoring.ConnectionCheckOutStartedEvent(self.address)
+            )
+            metrics.connection_checked_out(
+                monitoring.ConnectionCheckedOutEvent(self.address, connection_id)
+            )
+        metrics.connection_checked_in(
+            monitoring.ConnectionCheckedInEvent(self.address, 1)
+        )
+        metrics.connection_check_out_started(
+            monitoring.ConnectionCheckOutStartedEvent(self.address)
+        )
+        metrics.connection_check_out_failed(
+            monitoring.ConnectionCheckOutFailedEvent(self.address, "timeout")
+        )
+
+        pool = metrics.snapshot()["db.example.com:27017"]
+        self.assertEqual(pool["open"], 2)
+        self.assertEqual(pool["in_use"], 1)
+        self.assertEqual(pool["max_in_use"], 2)
+        self.assertEqual(pool["checkouts"], 2)
+        self.assertEqual(pool["checkout_failures"], 1)
+        self.assertGreaterEqual(pool["wait_ms_max"], pool["wait_ms_avg"])
+
+        metrics.reset()
+        pool = metrics.snapshot()["db.example.com:27017"]
+        self.assertEqual((pool["checkouts"], pool["max_in_use"]), (0, 1))
+
+    def test_settings_size_the_pool(self):
+        from django.conf import settings
+
+        options = settings.MONGODB_SETTINGS
+        self.assertGreater(options["maxPoolSize"], options["minPoolSize"])
+        self.assertIn("waitQueueTimeoutMS", options)
+        self.assertIn("serverSelectionTimeoutMS", options)
+        self.assertTrue(
+            any(
+                isinstance(listener, PoolMetrics)
+                for listener in options["event_listeners"]
+            )
+        )
+
+
+class WarmUpTests(MongoTestCase):
+    def test_warm_up_pings_the_server(self):
+        self.assertGreaterEqual(warm_up(), 0)
+
+
+# ============================================================================
+# Read replica routing
+# ============================================================================
+
+
+@override_settings(MONGO_READ_ALIAS="reads")
+class ReadReplicaTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        # A different port keeps mongoengine from reusing the primary client
+        mongoengine.connect(
+            "blog_test",
+            alias="reads",
+            port=27018,
+            mongo_client_class=mongomock.MongoClient,
+        )
+        self.posts = self.create_posts(3)
+        # The replica has caught up with everything but the newest post
+        primary_db, replica_db = mongoengine.get_db(), mongoengine.get_db("reads")
+        for name in primary_db.list_collection_names():
+            documents = list(primary_db[name].find())
+            if name == "blog_posts":
+                documents = documents[:-1]
+            replica_db[name].insert_many(documents)
+
+    def tearDown(self):
+        mongoengine.disconnect("reads")
+        super().tearDown()
+
+    def test_reads_follow_the_context(self):
+        self.assertEqual(BlogPost.objects.count(), 3)
+        with reading_from("reads"):
+            self.assertEqual(BlogPost.objects.count(), 2)
+            self.assertEqual(len(prefetch_references(BlogPost.objects.all())), 2)
+        self.assertEqual(BlogPost.objects.count(), 3)
+
+    def test_writes_stay_on_the_primary(self):
+        with reading_from("reads"):
+            BlogPost.objects(id=self.posts[0].id).update(set__like_count=5)
+            Tag(name="Fresh").save()
+
+        self.assertEqual(BlogPost.objects.get(id=self.posts[0].id).like_count, 5)
+        self.assertEqual(Tag.objects(name="Fresh").count(), 1)
+        with reading_from("reads"):
+            self.assertEqual(Tag.objects(name="Fresh").count(), 0)
+
+    def test_site_settings_read_the_primary(self):
+        SiteSettings.get_settings()
+        SiteSettings.clear_cache()
+        mongoengine.get_db("reads").site_settings.delete_many({})
+
+        with reading_from("reads"):
+            SiteSettings.get_settings()
+
+        self.assertEqual(SiteSettings.objects.count(), 1)
+
+    def test_decorated_views_read_the_replica(self):
+        response = self.client.get(reverse("blog:api_posts"))
+        self.assertEqual(response.json()["pagination"]["total"], 2)
+
+        view = read_replica(lambda request: stats.collect_stats())
+        self.assertEqual(view(None)["total_posts"], 2)
+        self.assertEqual(stats.collect_stats()["total_posts"], 3)
+
+    def test_write_views_use_the_primary(self):
+        newest = self.posts[-1]
+        response = self.client.post(
+            reverse("blog:add_comment", args=[newest.slug]),
+            data=json.dumps(
+                {
+                    "author_name": "Reader",
+                    "author_email": "reader@example.com",
+                    "content": "Nice post",
+                }
+            ),
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.json()["status"], "success")
+        self.assertEqual(len(newest.reload().comments), 1)
+
+
+class QueryProfilerTests(SimpleTestCase):
+    def run_command(self, listener, request_id, command, reply, connection=("db", 1)):
+        from pymongo import monitoring
+
+        listener.started(
+            monitoring.CommandStartedEvent(command, "blog", request_id, connection, 1)
+        )
+        name = next(iter(command))
+        listener.succeeded(
+            monitoring.CommandSucceededEvent(
+                timedelta(microseconds=1500), reply, name, request_id, connection, 1
+            )
+        )
+
+    def find_by_id(self, listener, request_id, collection="authors"):
+        self.run_command(
+            listener,
+            request_id,
+            {"find": collection, "filter": {"_id": request_id}},
+            {"cursor": {"firstBatch": [{"_id": request_id}]}},
+        )
+
+    def test_filter_shape_hides_values(self):
+        self.assertEqual(
+            filter_shape({"tags": {"$in": [1, 2]}, "$or": [{"a": 1}, {"b": "x"}]}),
+            {"tags": {"$in": "?"}, "$or": [{"a": "?"}, {"b": "?"}]},
+        )
+
+    def test_records_commands_only_while_profiling(self):
+        listener = CommandProfiler()
+        self.find_by_id(listener, 1)
+        with profiling() as profile:
+            self.run_command(
+                listener,
+                2,
+                {"find": "blog_posts", "filter": {"is_published": True}},
+                {"cursor": {"firstBatch": [{}, {}]}},
+            )
+            self.run_command(listener, 3, {"ping": 1}, {"ok": 1})
+
+        self.assertEqual(
+            profile.commands,
+            [
+                {
+                    "command": "find",
+                    "collection": "blog_posts",
+                    "filter": {"is_published": "?"},
+                    "duration_ms": 1.5,
+                    "documents": 2,
+                    "failed": False,
+                }
+            ],
+        )
+
+    def test_flags_repeated_id_lookups(self):
+        listener = CommandProfiler()
+        with profiling() as profile:
+            for request_id in range(4):
+                self.find_by_id(listener, request_id)
+            for request_id in range(4, 6):
+                self.find_by_id(listener, request_id, "tags")
+
+        summary = profile.summary(threshold=3)
+        self.assertEqual(summary["commands"], 6)
+        self.assertEqual(summary["by_collection"], {"authors": 4, "tags": 2})
+        self.assertEqual(summary["n_plus_one"], {"authors": 4})
+
+    def view(self, request):
+        listener = CommandProfiler()
+        for request_id in range(3):
+            self.find_by_id(listener, request_id)
+        return HttpResponse("ok")
+
+    @override_settings(DEBUG=True)
+    def test_middleware_sets_headers_in_debug(self):
+        response = QueryProfilerMiddleware(self.view)(RequestFactory().get("/"))
+
+        self.assertEqual(response["X-Mongo-Commands"], "3")
+        self.assertEqual(response["X-Mongo-Time-Ms"], "4.500")
+        self.assertEqual(response["X-Mongo-N-Plus-One"], "authors=3")
+
+    @override_settings(DEBUG=False)
+    def test_middleware_logs_in_production(self):
+        with self.assertLogs("blog.middleware", "WARNING") as logs:
+            response = QueryProfilerMiddleware(self.view)(RequestFactory().get("/"))
+
+        self.assertNotIn("X-Mongo-Commands", response)
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual((line["path"], line["status"]), ("/", 200))
+        self.assertEqual(line["n_plus_one"], {"authors": 3})
+
+    @override_settings(DEBUG=True)
+    def test_async_middleware_profiles_threaded_queries(self):
+        from asgiref.sync import sync_to_async
+
+        async def view(request):
+            await sync_to_async(self.view, thread_sensitive=False)(request)
+            return HttpResponse("ok")
+
+        middleware = QueryProfilerMiddleware(view)
+        response = async_to_sync(middleware)(RequestFactory().get("/"))
+
+        self.assertEqual(response["X-Mongo-Commands"], "3")
+
+    @override_settings(DEBUG=True)
+    def test_streamed_bodies_are_profiled_until_sent(self):
+        listener = CommandProfiler()
+
+        def chunks():
+            for request_id in range(3):
+                self.find_by_id(listener, request_id)
+                yield b"chunk"
+
+        middleware = QueryProfilerMiddleware(
+            lambda request: StreamingHttpResponse(chunks())
+        )
+        response = middleware(RequestFactory().get("/sitemap.xml"))
+
+        with self.assertLogs("blog.middleware", "WARNING") as logs:
+            self.assertEqual(b"".join(response.streaming_content), b"chunk" * 3)
+            response.close()
+
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual((line["commands"], line["path"]), (3, "/sitemap.xml"))
+        self.assertNotIn("X-Mongo-Commands", response)
+
+
+class ConditionalRequestTests(MongoTestCase):
+    def test_post_detail_revalidates_without_loading_the_post(self):
+        post = self.create_posts(1)[0]
+        url = reverse("blog:post_detail", args=[post.slug])
+        etag = self.client.get(url)["ETag"]
+
+        with count_queries() as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        self.assertEqual(queries.by_collection, {"blog_posts": 1, "change_versions": 1})
+        self.assertEqual(queries.projections[0][1]["updated_at"], 1)
+        self.assertEqual(view_counter.pending(post.id), 2)
+
+    def test_saving_a_post_changes_its_etag(self):
+        post = self.create_posts(1)[0]
+        url = reverse("blog:api_post_detail", args=[post.slug])
+        etag = self.client.get(url)["ETag"]
+
+        post.title = "Edited"
+        post.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_renaming_a_tag_changes_the_post_etag(self):
+        post = self.create_posts(1)[0]
+        url = reverse("blog:post_detail", args=[post.slug])
+        etag = self.client.get(url)["ETag"]
+
+        tag = post.tags[0]
+        tag.name = "Renamed"
+        tag.save()
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_scheduled_posts_are_not_validated(self):
+        post = self.create_posts(1)[0]
+        BlogPost.objects(id=post.id).update(
+            set__published_at=datetime.utcnow() + timedelta(hours=1)
+        )
+        request = RequestFactory().get("/", HTTP_IF_NONE_MATCH="*")
+
+        with self.assertRaises(Http404):
+            views.post_detail(request, slug=post.slug)
+        self.assertEqual(view_counter.pending(post.id), 0)
+
+    def test_scheduled_post_going_live_changes_listing_etag(self):
+        post = self.create_posts(2)[1]
+        BlogPost.objects(id=post.id).update(
+            set__published_at=datetime.utcnow() + timedelta(hours=1)
+        )
+        url = reverse("blog:api_posts")
+        etag = self.client.get(url)["ETag"]
+
+        # Time passes: the post goes live without being saved
+        BlogPost.objects(id=post.id).update(set__published_at=datetime.utcnow())
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_if_modified_since(self):
+        post = self.create_posts(1)[0]
+        url = reverse("blog:api_post_detail", args=[post.slug])
+        last_modified = self.client.get(url)["Last-Modified"]
+
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_listing_etag_follows_change_versions(self):
+        self.create_posts(2)
+        url = reverse("blog:api_posts")
+        etag = self.client.get(url)["ETag"]
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertNotEqual(self.client.get(url + "?page=2")["ETag"], etag)
+
+        Tag(name="Fresh").save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_cached_page_revalidates_without_queries(self):
+        self.create_posts(2)
+        url = reverse("blog:post_list")
+        etag = self.client.get(url)["ETag"]
+
+        with count_queries() as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(queries), 0)
+
+    def test_session_requests_are_not_conditional(self):
+        post = self.create_posts(1)[0]
+        self.client.cookies["sessionid"] = "abc"
+
+        response = self.client.get(reverse("blog:post_detail", args=[post.slug]))
+
+        self.assertNotIn("ETag", response)
+
+
+class ExportTests(MongoTestCase):
+    def export(self, **params):
+        response = self.client.get(reverse("blog:api_posts_export"), params)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        content = b"".join(response.streaming_content).decode()
+        return [json.loads(line) for line in content.splitlines()]
+
+    def test_streams_published_posts_in_change_order(self):
+        posts = self.create_posts(3)
+        posts[0].title = "Edited last"
+        posts[0].save()
+        BlogPost(
+            title="Draft", content="x", author=posts[0].author, is_published=False
+        ).save()
+
+        rows = self.export()
+
+        self.assertEqual(
+            [row["title"] for row in rows], ["Post 1", "Post 2", "Edited last"]
+        )
+        self.assertEqual(rows[0]["author"]["username"], "writer")
+
+    def test_updated_since_filters(self):
+        posts = self.create_posts(3)
+        since = posts[2].updated_at.isoformat()
+
+        rows = self.export(updated_since=since + "Z")
+
+        self.assertEqual([row["id"] for row in rows], [str(posts[2].id)])
+
+    def test_scheduled_posts_are_not_exported(self):
+        posts = self.create_posts(2)
+        BlogPost.objects(id=posts[1].id).update(
+            set__published_at=datetime.utcnow() + timedelta(hours=1)
+        )
+
+        self.assertEqual([row["id"] for row in self.export()], [str(posts[0].id)])
+
+    def test_incremental_export_reports_removed_and_live_posts(self):
+        posts = self.create_posts(4)
+        since = datetime.utcnow()
+        unpublished, deleted, scheduled, _ = posts
+        scheduled_id = scheduled.id
+        unpublished.is_published = False
+        unpublished.save()
+        deleted.delete()
+        # Went live since the last sync without being saved
+        BlogPost.objects(id=scheduled_id).update(
+            set__published_at=datetime.utcnow(),
+            set__updated_at=since - timedelta(hours=1),
+        )
+
+        rows = self.export(updated_since=since.isoformat())
+
+        self.assertEqual(
+            [(row["id"], row.get("deleted", False)) for row in rows],
+            [
+                (str(unpublished.id), True),
+                (str(deleted.id), True),
+                (str(scheduled_id), False),
+            ],
+        )
+        self.assertNotIn("title", rows[0])
+        changed_at = [row["changed_at"] for row in rows]
+        self.assertEqual(changed_at, sorted(changed_at))
+
+    def test_rejects_invalid_updated_since(self):
+        response = self.client.get(
+            reverse("blog:api_posts_export"), {"updated_since": "yesterday"}
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(EXPORT_BATCH_SIZE=2)
+    def test_references_are_loaded_per_batch(self):
+        self.create_posts(5)
+
+        with count_queries() as queries:
+            rows = self.export()
+
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(queries.by_collection["authors"], 3)
+        self.assertEqual(queries.by_collection["tags"], 3)
+
+    def test_async_export(self):
+        self.create_posts(3)
+        request = RequestFactory().get("/api/posts/export/")
+
+        async def export():
+            response = await async_views.api_posts_export(request)
+            return [chunk async for chunk in response.streaming_content]
+
+        content = b"".join(async_to_sync(export)()).decode()
+        self.assertEqual(len(content.splitlines()), 3)
+
+
+class SeedingTests(MongoTestCase):
+    def seed(self, seed=0):
+        return Seeder(
+            users=20,
+            authors=5,
+            tags=10,
+            categories=3,
+            posts=60,
+            seed=seed,
+            batch_size=25,
+        ).run()
+
+    def test_inserts_documents_with_resolvable_references(self):
+        inserted = self.seed()
+
+        self.assertEqual(
+            inserted,
+            {"users": 20, "authors": 5, "tags": 10, "categories": 3, "posts": 60},
+        )
+        for post in BlogPost.objects.prefetch_references():
+            post.validate()
+            self.assertIsNotNone(post.author.username)
+            self.assertTrue(all(tag.slug for tag in post.tags))
+            self.assertEqual(post.approved_comment_count, len(post.approved_comments))
+        self.assertTrue(User.objects.first().check_password("seed-password"))
+
+    def test_popularity_is_skewed(self):
+        self.seed()
+
+        per_author = Counter(BlogPost.objects.scalar("author"))
+        counts = sorted(per_author.values(), reverse=True)
+        self.assertGreater(counts[0], counts[-1] * 2)
+
+    def test_same_seed_same_data(self):
+        self.seed(seed=7)
+        first = [(p.id, p.title, p.tags) for p in BlogPost.objects.order_by("id")]
+        drop_seeded_collections()
+        self.seed(seed=7)
+        second = [(p.id, p.title, p.tags) for p in BlogPost.objects.order_by("id")]
+
+        self.assertEqual(first, second)
+
+
+class SessionStoreTests(MongoTestCase):
+    def tearDown(self):
+        local_cache.clear()
+        super().tearDown()
+
+    def new_session(self, **data):
+        session = SessionStore()
+        session.update(data)
+        session.save()
+        return session.session_key
+
+    def count_writes(self):
+        return mock.patch.object(
+            mongomock.collection.Collection,
+            "update_one",
+            autospec=True,
+            side_effect=mongomock.collection.Collection.update_one,
+        )
+
+    def test_round_trip(self):
+        key = self.new_session(user="alice")
+        local_cache.clear()
+
+        self.assertEqual(SessionStore(key)["user"], "alice")
+        self.assertEqual(UserSession.objects.count(), 1)
+
+    def test_unchanged_session_is_not_written(self):
+        key = self.new_session(user="alice")
+
+        with self.count_writes() as update_one:
+            session = SessionStore(key)
+            session["user"]
+            session.save()
+            self.assertEqual(update_one.call_count, 0)
+
+            session["user"] = "bob"
+            session.save()
+            self.assertEqual(update_one.call_count, 1)
+
+    @override_settings(SESSION_TOUCH_INTERVAL=0)
+    def test_expiry_is_touched_after_the_interval(self):
+        key = self.new_session(user="alice")
+
+        with self.count_writes() as update_one:
+            session = SessionStore(key)
+            session["user"]
+            session.save()
+
+        self.assertEqual(update_one.call_count, 1)
+
+    def test_local_cache_avoids_reloading(self):
+        key = self.new_session(user="alice")
+
+        with count_queries() as queries:
+            self.assertEqual(SessionStore(key)["user"], "alice")
+
+        self.assertEqual(len(queries), 0)
+
+    def test_logged_in_sessions_are_not_cached(self):
+        key = self.new_session(**{"_auth_user_id": "42"})
+
+        with count_queries() as queries:
+            self.assertEqual(SessionStore(key)["_auth_user_id"], "42")
+        self.assertEqual(len(queries), 1)
+
+        # A logout on another worker ends the session here too
+        UserSession.objects(session_key=key).delete()
+        self.assertEqual(SessionStore(key).load(), {})
+
+    def test_audit_recreates_a_plain_expiry_index_as_ttl(self):
+        collection = UserSession._get_collection()
+        collection.drop_indexes()
+        collection.create_index("expire_date", name="expire_date_1")
+
+        changes = index_plan([UserSession])
+        self.assertIn(
+            ("recreate", "expire_date_1"),
+            [(change.action, change.name) for change in changes],
+        )
+        apply_index_plan(changes, [UserSession])
+
+        info = collection.index_information()["expire_date_1"]
+        self.assertEqual(info["expireAfterSeconds"], 0)
+
+    def test_expired_sessions_are_not_loaded(self):
+        UserSession.create_session(
+            "a" * 32, "data", datetime.utcnow() - timedelta(seconds=1)
+        )
+
+        self.assertFalse(SessionStore().exists("a" * 32))
+        self.assertEqual(SessionStore("a" * 32).load(), {})
+
+    def test_create_session_upserts(self):
+        expire = datetime.utcnow() + timedelta(days=1)
+        UserSession.create_session("k" * 32, "one", expire)
+        session = UserSession.create_session("k" * 32, "two", expire)
+
+        self.assertEqual(session.session_data, "two")
+        self.assertEqual(UserSession.objects.count(), 1)
+
+    def test_expiry_uses_a_ttl_index(self):
+        specs = UserSession._meta["index_specs"]
+
+        self.assertIn({"fields": [("expire_date", 1)], "expireAfterSeconds": 0}, specs)
+
+    def test_delete(self):
+        session = SessionStore()
+        session["user"] = "alice"
+        session.save()
+        session.delete()
+
+        self.assertFalse(SessionStore().exists(session.session_key))
+
+
+# ============================================================================
+# Authentication Backend
+# ============================================================================
+
+
+class AuthBackendTests(MongoTestCase):
+    def setUp(self):
+        self.user = User.create_user("alice", "alice@example.com", "secret123")
+        self.backend = MongoUserBackend()
+        cache.clear()
+
+    def tearDown(self):
+        local_cache.clear()
+        super().tearDown()
+
+    def logged_in_request(self):
+        request = RequestFactory().get("/")
+        request.session = SessionStore()
+        login(request, self.user)
+        request.session.save()
+        return request
+
+    def test_authenticates_by_username_or_email(self):
+        for username in ("alice", "alice@example.com"):
+            user = self.backend.authenticate(None, username, "secret123")
+            self.assertEqual(user.id, self.user.id)
+
+    def test_rejects_wrong_password_unknown_and_inactive_users(self):
+        self.assertIsNone(self.backend.authenticate(None, "alice", "wrong"))
+        self.assertIsNone(self.backend.authenticate(None, "nobody", "secret123"))
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(self.backend.authenticate(None, "alice", "secret123"))
+
+    def test_get_user_is_cached_without_the_password(self):
+        self.backend.get_user(str(self.user.id))
+
+        with count_queries() as queries:
+            user = self.backend.get_user(str(self.user.id))
+
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(user.username, "alice")
+        self.assertIsNone(user.password)
+
+    def test_saving_a_user_drops_the_cached_copy(self):
+        self.backend.get_user(str(self.user.id))
+        self.user.first_name = "Alice"
+        self.user.save()
+
+        self.assertEqual(self.backend.get_user(str(self.user.id)).first_name, "Alice")
+
+    def test_get_user_ignores_invalid_ids(self):
+        self.assertIsNone(self.backend.get_user("not-an-id"))
+
+    def test_login_sets_last_login_without_a_full_save(self):
+        with mock.patch.object(User, "save") as save:
+            self.logged_in_request()
+
+        save.assert_not_called()
+        self.user.reload()
+        self.assertIsNotNone(self.user.last_login)
+
+    @override_settings(AUTH_REHASH_IN_BACKGROUND=False)
+    def test_outdated_hash_is_upgraded(self):
+        outdated = PBKDF2PasswordHasher().encode("secret123", "salt", iterations=1000)
+        User.objects(id=self.user.id).update_one(set__password=outdated)
+
+        self.assertIsNotNone(self.backend.authenticate(None, "alice", "secret123"))
+
+        self.user.reload()
+        self.assertNotEqual(self.user.password, outdated)
+        self.assertTrue(self.user.check_password("secret123"))
+
+    def test_middleware_resolves_the_session_user(self):
+        request = self.logged_in_request()
+        next_request = RequestFactory().get("/")
+        next_request.session = SessionStore(request.session.session_key)
+
+        AuthenticationMiddleware(lambda request: None).process_request(next_request)
+
+        self.assertEqual(next_request.user.username, "alice")
+        self.assertTrue(next_request.user.is_authenticated)
+
+    def next_request(self, request):
+        next_request = RequestFactory().get("/")
+        next_request.session = SessionStore(request.session.session_key)
+        return next_request
+
+    def test_password_change_ends_other_sessions(self):
+        other = self.logged_in_request()
+        current = self.logged_in_request()
+
+        self.user.set_password("changed123")
+        self.user.save()
+        update_session_auth_hash(current, self.user)
+        current.session.save()
+
+        self.assertTrue(get_user(self.next_request(current)).is_authenticated)
+        stale = self.next_request(other)
+        self.assertFalse(get_user(stale).is_authenticated)
+        self.assertNotIn("_auth_user_id", stale.session)
+
+    def test_request_user_can_be_saved_and_checked(self):
+        request = self.next_request(self.logged_in_request())
+        before = User.objects.get(id=self.user.id)
+        user = get_user(request)
+
+        self.assertTrue(user.check_password("secret123"))
+        user.first_name = "Alice"
+        user.save()
+
+        stored = User.objects.get(id=self.user.id)
+        self.assertEqual(stored.first_name, "Alice")
+        self.assertEqual(stored.password, before.password)
+        self.assertEqual(stored.date_joined, before.date_joined)
+
+    def test_request_user_password_change_is_saved(self):
+        user = get_user(self.next_request(self.logged_in_request()))
+
+        user.set_password("changed123")
+        user.save()
+
+        self.assertTrue(User.objects.get(id=self.user.id).check_password("changed123"))
+
+    @override_settings(AUTH_REHASH_IN_BACKGROUND=False)
+    def test_hash_upgrade_keeps_sessions(self):
+        request = self.logged_in_request()
+        outdated = PBKDF2PasswordHasher().encode("secret123", "salt", iterations=1000)
+        User.objects(id=self.user.id).update_one(set__password=outdated)
+
+        self.backend.authenticate(None, "alice", "secret123")
+        cache.clear()
+
+        self.assertTrue(get_user(self.next_request(request)).is_authenticated)
+
+
+# ============================================================================
+# Index Management
+# ============================================================================
+
+
+class IndexManagementTests(MongoTestCase):
+    def raw(self, document):
+        return mongoengine.get_db()[document._get_collection_name()]
+
+    def test_conflicting_ttl_index_is_recreated(self):
+        self.raw(UserSession).create_index("expire_date")
+
+        changes = index_plan([UserSession])
+        self.assertIn(
+            ("recreate", "expire_date_1"), [(c.action, c.name) for c in changes]
+        )
+
+        apply_index_plan(changes)
+        indexes = self.raw(UserSession).index_information()
+        self.assertEqual(indexes["expire_date_1"]["expireAfterSeconds"], 0)
+        self.assertTrue(indexes["session_key_1"]["unique"])
+        self.assertEqual(index_plan([UserSession]), [])
+
+    def test_redundant_undeclared_indexes_are_dropped(self):
+        self.raw(BlogPost).create_index("is_published")
+
+        apply_index_plan(index_plan([BlogPost]))
+
+        indexes = self.raw(BlogPost).index_information()
+        self.assertNotIn("is_published_1", indexes)
+        self.assertIn("is_published_1_is_featured_1_published_at_-1", indexes)
+
+    def test_other_undeclared_indexes_are_kept_unless_asked(self):
+        self.raw(BlogPost).create_index("is_featured")
+
+        changes = index_plan([BlogPost])
+        self.assertIn(
+            ("undeclared", "is_featured_1"), [(c.action, c.name) for c in changes]
+        )
+        apply_index_plan(changes)
+        self.assertIn("is_featured_1", self.raw(BlogPost).index_information())
+
+        apply_index_plan(index_plan([BlogPost], drop_undeclared=True))
+        self.assertNotIn("is_featured_1", self.raw(BlogPost).index_information())
+
+    def test_recreated_index_is_stood_in_for(self):
+        self.raw(UserSession).create_index("expire_date")
+        create_index = mongomock.collection.Collection.create_index
+        drop_index = mongomock.collection.Collection.drop_index
+        calls = []
+
+        def create(collection, keys, **kwargs):
+            calls.append(("create", kwargs["name"]))
+            return create_index(collection, keys, **kwargs)
+
+        def drop(collection, name):
+            calls.append(("drop", name))
+            return drop_index(collection, name)
+
+        with mock.patch.object(
+            mongomock.collection.Collection, "create_index", create
+        ), mock.patch.object(mongomock.collection.Collection, "drop_index", drop):
+            apply_index_plan(index_plan([UserSession]))
+
+        self.assertEqual(
+            [call for call in calls if call[1].startswith("expire_date")],
+            [
+                ("create", "expire_date_1_rebuild"),
+                ("drop", "expire_date_1"),
+                ("create", "expire_date_1"),
+                ("drop", "expire_date_1_rebuild"),
+            ],
+        )
+
+    def test_no_declared_index_is_redundant(self):
+        for document in DOCUMENTS:
+            self.assertEqual(redundant_indexes(document), [], document.__name__)
+
+    def test_audit_reports_collection_scans_and_in_memory_sorts(self):
+        explained = {
+            "queryPlanner": {
+                "winningPlan": {
+                    "stage": "SORT",
+                    "inputStage": {"stage": "COLLSCAN"},
+                }
+            }
+        }
+        indexed = {
+            "queryPlanner": {
+                "winningPlan": {
+                    "queryPlan": {
+                        "stage": "LIMIT",
+                        "inputStage": {
+                            "stage": "FETCH",
+                            "inputStage": {"stage": "IXSCAN", "indexName": "slug_1"},
+                        },
+                    }
+                }
+            }
+        }
+        shapes = [
+            ("scan", BlogPost, lambda: mock.Mock(explain=lambda: explained)),
+            ("indexed", BlogPost, lambda: mock.Mock(explain=lambda: indexed)),
+        ]
+
+        scan, indexed_plan = audit_queries(shapes)
+
+        self.assertEqual(scan.problems, ["SORT", "COLLSCAN"])
+        self.assertEqual(indexed_plan.problems, [])
+        self.assertEqual(indexed_plan.indexes, ["slug_1"])
+
+
+# ============================================================================
+# Post Counts and Sidebar
+# ============================================================================
+
+
+class PostCountTests(MongoTestCase):
+    def setUp(self):
+        user = User.create_user("writer", "writer@example.com", "secret123")
+        self.author = Author.create_from_user(user)
+        self.python, self.mongo = Tag(name="Python").save(), Tag(name="Mongo").save()
+        self.guides = Category(name="Guides").save()
+        self.news = Category(name="News").save()
+
+    def counts(self):
+        return {
+            doc.name: doc.post_count
+            for doc in list(Tag.objects) + list(Category.objects)
+        }
+
+    def new_post(self, **fields):
+        fields.setdefault("tags", [self.python])
+        fields.setdefault("category", self.guides)
+        return BlogPost(
+            title="Post", content="Content", author=self.author, **fields
+        ).save()
+
+    def test_only_live_posts_are_counted(self):
+        post = self.new_post()
+        self.assertEqual(self.counts()["Python"], 0)
+
+        post.is_published = True
+        post.save()
+        self.assertEqual(
+            self.counts(), {"Python": 1, "Mongo": 0, "Guides": 1, "News": 0}
+        )
+
+        post.is_published = False
+        post.save()
+        self.assertEqual(
+            self.counts(), {"Python": 0, "Mongo": 0, "Guides": 0, "News": 0}
+        )
+
+    def test_counts_move_with_tags_and_category(self):
+        post = self.new_post(is_published=True)
+
+        post.tags = [self.mongo, self.python]
+        post.category = self.news
+        post.save()
+
+        self.assertEqual(
+            self.counts(), {"Python": 1, "Mongo": 1, "Guides": 0, "News": 1}
+        )
+
+    def test_deleting_a_post_decrements(self):
+        post = self.new_post(is_published=True)
+        post.delete()
+
+        self.assertEqual(self.counts()["Python"], 0)
+        self.assertEqual(self.counts()["Guides"], 0)
+
+    def test_recount_repairs_drift(self):
+        self.new_post(is_published=True)
+        Tag.objects(id=self.python.id).update_one(set__post_count=7)
+
+        self.assertEqual(BlogPost.recount_posts(), 1)
+        self.assertEqual(self.counts()["Python"], 1)
+        self.assertEqual(BlogPost.recount_posts(), 0)
+
+    def test_scheduled_posts_are_counted_once_live(self):
+        post = self.new_post(
+            is_published=True, published_at=datetime.utcnow() + timedelta(hours=1)
+        )
+        self.assertEqual(self.counts()["Python"], 0)
+        self.assertEqual(BlogPost.recount_posts(), 0)
+
+        BlogPost.objects(id=post.id).update_one(
+            set__published_at=datetime.utcnow() - timedelta(minutes=1)
+        )
+        self.assertEqual(BlogPost.recount_posts(), 2)
+        self.assertEqual(self.counts()["Python"], 1)
+        self.assertEqual(self.counts()["Guides"], 1)
+
+    def test_repeated_count_updates_apply_once(self):
+        post = self.new_post(is_published=True)
+
+        # A second save racing the first one finds the change already counted
+        self.assertFalse(update_post_counts(post.id))
+        stale = BlogPost.objects.get(id=post.id)
+        stale.save()
+
+        self.assertEqual(self.counts()["Python"], 1)
+
+    def test_sidebar_is_cached_and_cleared_by_saves(self):
+        post = self.new_post(is_published=True)
+        get_sidebar()
+
+        with count_queries() as queries:
+            sidebar = get_sidebar()
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(
+            sidebar["tags"], [{"name": "Python", "slug": "python", "post_count": 1}]
+        )
+
+        post.tags = [self.mongo]
+        post.save()
+        self.assertEqual([tag["name"] for tag in get_sidebar()["tags"]], ["Mongo"])
+
+    @override_settings(SIDEBAR_TAG_LIMIT=1)
+    def test_sidebar_lists_the_most_used_tags(self):
+        self.new_post(is_published=True, tags=[self.python, self.mongo])
+        self.new_post(is_published=True, tags=[self.mongo])
+
+        sidebar = get_sidebar()
+
+        self.assertEqual([tag["name"] for tag in sidebar["tags"]], ["Mongo"])
+        self.assertEqual(
+            [category["name"] for category in sidebar["categories"]], ["Guides", "News"]
+        )
+
+    def test_post_list_shows_category_counts(self):
+        self.new_post(is_published=True)
+
+        response = self.client.get(reverse("blog:post_list"))
+
+        self.assertContains(response, "Guides")
+        self.assertEqual(response.context["categories"][0]["post_count"], 1)
+
+
+# ============================================================================
+# Category Tree
+# ============================================================================
+
+
+class CategoryTreeTests(MongoTestCase):
+    def setUp(self):
+        self.tech = Category(name="Tech").save()
+        self.python = Category(name="Python", parent=self.tech).save()
+        self.django = Category(name="Django", parent=self.python).save()
+        self.life = Category(name="Life").save()
+
+    def ancestors(self, category):
+        return Category.objects.get(id=category.id).ancestors
+
+    def test_ancestors_follow_the_parent(self):
+        self.assertEqual(self.ancestors(self.tech), [])
+        self.assertEqual(self.ancestors(self.django), [self.tech.id, self.python.id])
+        self.assertEqual(
+            [c.name for c in self.django.breadcrumbs()], ["Tech", "Python"]
+        )
+
+    def test_moving_a_category_moves_its_descendants(self):
+        self.python.parent = self.life
+        self.python.save()
+
+        self.assertEqual(self.ancestors(self.python), [self.life.id])
+        self.assertEqual(self.ancestors(self.django), [self.life.id, self.python.id])
+        self.assertEqual(sorted(self.tech.subtree_ids()), [self.tech.id])
+
+    def test_cycles_are_rejected(self):
+        self.tech.parent = self.django
+        with self.assertRaises(mongoengine.ValidationError):
+            self.tech.save()
+
+    def test_rebuild_ancestors(self):
+        Category.objects(id=self.django.id).update_one(set__ancestors=[])
+
+        self.assertEqual(Category.rebuild_ancestors(), 1)
+        self.assertEqual(self.ancestors(self.django), [self.tech.id, self.python.id])
+
+    def test_subtree_is_one_query(self):
+        with count_queries() as queries:
+            ids = self.tech.subtree_ids()
+
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(set(ids), {self.tech.id, self.python.id, self.django.id})
+
+    def post(self, title, category):
+        user = User.objects(username="writer").first() or User.create_user(
+            "writer", "writer@example.com", "secret123"
+        )
+        author = Author.objects(user=user).first() or Author.create_from_user(user)
+        return BlogPost(
+            title=title,
+            content="Content",
+            author=author,
+            category=category,
+            is_published=True,
+        ).save()
+
+    def test_sidebar_counts_include_subcategories(self):
+        self.post("Intro", self.tech)
+        self.post("Views", self.django)
+        self.post("Models", self.django)
+
+        counts = {
+            category["name"]: category["post_count"]
+            for category in get_sidebar()["categories"]
+        }
+
+        self.assertEqual(counts, {"Django": 2, "Life": 0, "Python": 2, "Tech": 3})
+        self.assertEqual(Category.objects.get(id=self.tech.id).post_count, 1)
+
+    def test_category_page_lists_the_subtree(self):
+        self.post("Deep", self.django)
+        self.post("Elsewhere", self.life)
+        request = RequestFactory().get("/category/tech/")
+
+        pages = {
+            "sync": views.posts_by_category,
+            "async": async_to_sync(async_views.posts_by_category),
+        }
+        for name, view in pages.items():
+            with self.subTest(view=name):
+                page_cache.backend.clear()
+                response = view(request, slug="tech")
+                self.assertContains(response, "Deep")
+                self.assertNotContains(response, "Elsewhere")
+
+        response = self.client.get(reverse("blog:posts_by_category", args=["django"]))
+        self.assertEqual(
+            [c.name for c in response.context["breadcrumbs"]], ["Tech", "Python"]
+        )
+
+    def test_saving_a_post_invalidates_ancestor_listings(self):
+        post = self.post("Deep", self.django)
+        with mock.patch.object(page_cache, "invalidate") as invalidate:
+            post.save()
+
+        tags = invalidate.call_args.args
+        self.assertIn("category:tech", tags)
+        self.assertIn("category:python", tags)
+
+
+# ============================================================================
+# Sitemaps and Feeds
+# ============================================================================
+
+
+class FeedTests(MongoTestCase):
+    def setUp(self):
+        self.posts = self.create_posts(5)
+        self.draft = BlogPost(
+            title="Draft", content="Draft", author=self.posts[0].author
+        ).save()
+
+    def get(self, name, *args, **headers):
+        response = self.client.get(reverse(f"blog:{name}", args=args), **headers)
+        if response.streaming:
+            response.body = b"".join(response.streaming_content).decode()
+        else:
+            response.body = response.content.decode()
+        return response
+
+    def test_sitemap_lists_published_posts(self):
+        response = self.get("sitemap")
+
+        self.assertEqual(response["Content-Type"], "application/xml")
+        self.assertEqual(response.body.count("<url>"), 5)
+        self.assertIn(f"/post/{self.posts[0].slug}/</loc><lastmod>", response.body)
+        self.assertNotIn(self.draft.slug, response.body)
+
+    def test_streamed_sitemap_is_cached_until_posts_change(self):
+        first = self.get("sitemap")
+
+        with count_queries() as queries:
+            second = self.get("sitemap")
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(second["X-Page-Cache"], "hit")
+        self.assertEqual(second.body, first.body)
+
+        self.posts[0].title = "Renamed"
+        self.posts[0].save()
+        self.assertEqual(self.get("sitemap")["X-Page-Cache"], "miss")
+
+    def test_sitemap_revalidates_with_etag(self):
+        etag = self.get("sitemap")["ETag"]
+
+        response = self.get("sitemap", HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+
+    @override_settings(SITEMAP_MAX_URLS=2)
+    def test_large_sitemaps_are_split_into_sections(self):
+        index = self.get("sitemap")
+
+        self.assertIn("<sitemapindex", index.body)
+        self.assertEqual(index.body.count("<sitemap>"), 3)
+        counts = [self.get("sitemap_section", n).body.count("<url>") for n in (1, 2, 3)]
+        self.assertEqual(counts, [2, 2, 1])
+        with self.assertRaises(Http404):
+            views.sitemap_section(RequestFactory().get("/sitemap-4.xml"), section=4)
+
+    @override_settings(SITEMAP_MAX_URLS=2)
+    def test_sections_are_read_as_id_ranges(self):
+        self.get("sitemap")
+
+        with count_queries() as queries:
+            self.assertEqual(feeds.sitemap_section_count(), 3)
+        self.assertEqual(len(queries), 0)
+        with mock.patch.object(mongomock.collection.Cursor, "skip") as skip:
+            section = self.get("sitemap_section", 2)
+        skip.assert_not_called()
+        self.assertIn(self.posts[2].slug, section.body)
+        self.assertIn(self.posts[3].slug, section.body)
+
+    def test_rss_and_atom_feeds(self):
+        for name, marker in (("rss_feed", "<rss"), ("atom_feed", "<feed")):
+            with self.subTest(feed=name):
+                response = self.get(name)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn(marker, response.body)
+                self.assertEqual(response.body.count(self.posts[-1].title + "<"), 1)
+                self.assertNotIn("Draft", response.body)
+                self.assertIn("ETag", response)
+
+
+# ============================================================================
+# Newsletter
+# ============================================================================
+
+
+class FailingBackend(locmem.EmailBackend):
+    """Delivers ``batches`` calls of send_messages, then fails"""
+
+    def __init__(self, batches, **kwargs):
+        super().__init__(**kwargs)
+        self.batches = batches
+
+    def send_messages(self, messages):
+        if not self.batches:
+            raise ConnectionError("mail server went away")
+        self.batches -= 1
+        return super().send_messages(messages)
+
+
+@override_settings(
+    NEWSLETTER_EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend",
+    NEWSLETTER_SITE_URL="https://blog.example/",
+)
+class NewsletterTests(MongoTestCase):
+    def subscribers(self, count):
+        return [(f"reader{i}@example.com", f"Reader {i}") for i in range(count)]
+
+    def signup(self, email):
+        response = self.client.post(
+            reverse("blog:newsletter_signup"),
+            json.dumps({"email": email}),
+            content_type="application/json",
+        )
+        return response.status_code, response.json()["message"]
+
+    def test_subscribe_outcomes(self):
+        self.assertEqual(Newsletter.subscribe("a@example.com"), Newsletter.CREATED)
+        self.assertEqual(
+            Newsletter.subscribe("a@example.com"), Newsletter.ALREADY_ACTIVE
+        )
+        Newsletter.objects(email="a@example.com").update(
+            is_active=False, unsubscribed_at=datetime.utcnow()
+        )
+        self.assertEqual(Newsletter.subscribe("a@example.com"), Newsletter.REACTIVATED)
+
+        subscriber = Newsletter.objects.get(email="a@example.com")
+        self.assertTrue(subscriber.is_active)
+        self.assertIsNone(subscriber.unsubscribed_at)
+        self.assertEqual(Newsletter.objects.count(), 1)
+
+    def test_signup_view(self):
+        self.assertEqual(self.signup("b@example.com")[0], 200)
+        status, message = self.signup("b@example.com")
+        self.assertEqual(status, 400)
+        self.assertIn("already subscribed", message)
+        self.assertEqual(self.signup("not-an-address")[0], 400)
+        self.assertEqual(Newsletter.objects.count(), 1)
+
+    def test_bulk_subscribe(self):
+        Newsletter(email="reader0@example.com", is_active=False).save()
+        Newsletter(email="reader1@example.com").save()
+        rows = self.subscribers(5) + [("broken", "")]
+
+        created, reactivated = Newsletter.bulk_subscribe(rows, batch_size=2)
+
+        self.assertEqual((created, reactivated), (3, 1))
+        self.assertEqual(Newsletter.objects(is_active=True).count(), 5)
+
+    def test_bulk_subscribe_retries_upserts_racing_a_signup(self):
+        original = mongomock.collection.Collection.bulk_write
+        calls = []
+
+        def racing_bulk_write(collection, requests, ordered=True):
+            calls.append(len(requests))
+            if len(calls) > 1:
+                return original(collection, requests, ordered=ordered)
+            # A signup of reader1 lands between the upserts
+            original(collection, requests[:1] + requests[2:], ordered=ordered)
+            Newsletter.subscribe("reader1@example.com")
+            raise BulkWriteError(
+                {
+                    "writeErrors": [{"index": 1, "code": 11000, "errmsg": "dup"}],
+                    "nUpserted": len(requests) - 1,
+                    "nModified": 0,
+                }
+            )
+
+        with mock.patch.object(
+            mongomock.collection.Collection, "bulk_write", racing_bulk_write
+        ):
+            created, reactivated = Newsletter.bulk_subscribe(self.subscribers(3))
+
+        self.assertEqual(calls, [3, 1])
+        self.assertEqual((created, reactivated), (2, 0))
+        self.assertEqual(Newsletter.objects(is_active=True).count(), 3)
+
+    def test_digest_links_to_unsubscribe(self):
+        self.create_posts(1)
+        Newsletter.subscribe("reader@example.com")
+        send_digest("weekly")
+
+        message = mail.outbox[0]
+        url = message.extra_headers["List-Unsubscribe"].strip("<>")
+        self.assertTrue(url.startswith("https://blog.example/newsletter/unsubscribe/"))
+        self.assertIn(f"Unsubscribe: {url}", message.body)
+        path = urlsplit(url).path
+
+        self.assertContains(self.client.get(path), "reader@example.com")
+        self.assertTrue(Newsletter.objects.get(email="reader@example.com").is_active)
+        response = self.client.post(path)
+        self.assertContains(response, "You have been unsubscribed")
+        subscriber = Newsletter.objects.get(email="reader@example.com")
+        self.assertFalse(subscriber.is_active)
+        self.assertIsNotNone(subscriber.unsubscribed_at)
+
+        # Signed with another salt, as other signed values in the app are
+        forged = signing.dumps("other@example.com")
+        response = self.client.post(
+            reverse("blog:newsletter_unsubscribe", args=[forged])
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_digest_links_are_absolute(self):
+        posts = self.create_posts(1)
+        Newsletter.subscribe("reader@example.com")
+        SiteSettings(site_url="https://news.example").save()
+
+        send_digest("weekly")
+
+        link = f"https://news.example/post/{posts[0].slug}/"
+        self.assertIn(link, mail.outbox[0].body)
+
+    @override_settings(NEWSLETTER_SITE_URL="")
+    def test_digest_needs_a_site_url(self):
+        self.create_posts(1)
+        Newsletter.subscribe("reader@example.com")
+
+        with self.assertRaises(ImproperlyConfigured):
+            send_digest("weekly")
+
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(NewsletterSend.objects.count(), 0)
+
+    def test_racing_first_runs_share_one_send(self):
+        self.create_posts(1)
+        Newsletter.subscribe("reader@example.com")
+        NewsletterSend(
+            key="weekly",
+            subject="Weekly",
+            running_until=datetime.utcnow() + timedelta(minutes=5),
+        ).save()
+        first = RoutedQuerySet.first
+
+        def missing_send(queryset):
+            # As if the other run inserted it right after this one looked
+            if queryset._document is NewsletterSend:
+                return None
+            return first(queryset)
+
+        with mock.patch.object(RoutedQuerySet, "first", missing_send):
+            with self.assertRaises(SendInProgress):
+                send_digest("weekly")
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_a_running_send_is_not_sent_twice(self):
+        self.create_posts(1)
+        Newsletter.bulk_subscribe(self.subscribers(3))
+
+        def second_run(messages):
+            with self.assertRaises(SendInProgress):
+                send_digest("weekly")
+            return len(messages)
+
+        connection = mock.MagicMock()
+        connection.send_messages.side_effect = second_run
+        send = send_digest("weekly", connection=connection)
+
+        self.assertEqual(connection.send_messages.call_count, 1)
+        self.assertEqual(send.sent, 3)
+        self.assertIsNone(NewsletterSend.objects.get(key="weekly").running_until)
+
+    def test_an_expired_lease_can_be_taken_over(self):
+        self.create_posts(1)
+        Newsletter.bulk_subscribe(self.subscribers(3))
+        NewsletterSend(
+            key="weekly",
+            subject="Weekly",
+            post_ids=list(BlogPost.objects.scalar("id")),
+            running_until=datetime.utcnow() - timedelta(seconds=1),
+        ).save()
+
+        send = send_digest("weekly")
+
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertIsNotNone(send.finished_at)
+
+    def test_digest_goes_to_active_subscribers_once(self):
+        posts = self.create_posts(2)
+        Newsletter.bulk_subscribe(self.subscribers(5))
+        Newsletter.objects(email="reader3@example.com").update(is_active=False)
+
+        send = send_digest("weekly", batch_size=2, workers=2)
+
+        recipients = sorted(message.to[0] for message in mail.outbox)
+        self.assertEqual(len(recipients), 4)
+        self.assertNotIn("reader3@example.com", recipients)
+        self.assertIn(f"/post/{posts[0].slug}/", mail.outbox[0].body)
+        self.assertIn("Hi Reader", mail.outbox[0].body)
+        self.assertEqual(NewsletterSend.objects.get(key="weekly").sent, 4)
+        self.assertIsNotNone(send.finished_at)
+
+        send_digest("weekly")
+        self.assertEqual(len(mail.outbox), 4)
+
+    def test_interrupted_send_resumes_after_last_batch(self):
+        self.create_posts(1)
+        Newsletter.bulk_subscribe(self.subscribers(5))
+
+        with self.assertRaises(ConnectionError):
+            send_digest("weekly", batch_size=2, workers=1, connection=FailingBackend(1))
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertIsNone(NewsletterSend.objects.get(key="weekly").finished_at)
+
+        send = send_digest("weekly", batch_size=2, workers=1)
+
+        recipients = [message.to[0] for message in mail.outbox]
+        self.assertEqual(
+            sorted(recipients), [email for email, _ in self.subscribers(5)]
+        )
+        self.assertEqual(send.sent, 5)
@@ -1,5 +1,9 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
+
+# Read views and the JSON API come in sync and async versions
+read_views = async_views if getattr(settings, "ASYNC_VIEWS", False) else views
 
 app_name = "blog"
 
@@ -8,19 +12,21 @@ urlpatterns = [
     # Main Blog Pages
     # ========================================================================
     # Homepage
-    path("", views.home, name="home"),
+    path("", read_views.home, name="home"),
     # Post listing and details
-    path("posts/", views.post_list, name="post_list"),
-    path("post/<slug:slug>/", views.post_detail, name="post_detail"),
+    path("posts/", read_views.post_list, name="post_list"),
+    path("post/<slug:slug>/", read_views.post_detail, name="post_detail"),
     # ========================================================================
     # Filtered Post Views
     # ========================================================================
     # Posts by author
-    path("author/<str:username>/", views.posts_by_author, name="posts_by_author"),
+    path("author/<str:username>/", read_views.posts_by_author, name="posts_by_author"),
     # Posts by tag
-    path("tag/<slug:slug>/", views.posts_by_tag, name="posts_by_tag"),
+    path("tag/<slug:slug>/", read_views.posts_by_tag, name="posts_by_tag"),
     # Posts by category
-    path("category/<slug:slug>/", views.posts_by_category, name="posts_by_category"),
+    path(
+        "category/<slug:slug>/", read_views.posts_by_category, name="posts_by_category"
+    ),
     # ========================================================================
     # Search and Utility Pages
     # ========================================================================
@@ -37,17 +43,26 @@ urlpatterns = [
     # Newsletter subscription
     path("newsletter/signup/", views.newsletter_signup, name="newsletter_signup"),
     path("subscribe/", views.newsletter_signup, name="subscribe"),  # Alias
+    path(
+        "newsletter/unsubscribe/<str:token>/",
+        views.newsletter_unsubscribe,
+        name="newsletter_unsubscribe",
+    ),
     # ========================================================================
     # API Endpoints
     # ========================================================================
     # RESTful API for posts
-    path("api/posts/", views.api_posts, name="api_posts"),
-    path("api/post/<slug:slug>/", views.api_post_detail, name="api_post_detail"),
+    path("api/posts/", read_views.api_posts, name="api_posts"),
+    # Streaming NDJSON export for search and analytics sync
+    path("api/posts/export/", read_views.api_posts_export, name="api_posts_export"),
+    path("api/post/<slug:slug>/", read_views.api_post_detail, name="api_post_detail"),
     # ========================================================================
     # SEO and Utility URLs
     # ========================================================================
-    # Sitemap (you can implement this later)
-    # path('sitemap.xml', views.sitemap, name='sitemap'),
-    # RSS feed (you can implement this later)
-    # path('feed/', views.rss_feed, name='rss_feed'),
+    # Sitemap, split into numbered sections above SITEMAP_MAX_URLS posts
+    path("sitemap.xml", views.sitemap, name="sitemap"),
+    path("sitemap-<int:section>.xml", views.sitemap_section, name="sitemap_section"),
+    # RSS and Atom feeds of the newest posts
+    path("feed/", views.rss_feed, name="rss_feed"),
+    path("feed/atom/", views.atom_feed, name="atom_feed"),
 ]
@@ -1,11 +1,37 @@
 from django.shortcuts import render
-from django.http import JsonResponse, Http404, HttpResponseRedirect
+from django.http import (
+    HttpResponse,
+    JsonResponse,
+    Http404,
+    HttpResponseRedirect,
+    StreamingHttpResponse,
+)
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.urls import reverse
 from django.contrib import messages
-from mongoengine import DoesNotExist
-from .models import BlogPost, Author, Tag, Category, Newsletter, SiteSettings, User
+from django.core import signing
+from mongoengine import DoesNotExist, ValidationError
+from . import feeds, search
+from .cache import cache_page_for, page_cache
+from .conditional import conditional, listing_validators, post_validators
+from .export import export_changes, export_lines, parse_updated_since
+from .monitoring import pool_metrics
+from .routing import read_replica
+from .sidebar import get_sidebar
+from .pagination import InvalidCursor, cached_count, paginate_by_cursor
+from .stats import get_dashboard_stats
+from .models import (
+    BlogPost,
+    Author,
+    Tag,
+    Category,
+    Newsletter,
+    SiteSettings,
+    User,
+    load_summaries,
+    prefetch_references,
+)
 import json
 from datetime import datetime
 import logging
@@ -17,58 +43,87 @@ logger = logging.getLogger(__name__)
 # ============================================================================
 
 
+@cache_page_for("home", lambda: ["posts", "categories", "site_settings"])
+@conditional(listing_validators())
+@read_replica
 def home(request):
     """Homepage with featured and recent posts"""
     try:
         # Get featured posts (limit 3)
-        featured_posts = BlogPost.get_featured()[:3]
+        featured_posts = BlogPost.get_featured().summaries()[:3].prefetch_references()
 
         # Get recent posts (limit 6)
-        recent_posts = BlogPost.get_published().order_by("-published_at")[:6]
-
-        # Get site settings
-        site_settings = SiteSettings.get_settings()
+        recent_posts = (
+            BlogPost.get_published()
+            .summaries()
+            .order_by("-published_at")[:6]
+            .prefetch_references()
+        )
 
         # Get categories for navigation
-        categories = Category.objects.all()[:5]
+        categories = get_sidebar()["categories"][:5]
 
         context = {
             "featured_posts": featured_posts,
             "recent_posts": recent_posts,
             "categories": categories,
-            "site_settings": site_settings,
             "page_title": "Home",
         }
         return render(request, "blog/home.html", context)
 
     except Exception as e:
         logger.error(f"Error in home view: {e}")
-        return render(request, "blog/error.html", {"error": "Unable to load homepage"})
+        return render(
+            request, "blog/error.html", {"error": "Unable to load homepage"}, status=500
+        )
 
 
+@cache_page_for("post_list", lambda: ["posts", "categories", "tags", "site_settings"])
+@conditional(listing_validators())
+@read_replica
 def post_list(request):
     """List all published posts with pagination"""
     try:
         # Get all published posts
-        posts_queryset = BlogPost.get_published().order_by("-published_at")
-
-        # Simple pagination (you can enhance this)
-        page = int(request.GET.get("page", 1))
+        posts_queryset = BlogPost.get_published().summaries()
         posts_per_page = 10
-        start = (page - 1) * posts_per_page
-        end = start + posts_per_page
-
-        posts = list(posts_queryset[start:end])
-        total_posts = posts_queryset.count()
-
-        # Calculate pagination info
-        has_next = end < total_posts
-        has_previous = page > 1
+        page = None
+        next_cursor = previous_cursor = None
+
+        if "page" in request.GET:
+            # Offset pagination, kept for existing ?page= links
+            page = max(1, int(request.GET.get("page", 1)))
+            start = (page - 1) * posts_per_page
+            end = start + posts_per_page
+
+            posts = (
+                posts_queryset.order_by("-published_at", "-id")[start:end]
+            ).prefetch_references()
+            total_posts = cached_count("published_posts", posts_queryset)
+
+            has_next = end < total_posts
+            has_previous = page > 1
+        else:
+            # Keyset pagination on (published_at, id)
+            try:
+                result = paginate_by_cursor(
+                    posts_queryset, request.GET.get("cursor"), posts_per_page
+                )
+            except InvalidCursor:
+                result = paginate_by_cursor(posts_queryset, None, posts_per_page)
+            posts = prefetch_references(result.items)
+            has_next = result.has_next
+            has_previous = result.has_previous
+            next_cursor = result.next_cursor
+            previous_cursor = result.previous_cursor
 
         # Get sidebar data
-        categories = Category.objects.all()
-        tags = Tag.objects.all()
-        recent_posts = BlogPost.get_published().order_by("-published_at")[:5]
+        sidebar = get_sidebar()
+        categories = sidebar["categories"]
+        tags = sidebar["tags"]
+        recent_posts = (
+            BlogPost.get_published().summaries().order_by("-published_at")[:5]
+        )
 
         context = {
             "posts": posts,
@@ -78,34 +133,38 @@ def post_list(request):
             "page": page,
             "has_next": has_next,
             "has_previous": has_previous,
-            "next_page": page + 1 if has_next else None,
-            "previous_page": page - 1 if has_previous else None,
-            "site_settings": SiteSettings.get_settings(),
+            "next_page": page + 1 if page and has_next else None,
+            "previous_page": page - 1 if page and has_previous else None,
+            "next_cursor": next_cursor,
+            "previous_cursor": previous_cursor,
             "page_title": "All Posts",
         }
         return render(request, "blog/post_list.html", context)
 
     except Exception as e:
         logger.error(f"Error in post_list view: {e}")
-        return render(request, "blog/error.html", {"error": "Unable to load posts"})
+        return render(
+            request, "blog/error.html", {"error": "Unable to load posts"}, status=500
+        )
 
 
+@conditional(post_validators())
+@read_replica
 def post_detail(request, slug):
     """Individual post detail page"""
     try:
         # Get the post
-        post = BlogPost.objects.get(slug=slug, is_published=True)
+        post = BlogPost.get_published().get(slug=slug)
 
         # Increment view count
         post.increment_view_count()
 
-        # Get related posts using the model method
+        # Related posts are precomputed, so this is one projected $in query
         related_posts = post.get_related_posts(3)
 
         context = {
             "post": post,
             "related_posts": related_posts,
-            "site_settings": SiteSettings.get_settings(),
             "page_title": post.title,
         }
         return render(request, "blog/post_detail.html", context)
@@ -114,19 +173,31 @@ def post_detail(request, slug):
         raise Http404("Post not found")
     except Exception as e:
         logger.error(f"Error in post_detail view: {e}")
-        return render(request, "blog/error.html", {"error": "Unable to load post"})
+        return render(
+            request, "blog/error.html", {"error": "Unable to load post"}, status=500
+        )
 
 
+@cache_page_for(
+    "posts_by_author", lambda username: [f"author:{username}", "site_settings"]
+)
+@conditional(listing_validators())
+@read_replica
 def posts_by_author(request, username):
     """Posts by specific author"""
     try:
         author = Author.objects.get(username=username)
-        posts = BlogPost.get_published().filter(author=author).order_by("-published_at")
+        posts = (
+            BlogPost.get_published()
+            .summaries()
+            .filter(author=author)
+            .order_by("-published_at")
+            .prefetch_references()
+        )
 
         context = {
             "author": author,
             "posts": posts,
-            "site_settings": SiteSettings.get_settings(),
             "page_title": f"Posts by {author.full_name or author.username}",
         }
         return render(request, "blog/posts_by_author.html", context)
@@ -136,20 +207,31 @@ def posts_by_author(request, username):
     except Exception as e:
         logger.error(f"Error in posts_by_author view: {e}")
         return render(
-            request, "blog/error.html", {"error": "Unable to load author posts"}
+            request,
+            "blog/error.html",
+            {"error": "Unable to load author posts"},
+            status=500,
         )
 
 
+@cache_page_for("posts_by_tag", lambda slug: [f"tag:{slug}", "site_settings"])
+@conditional(listing_validators())
+@read_replica
 def posts_by_tag(request, slug):
     """Posts by specific tag"""
     try:
         tag = Tag.objects.get(slug=slug)
-        posts = BlogPost.get_published().filter(tags=tag).order_by("-published_at")
+        posts = (
+            BlogPost.get_published()
+            .summaries()
+            .filter(tags=tag)
+            .order_by("-published_at")
+            .prefetch_references()
+        )
 
         context = {
             "tag": tag,
             "posts": posts,
-            "site_settings": SiteSettings.get_settings(),
             "page_title": f'Posts tagged "{tag.name}"',
         }
         return render(request, "blog/posts_by_tag.html", context)
@@ -158,21 +240,34 @@ def posts_by_tag(request, slug):
         raise Http404("Tag not found")
     except Exception as e:
         logger.error(f"Error in posts_by_tag view: {e}")
-        return render(request, "blog/error.html", {"error": "Unable to load tag posts"})
+        return render(
+            request,
+            "blog/error.html",
+            {"error": "Unable to load tag posts"},
+            status=500,
+        )
 
 
+@cache_page_for("posts_by_category", lambda slug: [f"category:{slug}", "site_settings"])
+@conditional(listing_validators())
+@read_replica
 def posts_by_category(request, slug):
     """Posts by specific category"""
     try:
         category = Category.objects.get(slug=slug)
+        # Posts in the category and all of its subcategories
         posts = (
-            BlogPost.get_published().filter(category=category).order_by("-published_at")
+            BlogPost.get_published()
+            .summaries()
+            .filter(category__in=category.subtree_ids())
+            .order_by("-published_at")
+            .prefetch_references()
         )
 
         context = {
             "category": category,
+            "breadcrumbs": category.breadcrumbs(),
             "posts": posts,
-            "site_settings": SiteSettings.get_settings(),
             "page_title": f'Posts in "{category.name}"',
         }
         return render(request, "blog/posts_by_category.html", context)
@@ -182,50 +277,37 @@ def posts_by_category(request, slug):
     except Exception as e:
         logger.error(f"Error in posts_by_category view: {e}")
         return render(
-            request, "blog/error.html", {"error": "Unable to load category posts"}
+            request,
+            "blog/error.html",
+            {"error": "Unable to load category posts"},
+            status=500,
         )
 
 
+@read_replica
 def search_posts(request):
-    """Search posts by title or content"""
+    """Full-text search over published posts, ranked by relevance"""
     query = request.GET.get("q", "").strip()
-    posts = []
 
     try:
         if query:
-            # Search in title first
-            posts = list(
-                BlogPost.get_published()
-                .filter(title__icontains=query)
-                .order_by("-published_at")
-            )
-
-            # If not enough results, search in content
-            if len(posts) < 5:
-                content_posts = list(
-                    BlogPost.get_published()
-                    .filter(content__icontains=query)
-                    .order_by("-published_at")[:10]
-                )
-                # Remove already included posts
-                existing_ids = [str(post.id) for post in posts]
-                content_posts = [
-                    p for p in content_posts if str(p.id) not in existing_ids
-                ]
-                posts.extend(content_posts)
+            page = max(int(request.GET.get("page", 1)), 1)
+            results = search.search_posts(query, page=page)
+        else:
+            results = search.SearchResults([], 0, 1, 10, capped=False)
 
         context = {
-            "posts": posts,
+            "posts": results.posts,
             "query": query,
-            "total_results": len(posts),
-            "site_settings": SiteSettings.get_settings(),
+            "results": results,
+            "total_results": results.total,
             "page_title": f'Search Results for "{query}"' if query else "Search",
         }
         return render(request, "blog/search_results.html", context)
 
     except Exception as e:
         logger.error(f"Error in search_posts view: {e}")
-        return render(request, "blog/error.html", {"error": "Search error"})
+        return render(request, "blog/error.html", {"error": "Search error"}, status=500)
 
 
 # ============================================================================
@@ -238,7 +320,8 @@ def search_posts(request):
 def add_comment(request, slug):
     """Add comment to a post"""
     try:
-        post = BlogPost.objects.get(slug=slug, is_published=True)
+        # The comment is $push-ed, so only the id is needed
+        post = BlogPost.get_published().only("id").get(slug=slug)
 
         # Parse request data
         if request.content_type == "application/json":
@@ -312,37 +395,36 @@ def newsletter_signup(request):
                 {"status": "error", "message": "Email is required"}, status=400
             )
 
-        # Check if already subscribed
+        # One atomic upsert; concurrent signups cannot create duplicates
         try:
-            subscriber = Newsletter.objects.get(email=email)
-            if subscriber.is_active:
-                return JsonResponse(
-                    {
-                        "status": "error",
-                        "message": "This email is already subscribed to our newsletter",
-                    },
-                    status=400,
-                )
-            else:
-                # Reactivate subscription
-                subscriber.is_active = True
-                subscriber.unsubscribed_at = None
-                subscriber.save()
-                return JsonResponse(
-                    {
-                        "status": "success",
-                        "message": "Welcome back! Your newsletter subscription has been reactivated.",
-                    }
-                )
-        except DoesNotExist:
-            # Create new subscription
-            Newsletter(email=email, name=name).save()
+            outcome = Newsletter.subscribe(email, name)
+        except ValidationError:
+            return JsonResponse(
+                {"status": "error", "message": "Please enter a valid email address"},
+                status=400,
+            )
+
+        if outcome == Newsletter.ALREADY_ACTIVE:
+            return JsonResponse(
+                {
+                    "status": "error",
+                    "message": "This email is already subscribed to our newsletter",
+                },
+                status=400,
+            )
+        if outcome == Newsletter.REACTIVATED:
             return JsonResponse(
                 {
                     "status": "success",
-                    "message": "Thank you for subscribing to our newsletter!",
+                    "message": "Welcome back! Your newsletter subscription has been reactivated.",
                 }
             )
+        return JsonResponse(
+            {
+                "status": "success",
+                "message": "Thank you for subscribing to our newsletter!",
+            }
+        )
 
     except Exception as e:
         logger.error(f"Error in newsletter signup: {e}")
@@ -355,62 +437,155 @@ def newsletter_signup(request):
         )
 
 
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+def newsletter_unsubscribe(request, token):
+    """Unsubscribe link of the newsletter digest
+
+    GET asks for confirmation, so link scanners unsubscribe nobody; POST,
+    from that form or a mail client's one-click unsubscribe, unsubscribes.
+    """
+    try:
+        email = Newsletter.email_from_token(token)
+    except signing.BadSignature:
+        return render(
+            request,
+            "blog/error.html",
+            {"error": "This unsubscribe link is not valid"},
+            status=404,
+        )
+
+    unsubscribed = request.method == "POST"
+    if unsubscribed:
+        Newsletter.unsubscribe(email)
+    return render(
+        request,
+        "blog/newsletter_unsubscribe.html",
+        {"email": email, "unsubscribed": unsubscribed},
+    )
+
+
+# ============================================================================
+# API Serialization
+# ============================================================================
+
+
+def serialize_post_summary(post):
+    """JSON for a post in the posts API listing"""
+    return {
+        "id": str(post.id),
+        "title": post.title,
+        "slug": post.slug,
+        "excerpt": post.excerpt,
+        "author": {
+            "username": post.author.username,
+            "full_name": post.author.full_name,
+        },
+        "published_at": post.published_at.isoformat() if post.published_at else None,
+        "view_count": post.total_view_count,
+        "comment_count": post.comment_count,
+        "tags": [{"name": tag.name, "slug": tag.slug} for tag in post.tags],
+        "category": {"name": post.category.name, "slug": post.category.slug}
+        if post.category
+        else None,
+    }
+
+
+def serialize_post(post):
+    """JSON for a single post in the post detail API"""
+    return {
+        "id": str(post.id),
+        "title": post.title,
+        "slug": post.slug,
+        "content": post.content,
+        "excerpt": post.excerpt,
+        "author": {
+            "username": post.author.username,
+            "full_name": post.author.full_name,
+            "bio": post.author.bio,
+            "avatar_url": post.author.avatar_url,
+        },
+        "published_at": post.published_at.isoformat() if post.published_at else None,
+        "updated_at": post.updated_at.isoformat(),
+        "view_count": post.total_view_count,
+        "like_count": post.like_count,
+        "tags": [{"name": tag.name, "slug": tag.slug} for tag in post.tags],
+        "category": {"name": post.category.name, "slug": post.category.slug}
+        if post.category
+        else None,
+        "comments": [
+            {
+                "author_name": comment.author_name,
+                "content": comment.content,
+                "created_at": comment.created_at.isoformat(),
+            }
+            for comment in post.approved_comments
+        ],
+        "seo": {
+            "meta_title": post.meta_title,
+            "meta_description": post.meta_description,
+        },
+    }
+
+
 # ============================================================================
 # API Endpoints
 # ============================================================================
 
 
+@conditional(listing_validators(site_settings=False))
+@read_replica
 def api_posts(request):
     """API endpoint for posts with pagination"""
     try:
         # Get query parameters
-        page = int(request.GET.get("page", 1))
-        limit = min(int(request.GET.get("limit", 10)), 50)  # Max 50 posts per page
-
-        # Calculate offset
-        offset = (page - 1) * limit
-
-        # Get posts
-        posts_queryset = BlogPost.get_published().order_by("-published_at")
-        posts = list(posts_queryset[offset : offset + limit])
-        total = posts_queryset.count()
+        # 1 to 50 posts per page; a limit of 0 would never advance a cursor
+        limit = max(1, min(int(request.GET.get("limit", 10)), 50))
+        posts_queryset = BlogPost.get_published().summaries()
+
+        if "cursor" in request.GET or request.GET.get("pagination") == "cursor":
+            # Keyset pagination: constant cost per page, total only on request
+            try:
+                result = paginate_by_cursor(
+                    posts_queryset, request.GET.get("cursor"), limit
+                )
+            except InvalidCursor as e:
+                return JsonResponse({"error": str(e)}, status=400)
+
+            posts = prefetch_references(result.items)
+            pagination = {
+                "mode": "cursor",
+                "limit": limit,
+                "next": result.next_cursor,
+                "prev": result.previous_cursor,
+                "has_next": result.has_next,
+                "has_previous": result.has_previous,
+            }
+            if request.GET.get("include_total") in ("1", "true"):
+                pagination["total"] = cached_count("published_posts", posts_queryset)
+        else:
+            page = max(1, int(request.GET.get("page", 1)))
+            offset = (page - 1) * limit
+
+            posts = (
+                posts_queryset.order_by("-published_at", "-id")[offset : offset + limit]
+            ).prefetch_references()
+            total = cached_count("published_posts", posts_queryset)
+            pagination = {
+                "page": page,
+                "limit": limit,
+                "total": total,
+                "pages": (total + limit - 1) // limit,
+                "has_next": offset + limit < total,
+                "has_previous": page > 1,
+            }
 
-        # Serialize posts
-        posts_data = []
-        for post in posts:
-            posts_data.append(
-                {
-                    "id": str(post.id),
-                    "title": post.title,
-                    "slug": post.slug,
-                    "excerpt": post.excerpt,
-                    "author": {
-                        "username": post.author.username,
-                        "full_name": post.author.full_name,
-                    },
-                    "published_at": post.published_at.isoformat()
-                    if post.published_at
-                    else None,
-                    "view_count": post.view_count,
-                    "comment_count": post.comment_count,
-                    "tags": [{"name": tag.name, "slug": tag.slug} for tag in post.tags],
-                    "category": {"name": post.category.name, "slug": post.category.slug}
-                    if post.category
-                    else None,
-                }
-            )
+        posts_data = [serialize_post_summary(post) for post in posts]
 
         return JsonResponse(
             {
                 "posts": posts_data,
-                "pagination": {
-                    "page": page,
-                    "limit": limit,
-                    "total": total,
-                    "pages": (total + limit - 1) // limit,
-                    "has_next": offset + limit < total,
-                    "has_previous": page > 1,
-                },
+                "pagination": pagination,
             }
         )
 
@@ -419,49 +594,17 @@ def api_posts(request):
         return JsonResponse({"error": "Unable to fetch posts"}, status=500)
 
 
+@conditional(post_validators(site_settings=False))
+@read_replica
 def api_post_detail(request, slug):
     """API endpoint for single post"""
     try:
-        post = BlogPost.objects.get(slug=slug, is_published=True)
+        post = BlogPost.get_published().get(slug=slug)
 
         # Increment view count
         post.increment_view_count()
 
-        post_data = {
-            "id": str(post.id),
-            "title": post.title,
-            "slug": post.slug,
-            "content": post.content,
-            "excerpt": post.excerpt,
-            "author": {
-                "username": post.author.username,
-                "full_name": post.author.full_name,
-                "bio": post.author.bio,
-                "avatar_url": post.author.avatar_url,
-            },
-            "published_at": post.published_at.isoformat()
-            if post.published_at
-            else None,
-            "updated_at": post.updated_at.isoformat(),
-            "view_count": post.view_count,
-            "like_count": post.like_count,
-            "tags": [{"name": tag.name, "slug": tag.slug} for tag in post.tags],
-            "category": {"name": post.category.name, "slug": post.category.slug}
-            if post.category
-            else None,
-            "comments": [
-                {
-                    "author_name": comment.author_name,
-                    "content": comment.content,
-                    "created_at": comment.created_at.isoformat(),
-                }
-                for comment in post.approved_comments
-            ],
-            "seo": {
-                "meta_title": post.meta_title,
-                "meta_description": post.meta_description,
-            },
-        }
+        post_data = serialize_post(post)
 
         return JsonResponse(post_data)
 
@@ -472,46 +615,105 @@ def api_post_detail(request, slug):
         return JsonResponse({"error": "Unable to fetch post"}, status=500)
 
 
+@read_replica
+def api_posts_export(request):
+    """Stream live posts as NDJSON, or the changes since ``updated_since``"""
+    try:
+        updated_since = parse_updated_since(request.GET.get("updated_since"))
+    except ValueError:
+        return JsonResponse(
+            {"error": "updated_since must be an ISO 8601 datetime"}, status=400
+        )
+
+    lines = export_lines(export_changes(updated_since), serialize_post)
+    return StreamingHttpResponse(lines, content_type="application/x-ndjson")
+
+
+# ============================================================================
+# Sitemaps and Feeds
+# ============================================================================
+
+# Crawlers and feed readers see the same document whatever the site settings
+POSTS_CHANGED = listing_validators(("blog_posts",), site_settings=False)
+
+
+@cache_page_for("sitemap", lambda: ["posts"])
+@conditional(POSTS_CHANGED)
+@read_replica
+def sitemap(request):
+    """The posts sitemap, or a sitemap index once there are too many posts"""
+    sections = feeds.sitemap_section_count()
+    if sections > 1:
+        return HttpResponse(
+            feeds.sitemap_index(sections, request.build_absolute_uri),
+            content_type="application/xml",
+        )
+    chunks = feeds.sitemap_chunks(feeds.sitemap_cursor(), request.build_absolute_uri)
+    return StreamingHttpResponse(chunks, content_type="application/xml")
+
+
+@cache_page_for("sitemap_section", lambda section: ["posts"])
+@conditional(POSTS_CHANGED)
+@read_replica
+def sitemap_section(request, section):
+    """One section of a sitemap index"""
+    if not 1 <= section <= feeds.sitemap_section_count():
+        raise Http404("Sitemap section not found")
+    chunks = feeds.sitemap_chunks(
+        feeds.sitemap_cursor(section), request.build_absolute_uri
+    )
+    return StreamingHttpResponse(chunks, content_type="application/xml")
+
+
+def _feed(request, kind):
+    feed = feeds.build_feed(
+        feeds.FEED_CLASSES[kind],
+        SiteSettings.get_settings(),
+        request.build_absolute_uri(),
+        request.build_absolute_uri,
+        feeds.feed_items(),
+    )
+    return HttpResponse(feed.writeString("utf-8"), content_type=feed.content_type)
+
+
+@cache_page_for("rss_feed", lambda: ["posts", "site_settings"])
+@conditional(listing_validators(("blog_posts",)))
+@read_replica
+def rss_feed(request):
+    """RSS 2.0 feed of the newest posts"""
+    return _feed(request, "rss")
+
+
+@cache_page_for("atom_feed", lambda: ["posts", "site_settings"])
+@conditional(listing_validators(("blog_posts",)))
+@read_replica
+def atom_feed(request):
+    """Atom feed of the newest posts"""
+    return _feed(request, "atom")
+
+
 # ============================================================================
 # Utility Views
 # ============================================================================
 
 
+@read_replica
 def stats_dashboard(request):
     """Simple statistics dashboard"""
     try:
-        # Calculate statistics
-        total_posts = BlogPost.objects.count()
-        published_posts = BlogPost.get_published().count()
-        total_authors = Author.objects.count()
-        total_tags = Tag.objects.count()
-        total_categories = Category.objects.count()
-        newsletter_subscribers = Newsletter.objects(is_active=True).count()
-
-        # Calculate total views
-        total_views = sum(post.view_count for post in BlogPost.objects.all())
-
-        # Get recent posts
-        recent_posts = BlogPost.objects.order_by("-created_at")[:5]
-
-        # Get popular posts
-        popular_posts = BlogPost.get_published().order_by("-view_count")[:5]
-
-        stats = {
-            "total_posts": total_posts,
-            "published_posts": published_posts,
-            "total_authors": total_authors,
-            "total_tags": total_tags,
-            "total_categories": total_categories,
-            "newsletter_subscribers": newsletter_subscribers,
-            "total_views": total_views,
-            "recent_posts": recent_posts,
-            "popular_posts": popular_posts,
-        }
+        stats = dict(get_dashboard_stats())
+        stats["recent_posts"] = load_summaries(stats["recent_post_ids"])
+        stats["popular_posts"] = load_summaries(stats["popular_post_ids"])
+        stats["page_cache"] = page_cache.stats()
+        stats["mongo_pool"] = pool_metrics.snapshot()
 
         context = {
             "stats": stats,
-            "site_settings": SiteSettings.get_settings(),
+            "breakdowns": [
+                ("Top Authors", stats["by_author"], "author"),
+                ("Top Tags", stats["by_tag"], "tag"),
+                ("Top Categories", stats["by_category"], "category"),
+            ],
             "page_title": "Dashboard",
         }
 
@@ -519,13 +721,17 @@ def stats_dashboard(request):
 
     except Exception as e:
         logger.error(f"Error in stats_dashboard: {e}")
-        return render(request, "blog/error.html", {"error": "Unable to load dashboard"})
+        return render(
+            request,
+            "blog/error.html",
+            {"error": "Unable to load dashboard"},
+            status=500,
+        )
 
 
 def error_404(request, exception):
     """Custom 404 error page"""
     context = {
-        "site_settings": SiteSettings.get_settings(),
         "page_title": "Page Not Found",
     }
     return render(request, "blog/404.html", context, status=404)
@@ -534,7 +740,6 @@ def error_404(request, exception):
 def error_500(request):
     """Custom 500 error page"""
     context = {
-        "site_settings": SiteSettings.get_settings(),
         "page_title": "Server Error",
     }
     return render(request, "blog/500.html", context, status=500)
@@ -0,0 +1,124 @@
+"""Latency of the sync (WSGI) views against the async (ASGI) views.
+
+By default both view stacks run in this process on ``--posts`` seeded
+posts: the sync views on a pool of ``--concurrency`` threads, the async
+views as ``--concurrency`` tasks on one event loop, which is how WSGI and
+ASGI workers serve concurrent requests. Requests carry a session cookie so
+the page cache is bypassed and every request reaches MongoDB.
+
+To load-test real servers instead, start one of each on the same database,
+e.g. ``gunicorn base.wsgi -w 1 --threads 8 -b :8000`` and
+``ASYNC_VIEWS=1 uvicorn base.asgi:application --port 8001``, and pass
+``--wsgi-url http://localhost:8000 --asgi-url http://localhost:8001``.
+"""
+
+import asyncio
+import statistics
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmark_utils import report, seed_posts, setup
+
+args = setup(
+    __doc__,
+    posts={"type": int, "default": 1000},
+    requests={"type": int, "default": 400, "help": "requests per path"},
+    concurrency={"type": int, "default": 16},
+    wsgi_url={"default": None},
+    asgi_url={"default": None},
+)
+
+from asgiref.sync import async_to_sync  # noqa: E402
+from django.conf import settings  # noqa: E402
+from django.test import RequestFactory  # noqa: E402
+
+from blog import async_views, views  # noqa: E402
+
+PATHS = [
+    ("home", "/", {}),
+    ("post_list", "/posts/", {}),
+    ("post_list ?page=5", "/posts/?page=5", {}),
+    ("api_posts", "/api/posts/?limit=20", {}),
+    ("api_posts cursor", "/api/posts/?pagination=cursor&limit=20", {}),
+]
+COOKIE = {settings.SESSION_COOKIE_NAME: "benchmark"}
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    return f"p50 {statistics.median(samples) * 1000:7.2f} ms  p99 {p99 * 1000:7.2f} ms"
+
+
+def sync_latencies(view, path, kwargs):
+    factory = RequestFactory(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+
+    def one(_):
+        request = factory.get(path)
+        request.COOKIES.update(COOKIE)
+        start = time.perf_counter()
+        response = view(request, **kwargs)
+        assert response.status_code == 200, response.status_code
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        return list(pool.map(one, range(args.requests)))
+
+
+def async_latencies(view, path, kwargs):
+    factory = RequestFactory(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one():
+        async with semaphore:
+            request = factory.get(path)
+            request.COOKIES.update(COOKIE)
+            start = time.perf_counter()
+            response = await view(request, **kwargs)
+            assert response.status_code == 200, response.status_code
+            return time.perf_counter() - start
+
+    async def run():
+        return await asyncio.gather(*(one() for _ in range(args.requests)))
+
+    return async_to_sync(run)()
+
+
+def http_latencies(base_url, path):
+    cookie = "; ".join(f"{name}={value}" for name, value in COOKIE.items())
+
+    def one(_):
+        request = urllib.request.Request(base_url + path, headers={"Cookie": cookie})
+        start = time.perf_counter()
+        with urllib.request.urlopen(request) as response:
+            response.read()
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        return list(pool.map(one, range(args.requests)))
+
+
+rows = []
+if args.wsgi_url and args.asgi_url:
+    title = f"HTTP, {args.requests} requests per path, concurrency {args.concurrency}"
+    for name, path, _ in PATHS:
+        rows.append((f"{name} wsgi", percentiles(http_latencies(args.wsgi_url, path))))
+        rows.append((f"{name} asgi", percentiles(http_latencies(args.asgi_url, path))))
+else:
+    seed_posts(args.posts)
+    title = (
+        f"In process, {args.posts:,} posts, {args.requests} requests per path, "
+        f"concurrency {args.concurrency}"
+    )
+    for name, path, kwargs in PATHS:
+        view = name.split()[0]
+        sync_view, async_view = getattr(views, view), getattr(async_views, view)
+        rows.append(
+            (f"{name} sync", percentiles(sync_latencies(sync_view, path, kwargs)))
+        )
+        rows.append(
+            (f"{name} async", percentiles(async_latencies(async_view, path, kwargs)))
+        )
+
+report(title, rows)
@@ -0,0 +1,84 @@
+"""Offset versus keyset pagination on the first and a deep page.
+
+Seeds ``--posts`` published posts directly with insert_many, then times
+``skip()``-based pages against ``blog.pagination.paginate_by_cursor``.
+"""
+
+from datetime import datetime, timedelta
+
+from benchmark_utils import report, setup, timed
+
+args = setup(
+    __doc__,
+    posts={"type": int, "default": 100_010},
+    page={"type": int, "default": 10_000, "help": "deep page number"},
+    limit={"type": int, "default": 10},
+    repeat={"type": int, "default": 5},
+)
+
+from bson import ObjectId  # noqa: E402
+
+from blog.models import Author, BlogPost, User  # noqa: E402
+from blog.pagination import encode_cursor, paginate_by_cursor  # noqa: E402
+
+user = User.create_user("bench", "bench@example.com", "bench-password")
+author = Author.create_from_user(user)
+BlogPost.ensure_indexes()
+
+start = datetime(2020, 1, 1)
+collection = BlogPost._get_collection()
+batch = []
+for i in range(args.posts):
+    batch.append(
+        {
+            "_id": ObjectId(),
+            "title": f"Benchmark post {i}",
+            "slug": f"benchmark-post-{i}",
+            "content": "Benchmark content",
+            "author": author.id,
+            "is_published": True,
+            "published_at": start + timedelta(minutes=i),
+            "created_at": start,
+            "updated_at": start,
+        }
+    )
+    if len(batch) == 10_000:
+        collection.insert_many(batch)
+        batch = []
+if batch:
+    collection.insert_many(batch)
+
+queryset = BlogPost.get_published()
+
+
+def offset_page(page):
+    offset = (page - 1) * args.limit
+    return list(queryset.order_by("-published_at")[offset : offset + args.limit])
+
+
+def cursor_page(cursor):
+    return paginate_by_cursor(queryset, cursor, args.limit).items
+
+
+def best_of(func, *func_args):
+    return min(timed(func, *func_args)[1] for _ in range(args.repeat)) * 1000
+
+
+# The cursor a client would hold after walking to the page before the deep one
+boundary = queryset.order_by("-published_at", "-id")[(args.page - 1) * args.limit - 1]
+deep_cursor = encode_cursor(boundary, "next")
+
+assert [p.id for p in cursor_page(deep_cursor)] == [
+    p.id for p in offset_page(args.page)
+], "offset and cursor pages disagree"
+
+report(
+    f"{args.posts:,} posts, {args.limit} per page, best of {args.repeat}",
+    [
+        ("offset page 1", f"{best_of(offset_page, 1):.2f} ms"),
+        (f"offset page {args.page:,}", f"{best_of(offset_page, args.page):.2f} ms"),
+        ("cursor page 1", f"{best_of(cursor_page, None):.2f} ms"),
+        (f"cursor page {args.page:,}", f"{best_of(cursor_page, deep_cursor):.2f} ms"),
+        ("exact count", f"{best_of(queryset.count):.2f} ms"),
+    ],
+)
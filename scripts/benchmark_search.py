@@ -0,0 +1,99 @@
+"""Full-text search against the old icontains scan on a large archive.
+
+Seeds ``--posts`` published posts with insert_many and times the ranked
+``$text`` search in ``blog.search`` against the previous title/content
+``icontains`` regex queries. Needs a real mongod: mongomock has no $text.
+"""
+
+import random
+from datetime import datetime, timedelta
+
+from benchmark_utils import report, setup, timed
+
+args = setup(
+    __doc__,
+    posts={"type": int, "default": 100_000},
+    query={"default": "replication"},
+    repeat={"type": int, "default": 5},
+    seed={"type": int, "default": 42},
+)
+
+if args.mongomock:
+    raise SystemExit("mongomock does not implement $text; run against mongod")
+
+from bson import ObjectId  # noqa: E402
+
+from blog import search  # noqa: E402
+from blog.models import Author, BlogPost, User  # noqa: E402
+
+WORDS = (
+    "django mongodb python index query cursor shard replication cache latency "
+    "template view model document field aggregate pipeline schema migration "
+    "worker thread pool session search ranking token stemming benchmark"
+).split()
+
+rng = random.Random(args.seed)
+user = User.create_user("bench", "bench@example.com", "bench-password")
+author = Author.create_from_user(user)
+BlogPost.ensure_indexes()
+
+start = datetime(2020, 1, 1)
+collection = BlogPost._get_collection()
+batch = []
+for i in range(args.posts):
+    title = " ".join(rng.choices(WORDS, k=6)).title()
+    content = " ".join(rng.choices(WORDS, k=300))
+    batch.append(
+        {
+            "_id": ObjectId(),
+            "title": title,
+            "slug": f"benchmark-post-{i}",
+            "content": content,
+            "excerpt": content[:297] + "...",
+            "author": author.id,
+            "is_published": True,
+            "published_at": start + timedelta(minutes=i),
+            "created_at": start,
+            "updated_at": start,
+        }
+    )
+    if len(batch) == 5_000:
+        collection.insert_many(batch)
+        batch = []
+if batch:
+    collection.insert_many(batch)
+
+
+def icontains_search():
+    """The previous search_posts implementation"""
+    posts = list(
+        BlogPost.get_published()
+        .filter(title__icontains=args.query)
+        .order_by("-published_at")
+    )
+    if len(posts) < 5:
+        posts += list(
+            BlogPost.get_published()
+            .filter(content__icontains=args.query)
+            .order_by("-published_at")[:10]
+        )
+    return posts
+
+
+def text_search():
+    return search.search_posts(args.query).posts
+
+
+def best_of(func):
+    return min(timed(func)[1] for _ in range(args.repeat)) * 1000
+
+
+report(
+    f"{args.posts:,} posts, query {args.query!r}, best of {args.repeat}",
+    [
+        ("icontains scan", f"{best_of(icontains_search):.1f} ms"),
+        ("  posts materialised", f"{len(icontains_search()):,}"),
+        ("ranked $text page", f"{best_of(text_search):.1f} ms"),
+        ("  posts materialised", f"{len(text_search()):,}"),
+    ],
+)
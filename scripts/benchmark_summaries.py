@@ -0,0 +1,96 @@
+"""Bytes and memory for a listing page: full posts against summaries.
+
+Seeds posts with long content and many embedded comments, then measures
+the BSON size of what each query returns (what crosses the wire) and the
+peak Python memory used to hydrate one page of documents.
+"""
+
+import random
+import tracemalloc
+
+import bson
+from benchmark_utils import report, setup, timed
+
+args = setup(
+    __doc__,
+    posts={"type": int, "default": 200},
+    page_size={"type": int, "default": 20},
+    comments={"type": int, "default": 50, "help": "comments per post"},
+    words={"type": int, "default": 1500, "help": "content words per post"},
+)
+
+from bson import ObjectId  # noqa: E402
+
+from blog.models import Author, BlogPost, Tag, User  # noqa: E402
+
+rng = random.Random(0)
+user = User.create_user("bench", "bench@example.com", "bench-password")
+author = Author.create_from_user(user)
+tags = [Tag(name=f"Bench Tag {i}").save() for i in range(5)]
+
+documents = []
+for i in range(args.posts):
+    comments = [
+        {
+            "author_name": f"Reader {c}",
+            "author_email": f"reader{c}@example.com",
+            "content": "Thanks for the post! " * rng.randint(5, 30),
+            "is_approved": c % 3 == 0,
+        }
+        for c in range(args.comments)
+    ]
+    documents.append(
+        {
+            "_id": ObjectId(),
+            "title": f"Benchmark post {i}",
+            "slug": f"benchmark-post-{i}",
+            "content": "lorem ipsum " * args.words,
+            "excerpt": "lorem ipsum " * 20,
+            "author": author.id,
+            "tags": [tag.id for tag in tags[: i % 5 + 1]],
+            "is_published": True,
+            "published_at": user.date_joined,
+            "comments": comments,
+            "approved_comment_count": sum(c["is_approved"] for c in comments),
+            "metadata": {"reading_time": args.words // 200},
+        }
+    )
+BlogPost._get_collection().insert_many(documents)
+
+
+def page(queryset):
+    return queryset.order_by("-published_at")[: args.page_size]
+
+
+def wire_bytes(queryset):
+    return sum(len(bson.encode(doc)) for doc in page(queryset).as_pymongo())
+
+
+def peak_memory(queryset):
+    tracemalloc.start()
+    posts = list(page(queryset))
+    counts = [post.comment_count for post in posts]
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak, counts
+
+
+full = BlogPost.get_published()
+summaries = BlogPost.get_published().summaries()
+
+full_bytes, summary_bytes = wire_bytes(full), wire_bytes(summaries)
+(full_peak, full_counts), full_seconds = timed(peak_memory, full)
+(summary_peak, summary_counts), summary_seconds = timed(peak_memory, summaries)
+assert full_counts == summary_counts, "comment counts differ"
+
+report(
+    f"One page of {args.page_size} posts ({args.comments} comments each)",
+    [
+        ("full documents on the wire", f"{full_bytes / 1024:,.1f} KiB"),
+        ("summaries on the wire", f"{summary_bytes / 1024:,.1f} KiB"),
+        ("full documents peak memory", f"{full_peak / 1024:,.1f} KiB"),
+        ("summaries peak memory", f"{summary_peak / 1024:,.1f} KiB"),
+        ("full documents hydrate", f"{full_seconds * 1000:.1f} ms"),
+        ("summaries hydrate", f"{summary_seconds * 1000:.1f} ms"),
+    ],
+)
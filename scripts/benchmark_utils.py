@@ -0,0 +1,161 @@
+"""Shared setup for the scripts/benchmark_*.py scripts.
+
+Run a benchmark directly, e.g. ``python scripts/benchmark_view_counter.py``.
+Pass ``--mongomock`` to run against an in-memory database instead of the
+MongoDB configured in MONGODB_SETTINGS. mongomock has no indexes and scans
+every collection, so only a real mongod gives meaningful query timings.
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "base.settings")
+
+# Set by setup(); mongomock emits no command events, see count_commands()
+USING_MONGOMOCK = False
+
+MONGOMOCK_COMMANDS = (
+    "find",
+    "find_one",
+    "aggregate",
+    "count_documents",
+    "estimated_document_count",
+    "distinct",
+    "insert_one",
+    "insert_many",
+    "update_one",
+    "update_many",
+    "bulk_write",
+    "find_one_and_update",
+    "delete_one",
+    "delete_many",
+)
+
+
+def setup(description, **arguments):
+    """Parse arguments, configure Django and connect to the benchmark database"""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        "--mongomock", action="store_true", help="use an in-memory database"
+    )
+    parser.add_argument(
+        "--db", default="blog_benchmark", help="database name (dropped first)"
+    )
+    for name, options in arguments.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", **options)
+    args = parser.parse_args()
+
+    import django
+
+    django.setup()
+
+    import mongoengine
+    from django.conf import settings
+
+    global USING_MONGOMOCK
+    USING_MONGOMOCK = args.mongomock
+
+    mongoengine.disconnect()
+    if args.mongomock:
+        import mongomock
+
+        mongoengine.connect(args.db, mongo_client_class=mongomock.MongoClient)
+    else:
+        options = dict(settings.MONGODB_SETTINGS, db=args.db)
+        mongoengine.connect(**options)
+    mongoengine.get_connection().drop_database(args.db)
+    return args
+
+
+def seed_posts(count, tags=5):
+    """Create one author, a few tags and ``count`` published posts"""
+    from blog.models import Author, BlogPost, Tag, User
+
+    user = User.create_user("bench", "bench@example.com", "bench-password")
+    author = Author.create_from_user(user)
+    tag_docs = [Tag(name=f"Bench Tag {i}").save() for i in range(tags)]
+    return [
+        BlogPost(
+            title=f"Benchmark post {i}",
+            content=f"Benchmark content {i}",
+            author=author,
+            tags=tag_docs[: i % tags + 1],
+            is_published=True,
+        ).save()
+        for i in range(count)
+    ]
+
+
+def timed(func, *args, **kwargs):
+    """Run ``func`` and return ``(result, seconds)``"""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def report(title, rows):
+    """Print ``rows`` of (label, value) pairs as an aligned table"""
+    print(f"\n{title}")
+    width = max(len(label) for label, _ in rows)
+    for label, value in rows:
+        print(f"  {label.ljust(width)}  {value}")
+
+
+class CommandCount:
+    commands = 0
+
+
+@contextmanager
+def count_commands():
+    """Count the MongoDB commands sent inside the block
+
+    Against mongod this is the per-request command profiler. mongomock emits
+    no command events, so there the collection methods are counted instead,
+    outermost call only, since mongomock implements some through others.
+    """
+    count = CommandCount()
+    if not USING_MONGOMOCK:
+        from blog.monitoring import profiling
+
+        with profiling() as profile:
+            yield count
+        count.commands = len(profile.commands)
+        return
+
+    from unittest import mock
+
+    import mongomock
+
+    depth = threading.local()
+
+    def counting(original):
+        def wrapper(*args, **kwargs):
+            level = getattr(depth, "level", 0)
+            if level == 0:
+                count.commands += 1
+            depth.level = level + 1
+            try:
+                return original(*args, **kwargs)
+            finally:
+                depth.level = level
+
+        return wrapper
+
+    collection = mongomock.collection.Collection
+    patches = [
+        mock.patch.object(collection, name, counting(getattr(collection, name)))
+        for name in MONGOMOCK_COMMANDS
+    ]
+    for patch in patches:
+        patch.start()
+    try:
+        yield count
+    finally:
+        for patch in patches:
+            patch.stop()
@@ -0,0 +1,61 @@
+"""Throughput of view counting on hot posts under concurrent load.
+
+Compares the old read-modify-save increment with the buffered ``$inc``
+counter in ``blog.counters``.
+"""
+
+import threading
+
+from benchmark_utils import report, seed_posts, setup, timed
+
+args = setup(
+    __doc__,
+    threads={"type": int, "default": 16},
+    views={"type": int, "default": 500, "help": "views per thread"},
+    hot_posts={"type": int, "default": 3},
+)
+
+from blog.counters import ViewCounter  # noqa: E402
+from blog.models import BlogPost  # noqa: E402
+
+
+def legacy_increment(post_id):
+    post = BlogPost.objects.get(id=post_id)
+    post.view_count += 1
+    post.save()
+
+
+def run(increment, post_ids):
+    def worker(offset):
+        for i in range(args.views):
+            increment(post_ids[(offset + i) % len(post_ids)])
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+post_ids = [post.id for post in seed_posts(args.hot_posts)]
+expected = args.threads * args.views
+
+_, legacy_seconds = timed(run, legacy_increment, post_ids)
+legacy_total = sum(BlogPost.objects(id__in=post_ids).scalar("view_count"))
+
+BlogPost.objects(id__in=post_ids).update(set__view_count=0)
+counter = ViewCounter()
+_, buffered_seconds = timed(run, counter.increment, post_ids)
+_, flush_seconds = timed(counter.flush)
+buffered_total = sum(BlogPost.objects(id__in=post_ids).scalar("view_count"))
+
+report(
+    f"{args.threads} threads x {args.views} views over {args.hot_posts} hot posts",
+    [
+        ("read-modify-save", f"{expected / legacy_seconds:,.0f} views/s"),
+        ("  views recorded", f"{legacy_total:,} of {expected:,}"),
+        ("buffered $inc", f"{expected / buffered_seconds:,.0f} views/s"),
+        ("  final flush", f"{flush_seconds * 1000:.1f} ms"),
+        ("  views recorded", f"{buffered_total:,} of {expected:,}"),
+    ],
+)
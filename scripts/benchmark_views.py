@@ -0,0 +1,202 @@
+"""Latency, query count and peak memory of the blog views at several scales.
+
+For each of ``--scales`` the database is reseeded with ``blog.seeding`` (the
+same ``--seed`` every run, so runs are comparable) and each view is
+requested ``--requests`` times through the Django test client. The page
+cache is cleared before every request, so every request renders; the
+dashboard statistics cache too. Peak memory is traced over one extra
+request, outside the timed ones.
+
+``--output results.json`` writes the results as JSON. ``--baseline
+results.json`` compares with an earlier run and exits with status 1 when a
+view's p50 grew by more than ``--tolerance`` or it sends more queries.
+
+Runs against the MongoDB in MONGODB_SETTINGS, normally a local mongod, or
+``--mongomock``. mongomock has no ``$text`` index, so search is skipped
+there, and its timings only show relative costs.
+"""
+
+import json
+import math
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+from benchmark_utils import count_commands, report, setup
+
+args = setup(
+    __doc__,
+    scales={"default": "1000,10000", "help": "comma separated post counts"},
+    requests={"type": int, "default": 50, "help": "timed requests per view"},
+    seed={"type": int, "default": 0},
+    output={"default": None, "help": "write the results to this JSON file"},
+    baseline={"default": None, "help": "compare with this results file"},
+    tolerance={"type": float, "default": 0.2, "help": "allowed p50 growth"},
+)
+
+import mongoengine  # noqa: E402
+from django.conf import settings  # noqa: E402
+from django.core.cache import cache  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.urls import reverse  # noqa: E402
+
+from blog.cache import page_cache  # noqa: E402
+from blog.counters import view_counter  # noqa: E402
+from blog.models import BlogPost, SiteSettings  # noqa: E402
+from blog.seeding import Seeder  # noqa: E402
+from blog.stats import clear_dashboard_stats  # noqa: E402
+
+
+def reseed(posts):
+    mongoengine.get_connection().drop_database(args.db)
+    for backend in (page_cache.backend, cache):
+        backend.clear()
+    SiteSettings.clear_cache()
+    view_counter.reset()
+    Seeder(posts=posts, seed=args.seed).run()
+
+
+def cases():
+    """``(name, method, url, data)`` for each benchmarked request"""
+    published = BlogPost.objects(is_published=True)
+    per_page = SiteSettings.get_settings().posts_per_page
+    last_page = max(math.ceil(published.count() / per_page), 1)
+    slug = published.order_by("-view_count").scalar("slug").first()
+    comment = {
+        "author_name": "Benchmark",
+        "author_email": "bench@example.com",
+        "content": "A benchmark comment",
+    }
+    return [
+        ("home", "get", reverse("blog:home"), None),
+        ("post_list", "get", reverse("blog:post_list"), None),
+        (
+            "post_list deep",
+            "get",
+            f"{reverse('blog:post_list')}?page={last_page}",
+            None,
+        ),
+        ("post_detail", "get", reverse("blog:post_detail", args=[slug]), None),
+        ("search_posts", "get", f"{reverse('blog:search')}?q=mongodb+index", None),
+        ("api_posts", "get", f"{reverse('blog:api_posts')}?limit=20", None),
+        ("stats_dashboard", "get", reverse("blog:dashboard"), None),
+        ("add_comment", "post", reverse("blog:add_comment", args=[slug]), comment),
+    ]
+
+
+def reset_caches():
+    """Make the next request render instead of hitting a cache"""
+    page_cache.backend.clear()
+    clear_dashboard_stats()
+
+
+def request(client, method, url, data):
+    if method == "post":
+        return client.post(url, json.dumps(data), content_type="application/json")
+    return client.get(url)
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def measure(client, scale, name, method, url, data):
+    result = {"scale": scale, "view": name}
+    reset_caches()
+    response = request(client, method, url, data)
+    if response.status_code >= 400:
+        return dict(result, error=response.status_code)
+
+    latencies, commands = [], 0
+    for _ in range(args.requests):
+        reset_caches()
+        with count_commands() as count:
+            start = time.perf_counter()
+            request(client, method, url, data)
+            latencies.append(time.perf_counter() - start)
+        commands += count.commands
+
+    reset_caches()
+    tracemalloc.start()
+    request(client, method, url, data)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return dict(
+        result,
+        p50_ms=statistics.median(latencies) * 1000,
+        p95_ms=percentile(latencies, 0.95) * 1000,
+        p99_ms=percentile(latencies, 0.99) * 1000,
+        queries=commands / args.requests,
+        peak_kib=peak / 1024,
+    )
+
+
+def compare(results, baseline):
+    """Rows describing each change against ``baseline``; True if any regressed"""
+    previous = {(row["scale"], row["view"]): row for row in baseline["results"]}
+    rows, regressed = [], False
+    for row in results:
+        before = previous.get((row["scale"], row["view"]))
+        if before is None or "error" in row or "error" in before:
+            continue
+        growth = row["p50_ms"] / before["p50_ms"] - 1 if before["p50_ms"] else 0.0
+        slower = growth > args.tolerance
+        more_queries = row["queries"] > before["queries"]
+        regressed |= slower or more_queries
+        flag = "REGRESSED" if slower or more_queries else "ok"
+        rows.append(
+            (
+                f"{row['scale']:>9,} {row['view']}",
+                f"p50 {growth:+7.1%}  queries {before['queries']:.1f} -> "
+                f"{row['queries']:.1f}  {flag}",
+            )
+        )
+    return rows, regressed
+
+
+client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+results = []
+for scale in (int(value) for value in args.scales.split(",")):
+    reseed(scale)
+    for name, method, url, data in cases():
+        if name == "search_posts" and args.mongomock:
+            continue
+        results.append(measure(client, scale, name, method, url, data))
+
+report(
+    f"{args.requests} requests per view, "
+    f"{'mongomock' if args.mongomock else 'mongod'}",
+    [
+        (
+            f"{row['scale']:>9,} {row['view']}",
+            f"HTTP {row['error']}"
+            if "error" in row
+            else f"p50 {row['p50_ms']:8.2f} ms  p95 {row['p95_ms']:8.2f} ms  "
+            f"p99 {row['p99_ms']:8.2f} ms  {row['queries']:5.1f} queries  "
+            f"peak {row['peak_kib']:9.1f} KiB",
+        )
+        for row in results
+    ],
+)
+
+if args.output:
+    with open(args.output, "w") as output:
+        meta = {
+            "created": datetime.utcnow().isoformat(),
+            "backend": "mongomock" if args.mongomock else "mongod",
+            "python": platform.python_version(),
+            "requests": args.requests,
+            "seed": args.seed,
+        }
+        json.dump({"meta": meta, "results": results}, output, indent=2)
+
+if args.baseline:
+    with open(args.baseline) as baseline:
+        rows, regressed = compare(results, json.load(baseline))
+    report(f"Against {args.baseline} (tolerance {args.tolerance:.0%})", rows)
+    sys.exit(1 if regressed else 0)
@@ -61,22 +61,21 @@ post3.save()
 print("✅ Post 3 created:", post3.title)
 
 # Add some comments to the first post
-post1.add_comment(
+comment1 = post1.add_comment(
     author_name="John Doe",
     author_email="john@example.com",
     content="Great article! Very helpful for beginners.",
 )
 
-post1.add_comment(
+comment2 = post1.add_comment(
     author_name="Jane Smith",
     author_email="jane@example.com",
     content="Thanks for the detailed explanation.",
 )
 
 # Approve comments
-post1.comments[0].is_approved = True
-post1.comments[1].is_approved = True
-post1.save()
+post1.approve_comment(comment1.comment_id)
+post1.approve_comment(comment2.comment_id)
 print("✅ Comments added and approved")
 
 print("\n📊 Database Summary:")